@@ -0,0 +1,350 @@
+# Content-hash index over the audio payload only.
+# Tags (ID3v2 / ID3v1 / APE / Lyrics3, FLAC metadata blocks, WAV/AIFF chunks
+# other than the sound data, MP4 atoms other than mdat) are excluded from the
+# hash, so retagging a file keeps its hash. That makes the hash a stable
+# identity: exact duplicates share one, and a moved or renamed file can be
+# matched back to where it used to be.
+
+import os
+import csv
+import struct
+import sqlite3
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from library_index import walk_parallel, normalize_name
+from extract_mik_tags import AUDIO_EXTENSIONS
+from crate_extractor_corrected import track_basename
+
+# ==========================================
+# CONFIGURE THIS
+# ==========================================
+music_dir = r"C:\Users\rmmcc\OneDrive\Documents\Music"
+cache_path = "audio_hash_cache.sqlite"
+duplicates_csv = "audio_duplicates.csv"
+moves_csv = "audio_moves.csv"
+io_workers = 8   # Files hashed concurrently
+# ==========================================
+
+READ_SIZE = 1 << 20   # Bytes per read while hashing
+# Digest of no payload at all; older versions gave it to every file whose
+# sound data could not be located, so such cache entries are re-hashed
+EMPTY_HASH = hashlib.blake2b(digest_size=16).hexdigest()
+
+
+def id3v2_size(header):
+    """Total size of an ID3v2 tag from its 10-byte header (incl. footer), or 0"""
+    if len(header) < 10 or header[:3] != b'ID3':
+        return 0
+    size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+    return 10 + size + (10 if header[5] & 0x10 else 0)
+
+
+def trailing_tags_start(f, end):
+    """Offset where trailing ID3v1 / APEv2 / Lyrics3v2 tags begin (any order)"""
+    while True:
+        if end >= 128:
+            f.seek(end - 128)
+            if f.read(3) == b'TAG':
+                end -= 128
+                continue
+        if end >= 32:
+            f.seek(end - 32)
+            footer = f.read(32)
+            if footer[:8] == b'APETAGEX':
+                size, flags = struct.unpack_from('<I4xI', footer, 12)
+                end -= size + (32 if flags & 0x80000000 else 0)
+                continue
+        if end >= 15:
+            f.seek(end - 15)
+            trailer = f.read(15)
+            if trailer[6:] == b'LYRICS200' and trailer[:6].isdigit():
+                end -= int(trailer[:6]) + 15
+                continue
+        return max(end, 0)
+
+
+def iter_chunks(f, ext):
+    """Yield (chunk_id, data_offset, size) for each top-level WAV/AIFF chunk"""
+    f.seek(0)
+    header = f.read(12)
+    if ext in ('.aif', '.aiff'):
+        if header[:4] != b'FORM':
+            raise ValueError("not an AIFF file")
+        chunk_header = struct.Struct('>4sI')
+    else:
+        if header[:4] != b'RIFF':
+            raise ValueError("not a RIFF/WAVE file")
+        chunk_header = struct.Struct('<4sI')
+    pos = 12
+    while True:
+        f.seek(pos)
+        raw = f.read(chunk_header.size)
+        if len(raw) < chunk_header.size:
+            return
+        chunk_id, size = chunk_header.unpack(raw)
+        yield chunk_id, pos + chunk_header.size, size
+        pos += chunk_header.size + size + (size & 1)
+
+
+def audio_ranges(f, ext, file_size):
+    """
+    [(start, end)] byte ranges of the audio payload in an open file.
+
+    Anything this function does not recognise is hashed whole, including a
+    WAV/AIFF without a sound data chunk or an MP4 without an mdat atom, so
+    unrelated files never share the hash of an empty payload.
+    """
+    ranges = payload_ranges(f, ext, file_size)
+    ranges = [(start, min(end, file_size)) for start, end in ranges if start < min(end, file_size)]
+    return ranges or [(0, file_size)]
+
+
+def payload_ranges(f, ext, file_size):
+    """Audio payload ranges as the container describes them; may be empty"""
+    if ext in ('.wav', '.aif', '.aiff'):
+        data_ids = (b'data',) if ext == '.wav' else (b'SSND',)
+        return [(start, start + size) for chunk_id, start, size in iter_chunks(f, ext)
+                if chunk_id in data_ids]
+
+    if ext in ('.mp4', '.m4a'):
+        ranges, pos = [], 0
+        while pos + 8 <= file_size:
+            f.seek(pos)
+            size, atom = struct.unpack('>I4s', f.read(8))
+            header = 8
+            if size == 1:
+                size, header = struct.unpack('>Q', f.read(8))[0], 16
+            elif size == 0:
+                size = file_size - pos
+            if size < header:
+                break
+            if atom == b'mdat':
+                ranges.append((pos + header, pos + size))
+            pos += size
+        return ranges
+
+    f.seek(0)
+    start = id3v2_size(f.read(10))
+    if ext == '.flac':
+        f.seek(start)
+        if f.read(4) != b'fLaC':
+            raise ValueError("not a FLAC file")
+        start += 4
+        is_last = False
+        while not is_last:
+            block_header = f.read(4)
+            if len(block_header) < 4:
+                break
+            is_last = bool(block_header[0] & 0x80)
+            length = int.from_bytes(block_header[1:], 'big')
+            start += 4 + length
+            f.seek(length, 1)
+    else:
+        # Some taggers stack several ID3v2 tags
+        while True:
+            f.seek(start)
+            extra = id3v2_size(f.read(10))
+            if not extra:
+                break
+            start += extra
+    return [(start, trailing_tags_start(f, file_size))]
+
+
+def hash_audio(filepath):
+    """blake2b (128-bit hex) of a file's audio payload"""
+    ext = os.path.splitext(filepath)[1].lower()
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filepath, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        for start, end in audio_ranges(f, ext, file_size):
+            f.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                block = f.read(min(READ_SIZE, remaining))
+                if not block:
+                    break
+                digest.update(block)
+                remaining -= len(block)
+    return digest.hexdigest()
+
+
+# ==========================================
+# HASH CACHE
+# ==========================================
+# Valid while (size, mtime_ns) match the file; a retag changes mtime, so the
+# file is re-hashed, but the hash itself comes out the same.
+
+def open_hash_cache(cache_path):
+    conn = sqlite3.connect(cache_path)
+    conn.execute("CREATE TABLE IF NOT EXISTS hashes (filepath TEXT PRIMARY KEY, "
+                 "size INTEGER, mtime_ns INTEGER, audio_hash TEXT)")
+    with conn:
+        conn.execute("DELETE FROM hashes WHERE audio_hash = ?", (EMPTY_HASH,))
+    return conn
+
+
+def load_hash_cache(conn):
+    """filepath -> (size, mtime_ns, audio_hash)"""
+    return {path: (size, mtime_ns, audio_hash) for path, size, mtime_ns, audio_hash in
+            conn.execute("SELECT filepath, size, mtime_ns, audio_hash FROM hashes")}
+
+
+def _hash_entry(entry):
+    path, size, mtime_ns = entry
+    try:
+        return path, size, mtime_ns, hash_audio(path), None
+    except (OSError, ValueError, struct.error) as e:
+        return path, size, mtime_ns, None, str(e)
+
+
+def _hash_stale(files, cached, io_workers):
+    """
+    Reuse cached hashes for unchanged (path, size, mtime_ns) entries, hash the rest.
+
+    Returns (hashes, fresh cache rows, paths that failed to hash).
+    """
+    hashes, stale = {}, []
+    for path, size, mtime_ns in files:
+        hit = cached.get(path)
+        if hit and hit[0] == size and hit[1] == mtime_ns:
+            hashes[path] = hit[2]
+        else:
+            stale.append((path, size, mtime_ns))
+
+    fresh, failed = [], set()
+    with ThreadPoolExecutor(max_workers=io_workers) as pool:
+        for path, size, mtime_ns, audio_hash, error in pool.map(_hash_entry, stale):
+            if error:
+                print(f"⚠ {path}: {error}")
+                failed.add(path)
+                continue
+            hashes[path] = audio_hash
+            fresh.append((path, size, mtime_ns, audio_hash))
+    return hashes, fresh, failed
+
+
+def build_hash_index(music_dir, cache_path, io_workers=8, extensions=AUDIO_EXTENSIONS):
+    """
+    Hash every audio file under music_dir, re-reading only changed files.
+
+    extensions narrows the walk (e.g. to WAV/AIFF); cache entries of other
+    formats are left alone, so callers can share one cache.
+
+    Returns (hashes, previous) as {filepath: audio_hash}: the current library
+    and what the cache held before this run, for detect_moves(). Files that
+    are still there but failed to hash are left out of previous as well, so
+    they don't look vanished.
+    """
+    files = walk_parallel(music_dir, extensions=extensions)
+    conn = open_hash_cache(cache_path)
+    try:
+        cached = {path: entry for path, entry in load_hash_cache(conn).items()
+                  if path.lower().endswith(extensions)}
+        previous = {path: audio_hash for path, (_, _, audio_hash) in cached.items()}
+        hashes, fresh, failed = _hash_stale(files, cached, io_workers)
+        for path in failed:
+            previous.pop(path, None)
+
+        present = {path for path, _, _ in files}
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?)", fresh)
+            conn.executemany("DELETE FROM hashes WHERE filepath = ?",
+                             [(path,) for path in cached if path not in present])
+    finally:
+        conn.close()
+
+    print(f"✓ Hashed {len(fresh)} files ({len(hashes) - len(fresh)} cached, {len(failed)} errors)")
+    return hashes, previous
+
+
+def hash_files(paths, cache_path, io_workers=8):
+    """
+    {filepath: audio_hash} for just the given files, through the same cache.
+
+    Paths that don't exist are skipped; no other cache entry is touched, so
+    callers that only need a handful of tracks don't pay for a library walk.
+    """
+    files = []
+    for path in dict.fromkeys(paths):
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        files.append((path, st.st_size, st.st_mtime_ns))
+    conn = open_hash_cache(cache_path)
+    try:
+        hashes, fresh, failed = _hash_stale(files, load_hash_cache(conn), io_workers)
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?)", fresh)
+    finally:
+        conn.close()
+
+    print(f"✓ Hashed {len(fresh)} files ({len(hashes) - len(fresh)} cached, {len(failed)} errors)")
+    return hashes
+
+
+def duplicate_groups(hashes):
+    """{audio_hash: [paths]} for audio present more than once"""
+    groups = {}
+    for path, audio_hash in sorted(hashes.items()):
+        groups.setdefault(audio_hash, []).append(path)
+    return {h: paths for h, paths in groups.items() if len(paths) > 1}
+
+
+def detect_moves(previous, current):
+    """
+    Match files that disappeared since the last run to new files with the
+    same audio. Returns [(old_path, new_path)].
+
+    When one old file's audio appears at several new paths, the one with the
+    same basename wins; otherwise the move is left unmapped.
+    """
+    appeared = {}
+    for path, audio_hash in current.items():
+        if path not in previous:
+            appeared.setdefault(audio_hash, []).append(path)
+
+    moves = []
+    for old_path, audio_hash in sorted(previous.items()):
+        if old_path in current or audio_hash not in appeared:
+            continue
+        candidates = appeared[audio_hash]
+        if len(candidates) > 1:
+            candidates = [p for p in candidates if normalize_name(p) == normalize_name(old_path)]
+        if len(candidates) == 1:
+            moves.append((old_path, candidates[0]))
+    return moves
+
+
+def follow_moves(crate_tag_lookup, moves):
+    """Carry crate tags from a moved file's old basename over to its new one"""
+    # Keyed like the crate lookup itself (track_basename), not normalize_name
+    for old_path, new_path in moves:
+        old_name, new_name = track_basename(old_path), track_basename(new_path)
+        if old_name != new_name and old_name in crate_tag_lookup:
+            crate_tag_lookup.setdefault(new_name, set()).update(crate_tag_lookup[old_name])
+    return crate_tag_lookup
+
+
+def write_reports(hashes, moves, duplicates_csv, moves_csv):
+    groups = duplicate_groups(hashes)
+    with open(duplicates_csv, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['audio_hash', 'filepath'])
+        for audio_hash, paths in groups.items():
+            writer.writerows((audio_hash, path) for path in paths)
+    with open(moves_csv, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['old_path', 'new_path'])
+        writer.writerows(moves)
+    print(f"✓ {len(groups)} duplicate groups -> {duplicates_csv}")
+    print(f"✓ {len(moves)} moved files -> {moves_csv}")
+
+
+# === USAGE ===
+if __name__ == "__main__":
+    hashes, previous = build_hash_index(music_dir, cache_path, io_workers=io_workers)
+    moves = detect_moves(previous, hashes) if previous else []
+    write_reports(hashes, moves, duplicates_csv, moves_csv)
+    print("\nDone!")
@@ -0,0 +1,132 @@
+# Tag readers for the non-MP3 formats the crate extractors already recognise.
+# Every reader returns (values, has_cover) where values is keyed by the
+# mik_full_export.csv field names, so all formats land in one schema.
+
+import struct
+
+from mutagen.mp4 import MP4
+
+# Vorbis comment keys (FLAC) per export field, in order of preference
+VORBIS_FIELDS = {
+    'artist': ['ARTIST'], 'title': ['TITLE'], 'album': ['ALBUM'], 'bpm': ['BPM'],
+    'key': ['INITIALKEY', 'KEY'], 'energy': ['COMMENT', 'DESCRIPTION'], 'genre': ['GENRE'],
+    'label': ['LABEL', 'ORGANIZATION', 'PUBLISHER'], 'year': ['DATE', 'YEAR'],
+    'isrc': ['ISRC'], 'remixer': ['REMIXER', 'MIXARTIST'], 'copyright': ['COPYRIGHT'],
+}
+
+# MP4 atom keys per export field ('----' keys are iTunes freeform atoms)
+MP4_FIELDS = {
+    'artist': ['\xa9ART'], 'title': ['\xa9nam'], 'album': ['\xa9alb'], 'bpm': ['tmpo'],
+    'key': ['----:com.apple.iTunes:initialkey', '----:com.apple.iTunes:KEY'],
+    'energy': ['\xa9cmt'], 'genre': ['\xa9gen'],
+    'label': ['----:com.apple.iTunes:LABEL', '----:com.apple.iTunes:publisher'],
+    'year': ['\xa9day'], 'isrc': ['----:com.apple.iTunes:ISRC'],
+    'remixer': ['----:com.apple.iTunes:REMIXER'], 'copyright': ['cprt'],
+}
+
+FLAC_VORBIS_COMMENT = 4
+FLAC_PICTURE = 6
+
+
+def find_id3_chunk(f, ext):
+    """
+    Return the file offset of the ID3 chunk in an AIFF or WAV file, or None.
+
+    Only chunk headers are read; the sound data chunk is skipped by seeking.
+    """
+    f.seek(0)
+    header = f.read(12)
+    if ext in ('.aif', '.aiff'):
+        if header[:4] != b'FORM' or header[8:12] not in (b'AIFF', b'AIFC'):
+            raise ValueError("not an AIFF file")
+        chunk_header = struct.Struct('>4sI')
+    else:
+        if header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+            raise ValueError("not a RIFF/WAVE file")
+        chunk_header = struct.Struct('<4sI')
+
+    pos = 12
+    while True:
+        f.seek(pos)
+        raw = f.read(chunk_header.size)
+        if len(raw) < chunk_header.size:
+            return None
+        chunk_id, size = chunk_header.unpack(raw)
+        if chunk_id in (b'ID3 ', b'id3 '):
+            return pos + chunk_header.size
+        # Chunks are padded to an even length
+        pos += chunk_header.size + size + (size & 1)
+
+
+def read_flac_fields(filepath):
+    """Read Vorbis comments from a FLAC file, skipping PICTURE and audio data"""
+    with open(filepath, 'rb') as f:
+        marker = f.read(4)
+        if marker[:3] == b'ID3':
+            # Some taggers prepend an ID3v2 tag; skip over it
+            size_bytes = f.read(6)[2:]
+            size = (size_bytes[0] << 21) | (size_bytes[1] << 14) | (size_bytes[2] << 7) | size_bytes[3]
+            f.seek(10 + size)
+            marker = f.read(4)
+        if marker != b'fLaC':
+            raise ValueError("not a FLAC file")
+
+        comments = {}
+        has_cover = False
+        is_last = False
+        while not is_last:
+            block_header = f.read(4)
+            if len(block_header) < 4:
+                break
+            is_last = bool(block_header[0] & 0x80)
+            block_type = block_header[0] & 0x7F
+            length = int.from_bytes(block_header[1:], 'big')
+            if block_type == FLAC_VORBIS_COMMENT and not comments:
+                comments = parse_vorbis_comment(f.read(length))
+            else:
+                if block_type == FLAC_PICTURE:
+                    has_cover = True
+                f.seek(length, 1)
+
+    has_cover = has_cover or 'METADATA_BLOCK_PICTURE' in comments
+    values = {}
+    for field, keys in VORBIS_FIELDS.items():
+        for key in keys:
+            if key in comments:
+                values[field] = '\x00'.join(comments[key])
+                break
+    return values, has_cover
+
+
+def parse_vorbis_comment(data):
+    """Parse a Vorbis comment block into {UPPERCASE_KEY: [values]}"""
+    vendor_length = struct.unpack_from('<I', data, 0)[0]
+    pos = 4 + vendor_length
+    count = struct.unpack_from('<I', data, pos)[0]
+    pos += 4
+    comments = {}
+    for _ in range(count):
+        length = struct.unpack_from('<I', data, pos)[0]
+        pos += 4
+        entry = data[pos:pos + length].decode('utf-8', errors='replace')
+        pos += length
+        key, sep, value = entry.partition('=')
+        if sep:
+            comments.setdefault(key.upper(), []).append(value)
+    return comments
+
+
+def read_mp4_fields(filepath):
+    """Read iTunes-style metadata atoms from an MP4/M4A file via mutagen"""
+    audio = MP4(filepath)
+    tags = audio.tags or {}
+    values = {}
+    for field, keys in MP4_FIELDS.items():
+        for key in keys:
+            if key in tags:
+                values[field] = '\x00'.join(
+                    bytes(v).decode('utf-8', errors='replace') if isinstance(v, bytes) else str(v)
+                    for v in tags[key]
+                )
+                break
+    return values, 'covr' in tags
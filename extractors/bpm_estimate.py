@@ -0,0 +1,312 @@
+# Local tempo estimation for master rows that have no Track BPM from any source.
+# Audio is reduced to a mono excerpt at ~11 kHz (WAV/AIFF straight from the
+# memory-mapped PCM, other formats through ffmpeg when it is installed), turned
+# into a spectral-flux onset envelope, and the beat period is read off the
+# envelope's autocorrelation. Half/double-time errors are resolved against the
+# track's BPM crate range. Estimates are cached per audio content hash.
+
+import re
+import time
+import shutil
+import struct
+import sqlite3
+import subprocess
+
+import numpy as np
+import pandas as pd
+
+from audio_hash import hash_files
+from pcm_analysis import PCM_EXTENSIONS, read_pcm_format, iter_pcm_blocks
+from crate_extractor_corrected import pool_map
+
+# ==========================================
+# CONFIGURE THIS
+# ==========================================
+master_csv = r"C:\Users\fulmi\Downloads\Set Lists\master_library_final.csv"
+output_master_csv = r"C:\Users\fulmi\Downloads\Set Lists\master_library_local_bpm.csv"
+estimates_csv = "bpm_estimates.csv"
+cache_path = "bpm_estimate_cache.sqlite"        # keyed by audio content hash
+hash_cache_path = "audio_hash_cache.sqlite"     # shared with audio_hash.py
+min_confidence = 0.2    # estimates below this are reported but not written to the master
+workers = 4
+# ==========================================
+
+ANALYSIS_RATE = 11025        # target rate of the mono excerpt
+EXCERPT_SEC = 120            # centre of the track; intros/outros rarely help
+FRAME_SIZE = 512             # STFT frame for the onset envelope (~46 ms)
+HOP = 128                    # envelope hop (~86 frames per second)
+MIN_BPM, MAX_BPM = 60, 200   # beat periods searched
+FOLD_RANGE = (88, 176)       # estimates without a crate range are folded into this octave
+PRIOR_BPM, PRIOR_OCTAVES = 120, 1.0   # log-normal tempo prior that breaks octave ties
+FFMPEG = shutil.which('ffmpeg')
+
+# Same boundaries as merging/create_master_dataset.bpm_to_range (not importable
+# from here); (label, lowest, highest) in whole BPM
+BPM_RANGES = [
+    ('116 or less', 0, 116),
+    ('117-120', 117, 120),
+    ('121-123', 121, 123),
+    ('124-125', 124, 125),
+    ('126-129', 126, 129),
+    ('130-134', 130, 134),
+    ('135-139', 135, 139),
+    ('140+', 140, float('inf')),
+]
+
+ESTIMATE_COLUMNS = ['filepath', 'audio_hash', 'estimated_bpm', 'confidence',
+                    'bpm', 'bpm_range', 'correction']
+
+
+def bpm_range(bpm):
+    """BPM -> crate range label (rounded first, so 120.4 is '117-120' not '140+')"""
+    bpm = round(bpm)
+    for label, low, high in BPM_RANGES:
+        if low <= bpm <= high:
+            return label
+    return None
+
+
+def crate_ranges(value):
+    """BPM crate cell ('124-125' or '124-125; 126-129') -> set of range labels"""
+    if value is None or pd.isna(value):
+        return set()
+    labels = {label for label, _, _ in BPM_RANGES}
+    return {part.strip() for part in re.split(r'[;|]', str(value))} & labels
+
+
+# ==========================================
+# DECODING
+# ==========================================
+
+def excerpt_bounds(frames, rate):
+    length = int(EXCERPT_SEC * rate)
+    start = max(0, (frames - length) // 2)
+    return start, min(frames, start + length)
+
+
+def load_pcm_mono(filepath):
+    """Centre excerpt of a WAV/AIFF as mono float32, decimated towards ANALYSIS_RATE"""
+    info = read_pcm_format(filepath)
+    factor = max(1, int(info['sample_rate'] // ANALYSIS_RATE))
+    start, stop = excerpt_bounds(info['frames'], info['sample_rate'])
+    parts = []
+    for block in iter_pcm_blocks(filepath, factor << 16, info, start, stop):
+        mono = block.mean(axis=1)
+        usable = len(mono) - len(mono) % factor
+        # Averaging `factor` samples doubles as the anti-alias filter; the
+        # onset envelope only needs the band below a few kHz
+        parts.append(mono[:usable].reshape(-1, factor).mean(axis=1))
+    mono = np.concatenate(parts) if parts else np.empty(0, dtype=np.float32)
+    return mono, info['sample_rate'] / factor
+
+
+def load_ffmpeg_mono(filepath):
+    """Any other format through ffmpeg: mono float32 at ANALYSIS_RATE, centre excerpt"""
+    if FFMPEG is None:
+        raise ValueError("ffmpeg not found on PATH (needed for non-WAV/AIFF files)")
+    result = subprocess.run([FFMPEG, '-v', 'error', '-nostdin', '-i', filepath, '-vn',
+                             '-ac', '1', '-ar', str(ANALYSIS_RATE), '-f', 'f32le', '-'],
+                            capture_output=True)
+    if result.returncode != 0:
+        raise ValueError(result.stderr.decode('utf-8', errors='replace').strip() or "ffmpeg failed")
+    mono = np.frombuffer(result.stdout, dtype='<f4')
+    start, stop = excerpt_bounds(len(mono), ANALYSIS_RATE)
+    return mono[start:stop], float(ANALYSIS_RATE)
+
+
+def load_mono(filepath):
+    if filepath.lower().endswith(PCM_EXTENSIONS):
+        return load_pcm_mono(filepath)
+    return load_ffmpeg_mono(filepath)
+
+
+# ==========================================
+# TEMPO
+# ==========================================
+
+WINDOW = np.hanning(FRAME_SIZE).astype(np.float32)
+
+
+def onset_envelope(mono):
+    """Spectral flux of log-compressed STFT magnitudes, local mean removed"""
+    if len(mono) < FRAME_SIZE + HOP:
+        return np.empty(0, dtype=np.float32)
+    frames = np.lib.stride_tricks.sliding_window_view(mono, FRAME_SIZE)[::HOP]
+    magnitude = np.abs(np.fft.rfft(frames * WINDOW, axis=1))
+    flux = np.maximum(np.diff(np.log1p(10 * magnitude), axis=0), 0).sum(axis=1)
+    # Subtract a ~0.5 s moving average so slow level changes don't dominate
+    width = 21
+    cumulative = np.concatenate([[0.0], np.cumsum(flux)])
+    half = width // 2
+    lo = np.clip(np.arange(len(flux)) - half, 0, len(flux))
+    hi = np.clip(np.arange(len(flux)) + half + 1, 0, len(flux))
+    local = (cumulative[hi] - cumulative[lo]) / (hi - lo)
+    return np.maximum(flux - local, 0).astype(np.float32)
+
+
+def autocorrelation(envelope):
+    """Normalised autocorrelation (lag 0 = 1) via one zero-padded FFT"""
+    centred = envelope - envelope.mean()
+    n = len(centred)
+    spectrum = np.fft.rfft(centred, 2 * n)
+    ac = np.fft.irfft(spectrum.real ** 2 + spectrum.imag ** 2)[:n]
+    return ac / ac[0] if ac[0] > 0 else ac
+
+
+def refine_period(ac, lag, multiples=4):
+    """
+    Sub-frame beat period: locate the peaks near k * lag (k = 1..multiples) with
+    parabolic interpolation and average period estimates weighted by k, since
+    later peaks pin the period down more precisely.
+    """
+    estimates, weights = [], []
+    for k in range(1, multiples + 1):
+        lo, hi = k * lag - k, k * lag + k + 1
+        if lo < 1 or hi + 1 >= len(ac):
+            break
+        peak = lo + int(np.argmax(ac[lo:hi]))
+        a, b, c = ac[peak - 1], ac[peak], ac[peak + 1]
+        denom = a - 2 * b + c
+        offset = 0.5 * (a - c) / denom if denom < 0 else 0.0
+        estimates.append((peak + offset) / k)
+        weights.append(k)
+    return float(np.average(estimates, weights=weights)) if estimates else float(lag)
+
+
+def estimate_tempo(mono, rate):
+    """
+    (bpm, confidence) for a mono signal; (None, 0.0) when it is too short.
+
+    The beat lag maximises ac[lag] + (ac[lag / 2] + ac[2 * lag]) / 2: the true
+    beat also repeats at the bar-level multiple and splits into off-beats,
+    whereas a 1.5-beat alignment (kick onto hi-hat) has no half-lag peak. A
+    broad prior around PRIOR_BPM settles the remaining octave ambiguity.
+    Confidence is the normalised autocorrelation at that lag, 0 (no
+    periodicity) to 1.
+    """
+    fps = rate / HOP
+    envelope = onset_envelope(mono)
+    min_lag = int(fps * 60 / MAX_BPM)
+    max_lag = int(np.ceil(fps * 60 / MIN_BPM))
+    if len(envelope) < 4 * max_lag + 2:
+        return None, 0.0
+    ac = autocorrelation(envelope)
+    lags = np.arange(min_lag, max_lag + 1)
+    half = np.maximum(ac[lags // 2], ac[(lags + 1) // 2])
+    score = ac[lags] + 0.5 * (half + ac[2 * lags])
+    prior = np.exp(-0.5 * (np.log2(60 * fps / lags / PRIOR_BPM) / PRIOR_OCTAVES) ** 2)
+    lag = int(lags[np.argmax(np.maximum(score, 0) * prior)])
+    period = refine_period(ac, lag)
+    return round(60 * fps / period, 2), round(float(np.clip(ac[lag], 0, 1)), 3)
+
+
+def correct_octave(bpm, ranges=()):
+    """
+    Resolve half/double time: (bpm, bpm_range, correction).
+
+    With crate ranges, the first of bpm, 2x, 1/2x whose range matches a crate
+    wins; otherwise the estimate is folded into FOLD_RANGE.
+    """
+    if ranges:
+        for factor, correction in ((1, ''), (2, 'double'), (0.5, 'half')):
+            candidate = bpm * factor
+            if MIN_BPM / 2 <= candidate <= MAX_BPM * 2 and bpm_range(candidate) in ranges:
+                return round(candidate, 2), bpm_range(candidate), correction
+    folded, correction = bpm, ''
+    while folded < FOLD_RANGE[0]:
+        folded, correction = folded * 2, 'double'
+    while folded >= FOLD_RANGE[1]:
+        folded, correction = folded / 2, 'half'
+    if ranges:
+        correction = 'range mismatch'
+    return round(folded, 2), bpm_range(folded), correction
+
+
+def _estimate_entry(entry):
+    path, audio_hash = entry
+    try:
+        mono, rate = load_mono(path)
+        bpm, confidence = estimate_tempo(mono, rate)
+        return path, audio_hash, bpm, confidence, None
+    except (OSError, ValueError, struct.error) as e:
+        return path, audio_hash, None, 0.0, str(e)
+
+
+# ==========================================
+# CACHE (per audio content hash) + MASTER
+# ==========================================
+
+def open_tempo_cache(cache_path):
+    conn = sqlite3.connect(cache_path)
+    conn.execute("CREATE TABLE IF NOT EXISTS tempo (audio_hash TEXT PRIMARY KEY, "
+                 "estimated_bpm REAL, confidence REAL)")
+    return conn
+
+
+def estimate_missing_bpm(master_df, cache_path, hash_cache_path, workers=4,
+                         path_column='filepath', bpm_column='Track BPM', range_column='BPM'):
+    """
+    Estimate BPM for master rows with a blank bpm_column and an existing file.
+
+    Returns a DataFrame of ESTIMATE_COLUMNS. Raw estimates are cached by audio
+    hash; octave correction is re-applied each run, as crate ranges change.
+    Only the rows missing a BPM are hashed.
+    """
+    blank = master_df[master_df[bpm_column].isna() & master_df[path_column].notna()]
+    hashes = hash_files(blank[path_column].astype(str), hash_cache_path)
+    missing = blank[blank[path_column].isin(hashes)]
+    ranges = {path: crate_ranges(value) for path, value in
+              zip(missing[path_column], missing[range_column] if range_column in missing
+                  else [None] * len(missing))}
+
+    conn = open_tempo_cache(cache_path)
+    try:
+        known = {h: (bpm, confidence) for h, bpm, confidence in
+                 conn.execute("SELECT audio_hash, estimated_bpm, confidence FROM tempo")}
+        todo = list({hashes[p]: (p, hashes[p]) for p in ranges if hashes[p] not in known}.values())
+        started, errors = time.perf_counter(), 0
+        with conn:
+            for path, audio_hash, bpm, confidence, error in pool_map(_estimate_entry, todo, workers):
+                if error:
+                    print(f"⚠ {path}: {error}")
+                    errors += 1
+                    continue
+                conn.execute("INSERT OR REPLACE INTO tempo VALUES (?, ?, ?)", (audio_hash, bpm, confidence))
+                known[audio_hash] = (bpm, confidence)
+        elapsed = time.perf_counter() - started
+    finally:
+        conn.close()
+
+    rows = []
+    for path, track_ranges in ranges.items():
+        estimated, confidence = known.get(hashes[path], (None, 0.0))
+        if estimated is None:
+            continue
+        bpm, label, correction = correct_octave(estimated, track_ranges)
+        rows.append([path, hashes[path], estimated, confidence, bpm, label, correction])
+    rate = f", {(len(todo) - errors) / elapsed:.1f} tracks/s" if todo and elapsed > 0 else ""
+    print(f"✓ BPM: {len(rows)} of {len(ranges)} tracks without BPM estimated "
+          f"({len(todo) - errors} analysed{rate}, {errors} errors)")
+    return pd.DataFrame(rows, columns=ESTIMATE_COLUMNS)
+
+
+def fill_master_bpm(master_df, estimates, min_confidence=0.2,
+                    path_column='filepath', bpm_column='Track BPM'):
+    """Write confident estimates into blank bpm_column cells; returns how many were filled"""
+    confident = estimates[estimates['confidence'] >= min_confidence]
+    bpm_by_path = dict(zip(confident['filepath'], confident['bpm']))
+    blank = master_df[bpm_column].isna()
+    fill = master_df.loc[blank, path_column].map(bpm_by_path).dropna()
+    master_df.loc[fill.index, bpm_column] = fill
+    return len(fill)
+
+
+# === USAGE ===
+if __name__ == "__main__":
+    master_df = pd.read_csv(master_csv)
+    estimates = estimate_missing_bpm(master_df, cache_path, hash_cache_path, workers=workers)
+    estimates.to_csv(estimates_csv, index=False)
+    filled = fill_master_bpm(master_df, estimates, min_confidence)
+    master_df.to_csv(output_master_csv, index=False)
+    print(f"✓ Filled Track BPM for {filled} tracks (confidence >= {min_confidence}) -> {output_master_csv}")
+    print("\nDone!")
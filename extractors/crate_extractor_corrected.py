@@ -6,58 +6,314 @@
 # used across the broader metadata ETL system.
 
 import os
-import re
 import csv
+import json
+import mmap
+import hashlib
+import struct
+from concurrent.futures import ProcessPoolExecutor
 
-def restore_filename(spaced_string):
-    """Remove spaces from spaced text, e.g. 'U s e r s' -> 'Users'"""
-    return ''.join(spaced_string.split())
+from crate_matrix import CrateMatrix
 
-def extract_paths_from_crate(crate_file, base_path_only=True):
-    """Extract audio file paths from a Serato .crate file"""
-    # Pattern: look for paths starting with 'U s e r s' and ending in ') . m p 3' (or other extensions)
-    pattern = re.compile(r'(U s e r s [^ -]*?\) \. (m p 3|w a v|a i f f|f l a c|m p 4))', re.DOTALL)
-    paths = set()
-    with open(crate_file, 'r', encoding='utf-8', errors='ignore') as f_in:
-        data = f_in.read()
-        for match in re.finditer(pattern, data):
-            spaced_path = match.group(1)
-            # Remove all spaces to restore the real filename
-            path = restore_filename(spaced_path)
+# Serato crates are a flat sequence of tag-length-value records:
+#   4-byte ASCII tag | 4-byte big-endian payload length | payload
+# 'vrsn' holds the version string, 'osrt'/'ovct' hold column layout, and each
+# 'otrk' record nests a 'ptrk' record whose payload is the UTF-16BE track path.
+_RECORD_HEADER = struct.Struct('>4sI')
+
+def iter_crate_records(buf, start=0, end=None):
+    """Yield (tag, payload_start, payload_end) for each TLV record in buf[start:end]"""
+    if end is None:
+        end = len(buf)
+    pos = start
+    while pos + _RECORD_HEADER.size <= end:
+        tag, length = _RECORD_HEADER.unpack_from(buf, pos)
+        payload_start = pos + _RECORD_HEADER.size
+        payload_end = payload_start + length
+        if payload_end > end:
+            # Truncated record (crate still being written) - stop cleanly
+            break
+        yield tag, payload_start, payload_end
+        pos = payload_end
+
+def track_basename(path):
+    """Lowercased filename of a crate path, whatever separator the volume used"""
+    return path.replace('\\', '/').rsplit('/', 1)[-1].strip().lower()
+
+def iter_crate_paths(buf, base_path_only=True):
+    """Yield ptrk paths from an in-memory (or memory-mapped) crate buffer"""
+    for tag, start, end in iter_crate_records(buf):
+        if tag != b'otrk':
+            continue
+        for sub_tag, sub_start, sub_end in iter_crate_records(buf, start, end):
+            if sub_tag != b'ptrk':
+                continue
+            path = buf[sub_start:sub_end].decode('utf-16-be', errors='replace')
             if base_path_only:
-                path = os.path.basename(path).strip().lower()
-            paths.add(path)
-    return paths
+                path = track_basename(path)
+            if path:
+                yield path
+
+def extract_paths_from_crate(crate_file, base_path_only=True):
+    """Yield audio file paths from a Serato .crate file, in crate order"""
+    with open(crate_file, 'rb') as f_in:
+        if os.fstat(f_in.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f_in.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            yield from iter_crate_paths(buf, base_path_only)
+
+def crate_tag_for(crate_path):
+    """Crate tag is the crate filename without its extension"""
+    return os.path.splitext(os.path.basename(crate_path))[0]
+
+def scan_crate(crate_path):
+    """Parse one crate -> (crate_tag, [filenames]) in crate order, duplicates dropped"""
+    return crate_tag_for(crate_path), list(dict.fromkeys(extract_paths_from_crate(crate_path, base_path_only=True)))
+
+def rescan_crate(job):
+    """
+    Worker for incremental scans: (crate_path, cached_sha1) -> (crate_tag, sha1, tracks).
 
-def build_crate_tag_lookup(crate_folder):
-    """Scan all .crate files and build a mapping: filename -> set of crate tags"""
+    The crate is mapped once, hashed, and only parsed if the hash differs from
+    the cached one; tracks is None when the content turned out unchanged.
+    """
+    crate_path, cached_sha1 = job
+    with open(crate_path, 'rb') as f_in:
+        if os.fstat(f_in.fileno()).st_size == 0:
+            return crate_tag_for(crate_path), hashlib.sha1().hexdigest(), []
+        with mmap.mmap(f_in.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            digest = hashlib.sha1(buf).hexdigest()
+            if digest == cached_sha1:
+                return crate_tag_for(crate_path), digest, None
+            return crate_tag_for(crate_path), digest, list(dict.fromkeys(iter_crate_paths(buf)))
+
+def pool_map(func, items, workers=None):
+    """
+    Yield func(item) for each item, in input order.
+
+    With workers > 1 the items are processed in a bounded process pool while
+    the caller consumes finished results, so slow share reads overlap.
+    """
+    if not workers or workers <= 1 or len(items) < 2:
+        yield from map(func, items)
+        return
+    chunksize = max(1, len(items) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(func, items, chunksize=chunksize)
+
+def build_crate_tag_lookup(crate_folder, workers=None, cache_path=None):
+    """
+    Scan all .crate files and build a mapping: filename -> set of crate tags
+
+    Pass cache_path to reuse a scan cache; see update_crate_tag_lookup().
+    """
+    if cache_path:
+        return update_crate_tag_lookup(crate_folder, cache_path, workers)[0]
+    crate_files = sorted(f for f in os.listdir(crate_folder) if f.endswith('.crate'))
+    crate_paths = [os.path.join(crate_folder, f) for f in crate_files]
     crate_tag_lookup = {}
-    total_crates = 0
     total_tracks = 0
-    for filename in os.listdir(crate_folder):
-        if filename.endswith('.crate'):
-            total_crates += 1
-            crate_tag = os.path.splitext(filename)[0]
-            crate_paths = extract_paths_from_crate(os.path.join(crate_folder, filename), base_path_only=True)
-            total_tracks += len(crate_paths)
-            for fname in crate_paths:
-                crate_tag_lookup.setdefault(fname, set()).add(crate_tag)
-    print(f"Processed {total_crates} crates, found {total_tracks} total track references")
+    # Only this process touches the lookup; workers just hand back track lists
+    for crate_tag, crate_tracks in pool_map(scan_crate, crate_paths, workers):
+        total_tracks += len(crate_tracks)
+        for fname in crate_tracks:
+            crate_tag_lookup.setdefault(fname, set()).add(crate_tag)
+    print(f"Processed {len(crate_files)} crates, found {total_tracks} total track references")
     print(f"Unique tracks: {len(crate_tag_lookup)}")
     return crate_tag_lookup
 
-def export_crate_tags(crate_tag_lookup, output_csv):
-    """Export the lookup table to a CSV file"""
+def build_crate_matrix(crate_folder, workers=None, cache_path=None):
+    """
+    Scan all .crate files into a track x crate CrateMatrix.
+
+    With cache_path the scan goes through the incremental cache and the
+    matrix is built from the cached track lists.
+    """
+    if cache_path:
+        update_crate_tag_lookup(crate_folder, cache_path, workers)
+        crate_members = crate_members_from_cache(load_scan_cache(cache_path))
+    else:
+        crate_files = sorted(f for f in os.listdir(crate_folder) if f.endswith('.crate'))
+        crate_paths = [os.path.join(crate_folder, f) for f in crate_files]
+        crate_members = dict(pool_map(scan_crate, crate_paths, workers))
+    matrix = CrateMatrix.from_crate_members(crate_members)
+    print(f"Crate matrix: {len(matrix.tracks)} tracks x {len(matrix.crates)} crates, "
+          f"{len(matrix.indices)} memberships")
+    return matrix
+
+# ==========================================
+# INCREMENTAL SCAN CACHE
+# ==========================================
+# The cache is a JSON file of {crate filename: {size, mtime_ns, sha1, tracks}}.
+# A crate whose size and mtime are unchanged is served straight from the cache;
+# one whose stat changed is re-hashed, and only re-parsed if the hash differs.
+SCAN_CACHE_VERSION = 1
+
+def load_scan_cache(cache_path):
+    """Load the crate scan cache, or an empty one if missing/stale"""
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {'version': SCAN_CACHE_VERSION, 'crates': {}}
+    if cache.get('version') != SCAN_CACHE_VERSION:
+        return {'version': SCAN_CACHE_VERSION, 'crates': {}}
+    return cache
+
+def save_scan_cache(cache, cache_path):
+    """Write the scan cache atomically so an interrupted run never corrupts it"""
+    tmp_path = cache_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f)
+    os.replace(tmp_path, cache_path)
+
+def diff_crate_members(old_tracks, new_tracks):
+    """Return (added, removed) track sets between two versions of a crate"""
+    old_tracks, new_tracks = set(old_tracks), set(new_tracks)
+    return new_tracks - old_tracks, old_tracks - new_tracks
+
+def apply_crate_changes(crate_tag_lookup, changes):
+    """Patch a filename -> tags lookup in place with {crate_tag: (added, removed)}"""
+    for crate_tag, (added, removed) in changes.items():
+        for fname in removed:
+            tags = crate_tag_lookup.get(fname)
+            if tags is None:
+                continue
+            tags.discard(crate_tag)
+            if not tags:
+                del crate_tag_lookup[fname]
+        for fname in added:
+            crate_tag_lookup.setdefault(fname, set()).add(crate_tag)
+
+def crate_members_from_cache(cache):
+    """{crate_tag: [tracks]} for every cached crate"""
+    return {crate_tag_for(crate_file): entry['tracks'] for crate_file, entry in cache['crates'].items()}
+
+def lookup_from_cache(cache):
+    """Rebuild the filename -> tags lookup from cached track lists (no file I/O)"""
+    crate_tag_lookup = {}
+    for crate_file in sorted(cache['crates']):
+        crate_tag = crate_tag_for(crate_file)
+        for fname in cache['crates'][crate_file]['tracks']:
+            crate_tag_lookup.setdefault(fname, set()).add(crate_tag)
+    return crate_tag_lookup
+
+def update_crate_tag_lookup(crate_folder, cache_path, workers=None, output_csv=None):
+    """
+    Incrementally rescan a crate folder against the on-disk scan cache.
+
+    Returns (crate_tag_lookup, changes) where changes maps each modified, added
+    or deleted crate tag to its (added, removed) track sets. changes is None
+    when there was no usable cache, i.e. everything was parsed from scratch.
+
+    With output_csv, the crate-tags CSV is patched before the cache is saved,
+    so a run that dies in between is redone rather than reported as no change.
+    """
+    cache = load_scan_cache(cache_path)
+    cached = cache['crates']
+    cold = not cached
+    crate_tag_lookup = lookup_from_cache(cache)
+
+    present = {}
+    for entry in os.scandir(crate_folder):
+        if entry.name.endswith('.crate') and entry.is_file():
+            present[entry.name] = entry.stat()
+
+    hits = 0
+    jobs = []
+    for crate_file in sorted(present):
+        st = present[crate_file]
+        old = cached.get(crate_file)
+        if old and old['size'] == st.st_size and old['mtime_ns'] == st.st_mtime_ns:
+            hits += 1
+            continue
+        jobs.append((os.path.join(crate_folder, crate_file), old['sha1'] if old else None))
+
+    changes = {}
+    reparsed = 0
+    for (crate_path, _), (crate_tag, digest, tracks) in zip(jobs, pool_map(rescan_crate, jobs, workers)):
+        crate_file = os.path.basename(crate_path)
+        st = present[crate_file]
+        old = cached.get(crate_file)
+        if tracks is None:
+            # Touched but byte-identical: refresh the stat, keep the tracks
+            hits += 1
+            tracks = old['tracks']
+        else:
+            reparsed += 1
+            changes[crate_tag] = diff_crate_members(old['tracks'] if old else [], tracks)
+        cached[crate_file] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha1': digest, 'tracks': tracks}
+
+    deleted = sorted(set(cached) - set(present))
+    for crate_file in deleted:
+        changes[crate_tag_for(crate_file)] = (set(), set(cached.pop(crate_file)['tracks']))
+
+    apply_crate_changes(crate_tag_lookup, changes)
+    print(f"Crate cache: {hits} hits, {reparsed} re-parsed, {len(deleted)} deleted")
+    print(f"Unique tracks: {len(crate_tag_lookup)}")
+    if output_csv:
+        patch_crate_tags_csv(crate_tag_lookup, None if cold else changes, output_csv)
+    save_scan_cache(cache, cache_path)
+    return crate_tag_lookup, (None if cold else changes)
+
+def export_crate_tags(crate_tags, output_csv):
+    """Export a CrateMatrix (or legacy filename -> tags lookup) to a CSV file"""
+    if isinstance(crate_tags, CrateMatrix):
+        rows = crate_tags.iter_tag_rows()
+    else:
+        rows = ((fname, ', '.join(sorted(tags))) for fname, tags in crate_tags.items())
     with open(output_csv, 'w', newline='', encoding='utf-8') as csvfile:
         writer = csv.writer(csvfile)
         writer.writerow(['filename', 'crate_tags'])
-        for fname, tags in crate_tag_lookup.items():
-            writer.writerow([fname, ', '.join(sorted(tags))])
+        writer.writerows(rows)
     print(f"Exported to {output_csv}")
 
+def patch_crate_tags_csv(crate_tag_lookup, changes, output_csv):
+    """
+    Rewrite only the rows of an existing crate-tags CSV touched by changes.
+
+    Untouched rows are copied through verbatim, tracks that left every crate
+    are dropped and new tracks are appended. Falls back to a full export when
+    the CSV does not exist yet or changes is None.
+    """
+    if changes is None or not os.path.exists(output_csv):
+        export_crate_tags(crate_tag_lookup, output_csv)
+        return
+    affected = set()
+    for added, removed in changes.values():
+        affected |= added
+        affected |= removed
+    if not affected:
+        print(f"{output_csv} already up to date")
+        return
+
+    tmp_path = output_csv + '.tmp'
+    seen = set()
+    with open(output_csv, 'r', newline='', encoding='utf-8') as f_in, \
+            open(tmp_path, 'w', newline='', encoding='utf-8') as f_out:
+        reader = csv.reader(f_in)
+        writer = csv.writer(f_out)
+        writer.writerow(next(reader, ['filename', 'crate_tags']))
+        for row in reader:
+            fname = row[0] if row else ''
+            if fname not in affected:
+                writer.writerow(row)
+                continue
+            seen.add(fname)
+            if fname in crate_tag_lookup:
+                writer.writerow([fname, ', '.join(sorted(crate_tag_lookup[fname]))])
+        for fname in sorted(affected - seen):
+            if fname in crate_tag_lookup:
+                writer.writerow([fname, ', '.join(sorted(crate_tag_lookup[fname]))])
+    os.replace(tmp_path, output_csv)
+    print(f"Patched {len(affected)} rows in {output_csv}")
+
 # Usage:
 if __name__ == "__main__":
     crate_folder = r'C:\Users\fulmi\Downloads\GF'  # Change to your folder path
-    crate_tag_lookup = build_crate_tag_lookup(crate_folder)
-    export_crate_tags(crate_tag_lookup, 'all_tracks_crate_tags.csv')
+    crate_tag_lookup, changes = update_crate_tag_lookup(crate_folder, 'crate_scan_cache.json', workers=os.cpu_count(),
+                                                        output_csv='all_tracks_crate_tags.csv')
+    matrix = CrateMatrix.from_crate_members(crate_members_from_cache(load_scan_cache('crate_scan_cache.json')))
+    matrix.save('crate_membership.npz')
+    print(f"Saved {len(matrix.tracks)} x {len(matrix.crates)} membership matrix")
     print("Done!")
@@ -0,0 +1,158 @@
+# Track x crate membership as a sparse CSR matrix.
+# Track filenames and crate tags are interned once; membership is two integer
+# arrays (indptr, indices) instead of a dict of sets of repeated strings.
+# Rows answer "which crates is this track in", columns (via a lazily built
+# CSC transpose) answer "which tracks are in this crate".
+
+import numpy as np
+
+
+class CrateMatrix:
+    def __init__(self, tracks, crates, indptr, indices):
+        """
+        Args:
+            tracks: Track filenames; row i is tracks[i]
+            crates: Crate tags, sorted; column j is crates[j]
+            indptr: CSR row pointer, len(tracks) + 1
+            indices: Crate ids per row, sorted within each row
+        """
+        self.tracks = list(tracks)
+        self.crates = list(crates)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.track_id = {t: i for i, t in enumerate(self.tracks)}
+        self.crate_id = {c: j for j, c in enumerate(self.crates)}
+        self._csc = None
+
+    @classmethod
+    def from_crate_members(cls, crate_members):
+        """
+        Build from {crate_tag: iterable of track filenames}.
+
+        Tracks are numbered in first-seen order over the crates in sorted
+        order, which matches the row order of the dict-based lookup.
+        """
+        crates = sorted(crate_members)
+        track_id = {}
+        rows, cols = [], []
+        for j, crate_tag in enumerate(crates):
+            for track in crate_members[crate_tag]:
+                i = track_id.setdefault(track, len(track_id))
+                rows.append(i)
+                cols.append(j)
+        return cls._from_pairs(list(track_id), crates, rows, cols)
+
+    @classmethod
+    def from_lookup(cls, crate_tag_lookup):
+        """Build from the legacy {filename: set(crate_tag)} lookup"""
+        crates = sorted({tag for tags in crate_tag_lookup.values() for tag in tags})
+        crate_id = {c: j for j, c in enumerate(crates)}
+        rows, cols = [], []
+        for i, tags in enumerate(crate_tag_lookup.values()):
+            for tag in tags:
+                rows.append(i)
+                cols.append(crate_id[tag])
+        return cls._from_pairs(list(crate_tag_lookup), crates, rows, cols)
+
+    @classmethod
+    def _from_pairs(cls, tracks, crates, rows, cols):
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int32)
+        # Sort by (row, col) and drop duplicate memberships
+        order = np.lexsort((cols, rows))
+        rows, cols = rows[order], cols[order]
+        if len(rows):
+            keep = np.ones(len(rows), dtype=bool)
+            keep[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+            rows, cols = rows[keep], cols[keep]
+        indptr = np.zeros(len(tracks) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(tracks)), out=indptr[1:])
+        return cls(tracks, crates, indptr, cols)
+
+    # ----- slicing -----
+
+    def row(self, track):
+        """Crate ids for one track (sorted)"""
+        i = self.track_id[track]
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def crates_of(self, track):
+        return [self.crates[j] for j in self.row(track)]
+
+    def _transpose(self):
+        if self._csc is None:
+            rows = np.repeat(np.arange(len(self.tracks), dtype=np.int64), np.diff(self.indptr))
+            order = np.argsort(self.indices, kind='stable')
+            col_ptr = np.zeros(len(self.crates) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self.indices, minlength=len(self.crates)), out=col_ptr[1:])
+            self._csc = (col_ptr, rows[order])
+        return self._csc
+
+    def column(self, crate_tag):
+        """Track ids in one crate (sorted)"""
+        col_ptr, row_ids = self._transpose()
+        j = self.crate_id.get(crate_tag)
+        if j is None:
+            return np.empty(0, dtype=np.int64)
+        return row_ids[col_ptr[j]:col_ptr[j + 1]]
+
+    def tracks_in(self, crate_tag):
+        return [self.tracks[i] for i in self.column(crate_tag)]
+
+    # ----- set algebra -----
+
+    def select(self, all_of=(), any_of=(), none_of=()):
+        """
+        Track ids in every crate of all_of, at least one of any_of, and none
+        of none_of. select(all_of=['A', 'B'], none_of=['C']) -> in A and B, not C.
+        """
+        result = None
+        for crate_tag in all_of:
+            ids = self.column(crate_tag)
+            result = ids if result is None else np.intersect1d(result, ids, assume_unique=True)
+        if any_of:
+            union = np.unique(np.concatenate([self.column(c) for c in any_of]))
+            result = union if result is None else np.intersect1d(result, union, assume_unique=True)
+        if result is None:
+            result = np.arange(len(self.tracks), dtype=np.int64)
+        for crate_tag in none_of:
+            result = np.setdiff1d(result, self.column(crate_tag), assume_unique=True)
+        return result
+
+    def select_tracks(self, all_of=(), any_of=(), none_of=()):
+        return [self.tracks[i] for i in self.select(all_of, any_of, none_of)]
+
+    # ----- views -----
+
+    def iter_tag_rows(self):
+        """(filename, 'crate, crate') rows: the all_tracks_crate_tags.csv view"""
+        for i, track in enumerate(self.tracks):
+            ids = self.indices[self.indptr[i]:self.indptr[i + 1]]
+            if len(ids):
+                yield track, ', '.join(self.crates[j] for j in ids)
+
+    def to_lookup(self):
+        """Back to the legacy {filename: set(crate_tag)} form"""
+        return {track: set(self.crates_of(track)) for track in self.tracks
+                if self.indptr[self.track_id[track] + 1] > self.indptr[self.track_id[track]]}
+
+    # ----- serialization -----
+
+    def save(self, path):
+        """Compact binary: CSR arrays plus NUL-joined UTF-8 name tables"""
+        np.savez_compressed(
+            path,
+            indptr=self.indptr,
+            indices=self.indices,
+            tracks=np.frombuffer('\0'.join(self.tracks).encode('utf-8'), dtype=np.uint8),
+            crates=np.frombuffer('\0'.join(self.crates).encode('utf-8'), dtype=np.uint8),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            tracks = data['tracks'].tobytes().decode('utf-8')
+            crates = data['crates'].tobytes().decode('utf-8')
+            return cls(tracks.split('\0') if tracks else [],
+                       crates.split('\0') if crates else [],
+                       data['indptr'], data['indices'])
@@ -0,0 +1,143 @@
+# Subcrate hierarchy index.
+# Serato encodes crate nesting in the filename: 'Genres%%House%%Deep.crate' is
+# the 'Deep' subcrate of 'House' under 'Genres'. The tree precomputes, for each
+# node, the union of its own tracks and every descendant's, so "all tracks under
+# Genres" is one dict lookup instead of a prefix scan over crate names.
+
+import json
+import hashlib
+
+from crate_extractor_corrected import load_scan_cache, crate_members_from_cache
+
+SUBCRATE_SEP = '%%'
+
+
+def crate_node(crate_tag):
+    """'Genres%%House' -> ('Genres', 'House')"""
+    return tuple(part.strip() for part in crate_tag.split(SUBCRATE_SEP))
+
+
+class CrateTree:
+    def __init__(self, crate_members):
+        """
+        Build the tree from {crate_tag: iterable of track filenames}.
+
+        Parents that exist only as a prefix (no crate file of their own) are
+        created implicitly with no direct members.
+        """
+        self.members = {}
+        self.children = {(): set()}
+        for crate_tag, tracks in crate_members.items():
+            node = crate_node(crate_tag)
+            self.members[node] = frozenset(tracks)
+            for depth in range(1, len(node) + 1):
+                self.children.setdefault(node[:depth], set())
+                self.children[node[:depth - 1]].add(node[:depth])
+
+        # Deepest nodes first, so every child's closure is ready before its parent's
+        self.closure = {}
+        for node in sorted(self.children, key=len, reverse=True):
+            tracks = set(self.members.get(node, ()))
+            for child in self.children[node]:
+                tracks |= self.closure[child]
+            self.closure[node] = frozenset(tracks)
+
+    def tracks_under(self, *crate_tags):
+        """Tracks in any of the given crates or their subcrates ('Genres', 'Vibe%%Dark', ...)"""
+        result = set()
+        for crate_tag in crate_tags:
+            result |= self.closure.get(crate_node(crate_tag), frozenset())
+        return result
+
+    def descendants(self, crate_tag):
+        """All subcrate tags below crate_tag, depth first"""
+        out = []
+        stack = sorted(self.children.get(crate_node(crate_tag), ()), reverse=True)
+        while stack:
+            node = stack.pop()
+            out.append(SUBCRATE_SEP.join(node))
+            stack.extend(sorted(self.children[node], reverse=True))
+        return out
+
+    def parent_of(self, crate_tag):
+        """Immediate parent tag, or None for a top-level crate"""
+        node = crate_node(crate_tag)
+        return SUBCRATE_SEP.join(node[:-1]) if len(node) > 1 else None
+
+    # ----- serialization -----
+
+    def to_json(self, fingerprint=None):
+        """Compact form: tracks interned once, nodes refer to them by index"""
+        tracks = sorted(self.closure[()])
+        index = {t: i for i, t in enumerate(tracks)}
+        nodes = {}
+        for node in self.children:
+            if not node:
+                continue
+            nodes[SUBCRATE_SEP.join(node)] = {
+                'crate': node in self.members,
+                'members': sorted(index[t] for t in self.members.get(node, ())),
+                'closure': sorted(index[t] for t in self.closure[node]),
+            }
+        return {'fingerprint': fingerprint, 'tracks': tracks, 'nodes': nodes}
+
+    @classmethod
+    def from_json(cls, data):
+        """Rebuild from to_json() output without recomputing closures"""
+        tree = cls.__new__(cls)
+        tracks = data['tracks']
+        tree.members = {}
+        tree.children = {(): set()}
+        tree.closure = {(): frozenset(tracks)}
+        for crate_tag, node_data in data['nodes'].items():
+            node = crate_node(crate_tag)
+            if node_data['crate']:
+                tree.members[node] = frozenset(tracks[i] for i in node_data['members'])
+            tree.closure[node] = frozenset(tracks[i] for i in node_data['closure'])
+            tree.children.setdefault(node, set())
+            tree.children.setdefault(node[:-1], set()).add(node)
+        return tree
+
+
+def scan_fingerprint(cache):
+    """Hash of every cached crate's content hash; changes whenever any crate does"""
+    digest = hashlib.sha1()
+    for crate_file in sorted(cache['crates']):
+        digest.update(crate_file.encode('utf-8'))
+        digest.update(cache['crates'][crate_file]['sha1'].encode('ascii'))
+    return digest.hexdigest()
+
+
+def load_crate_tree(cache_path, tree_path):
+    """
+    Return the CrateTree for the crates in the scan cache.
+
+    The tree is stored next to the scan cache with a fingerprint of the crate
+    hashes, and only rebuilt when a crate was added, removed or changed.
+    """
+    cache = load_scan_cache(cache_path)
+    fingerprint = scan_fingerprint(cache)
+    try:
+        with open(tree_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('fingerprint') == fingerprint:
+            return CrateTree.from_json(data)
+    except (OSError, ValueError):
+        pass
+
+    tree = CrateTree(crate_members_from_cache(cache))
+    with open(tree_path, 'w', encoding='utf-8') as f:
+        json.dump(tree.to_json(fingerprint), f)
+    print(f"✓ Rebuilt crate tree ({len(tree.children) - 1} nodes) -> {tree_path}")
+    return tree
+
+
+# === USAGE ===
+if __name__ == "__main__":
+    cache_path = 'crate_scan_cache.json'   # written by crate_extractor_corrected
+    tree_path = 'crate_tree.json'
+
+    tree = load_crate_tree(cache_path, tree_path)
+    for top in sorted(tree.children[()]):
+        tag = SUBCRATE_SEP.join(top)
+        print(f"{tag}: {len(tree.tracks_under(tag))} tracks, {len(tree.descendants(tag))} subcrates")
@@ -0,0 +1,135 @@
+# Long-running watch mode for the Serato crate folder.
+# Re-parses only the crate that changed, prints (track, crate) membership
+# deltas and keeps all_tracks_crate_tags.csv current for the master build.
+#
+# Requires: pip install watchdog  (inotify on Linux, native APIs elsewhere)
+
+import os
+import time
+import threading
+
+from watchdog.observers import Observer
+from watchdog.events import FileSystemEventHandler
+
+from crate_extractor_corrected import (
+    update_crate_tag_lookup, rescan_crate, diff_crate_members, apply_crate_changes,
+    patch_crate_tags_csv, load_scan_cache, save_scan_cache, crate_tag_for,
+)
+
+# ==========================================
+# CONFIGURE THIS
+# ==========================================
+crate_folder = r'C:\Users\fulmi\Downloads\GF'
+cache_path = 'crate_scan_cache.json'
+output_csv = 'all_tracks_crate_tags.csv'
+debounce_sec = 1.5   # Serato autosaves in bursts; wait for the folder to go quiet
+# ==========================================
+
+
+def print_delta(op, track, crate_tag):
+    """Default delta sink: '+ track  [crate]' / '- track  [crate]'"""
+    print(f"{op} {track}  [{crate_tag}]")
+
+
+class CrateWatcher(FileSystemEventHandler):
+    def __init__(self, crate_folder, cache_path, output_csv, debounce_sec=1.5, on_delta=print_delta):
+        """
+        Args:
+            crate_folder: Serato Subcrates folder to watch
+            cache_path: Scan cache shared with crate_extractor_corrected
+            output_csv: Crate-tags CSV kept in sync with every delta
+            debounce_sec: Quiet period before a changed crate is re-parsed
+            on_delta: Callback(op, track, crate_tag) with op '+' or '-'
+        """
+        self.crate_folder = crate_folder
+        self.cache_path = cache_path
+        self.output_csv = output_csv
+        self.debounce_sec = debounce_sec
+        self.on_delta = on_delta
+
+        self._pending = {}   # crate filename -> monotonic time of last event
+        self._lock = threading.Lock()
+
+        # Catch up on anything that changed while we were not watching
+        self.lookup, _ = update_crate_tag_lookup(crate_folder, cache_path, output_csv=output_csv)
+        self.cache = load_scan_cache(cache_path)
+
+    # ----- watchdog callbacks (observer thread) -----
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        for path in (event.src_path, getattr(event, 'dest_path', '')):
+            if path and path.endswith('.crate'):
+                with self._lock:
+                    self._pending[os.path.basename(path)] = time.monotonic()
+
+    # ----- processing (main thread) -----
+
+    def _take_settled(self):
+        """Pop crates whose last event is older than the debounce window"""
+        now = time.monotonic()
+        with self._lock:
+            settled = sorted(f for f, t in self._pending.items() if now - t >= self.debounce_sec)
+            for crate_file in settled:
+                del self._pending[crate_file]
+        return settled
+
+    def process(self, crate_files):
+        """Re-parse the given crates, emit deltas and patch the lookup/CSV/cache"""
+        cached = self.cache['crates']
+        changes = {}
+        for crate_file in crate_files:
+            crate_path = os.path.join(self.crate_folder, crate_file)
+            crate_tag = crate_tag_for(crate_file)
+            old = cached.get(crate_file)
+            old_tracks = old['tracks'] if old else []
+            try:
+                st = os.stat(crate_path)
+                _, digest, tracks = rescan_crate((crate_path, old['sha1'] if old else None))
+            except FileNotFoundError:
+                if old:
+                    changes[crate_tag] = (set(), set(old_tracks))
+                    del cached[crate_file]
+                continue
+            if tracks is None:
+                tracks = old_tracks
+            else:
+                changes[crate_tag] = diff_crate_members(old_tracks, tracks)
+            cached[crate_file] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha1': digest, 'tracks': tracks}
+
+        changes = {tag: delta for tag, delta in changes.items() if delta[0] or delta[1]}
+        if not changes:
+            return
+
+        for crate_tag, (added, removed) in sorted(changes.items()):
+            for track in sorted(removed):
+                self.on_delta('-', track, crate_tag)
+            for track in sorted(added):
+                self.on_delta('+', track, crate_tag)
+
+        apply_crate_changes(self.lookup, changes)
+        patch_crate_tags_csv(self.lookup, changes, self.output_csv)
+        save_scan_cache(self.cache, self.cache_path)
+
+    def run(self, poll_sec=0.25):
+        observer = Observer()
+        observer.schedule(self, self.crate_folder, recursive=False)
+        observer.start()
+        print(f"Watching {self.crate_folder} (Ctrl+C to stop)...")
+        try:
+            while True:
+                time.sleep(poll_sec)
+                settled = self._take_settled()
+                if settled:
+                    self.process(settled)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            observer.stop()
+            observer.join()
+
+
+# === USAGE ===
+if __name__ == "__main__":
+    CrateWatcher(crate_folder, cache_path, output_csv, debounce_sec).run()
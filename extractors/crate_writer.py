@@ -0,0 +1,194 @@
+# Bulk Serato crate writer.
+# Turns reconciled taxonomy columns in the master dataset (Vibe, Sound, Set,
+# Placement, ...) and saved queries into .crate files, so the taxonomy reaches
+# the decks. Inverse of extract_paths_from_crate.
+
+import os
+import struct
+from ntpath import splitdrive
+
+import pandas as pd
+
+from crate_extractor_corrected import extract_paths_from_crate
+
+# ==========================================
+# CONFIGURE THIS
+# ==========================================
+master_csv = r"C:\Users\fulmi\Downloads\Set Lists\master_library_final.csv"
+subcrate_folder = r"C:\Users\fulmi\Music\_Serato_\Subcrates"
+taxonomy_columns = ['Vibe', 'Sound', 'Set', 'Placement']
+crate_prefix = 'Taxonomy'   # crates land under 'Taxonomy%%Vibe%%Dark' etc.
+
+# Saved queries: crate name -> pandas query over the master table
+saved_queries = {
+    'Queries%%Peak Time 126+': "`Track BPM` >= 126 and Energy >= 7",
+}
+# ==========================================
+
+SUBCRATE_SEP = '%%'
+CRATE_VERSION = '1.0/Serato ScratchLive Crate'
+CRATE_COLUMNS = ['song', 'artist', 'bpm', 'key', 'album', 'length']
+
+
+def encode_record(tag, payload):
+    """One TLV record: 4-byte tag, big-endian length, payload"""
+    return tag + struct.pack('>I', len(payload)) + payload
+
+
+def encode_text(text):
+    return text.encode('utf-16-be')
+
+
+def crate_header():
+    """vrsn + sort + column layout shared by every generated crate"""
+    header = encode_record(b'vrsn', encode_text(CRATE_VERSION))
+    header += encode_record(b'osrt', encode_record(b'tvcn', encode_text('song')) + encode_record(b'brev', b'\x00'))
+    for column in CRATE_COLUMNS:
+        header += encode_record(b'ovct', encode_record(b'tvcn', encode_text(column)) +
+                                encode_record(b'tvcw', encode_text('0')))
+    return header
+
+
+def serato_path(filepath):
+    """Serato stores paths relative to the volume root, '/'-separated, no drive"""
+    _, path = splitdrive(filepath)
+    return path.replace('\\', '/').lstrip('/')
+
+
+def clean_crate_name(name):
+    """Crate names become filenames; drop characters Windows rejects at every level"""
+    levels = str(name).split(SUBCRATE_SEP)
+    return SUBCRATE_SEP.join(''.join(ch for ch in level if ch not in '<>:"/\\|?*').strip() for level in levels)
+
+
+def split_values(value):
+    """Master taxonomy cells hold '; '-separated selections"""
+    if pd.isna(value):
+        return []
+    return [v.strip() for v in str(value).split(';') if v.strip()]
+
+
+def collect_crates(master_df, taxonomy_columns, saved_queries=None, crate_prefix='', path_column='filepath'):
+    """
+    Single pass over the master table -> {crate name: [filepaths in row order]}.
+
+    Each taxonomy value gets a crate named prefix%%Column%%Value; each saved
+    query is evaluated once as a boolean mask. Crate names are filenames, so
+    names that only differ by characters clean_crate_name drops (or by case)
+    would share one file: such taxonomy values are merged with a warning,
+    values that clean to nothing are skipped, and a saved query that would
+    replace another crate raises ValueError.
+    """
+    prefix = crate_prefix + SUBCRATE_SEP if crate_prefix else ''
+    crates = {}
+    sources = {}     # casefolded crate name -> (crate name, value it came from)
+    merged = set()
+    skipped = set()
+    columns = [c for c in taxonomy_columns if c in master_df.columns]
+    paths = master_df[path_column]
+
+    for filepath, *cells in zip(paths, *(master_df[c] for c in columns)):
+        if pd.isna(filepath) or not str(filepath).strip():
+            continue
+        for column, cell in zip(columns, cells):
+            for value in split_values(cell):
+                # Values may not contain the separator, or they would nest
+                cleaned = clean_crate_name(value.replace(SUBCRATE_SEP, ' '))
+                if not cleaned:
+                    skipped.add((column, value))
+                    continue
+                name = f"{prefix}{column}{SUBCRATE_SEP}{cleaned}"
+                key = name.casefold()
+                if key not in sources:
+                    sources[key] = (name, value)
+                first_name, first_value = sources[key]
+                if value != first_value and (column, value) not in merged:
+                    merged.add((column, value))
+                    print(f"⚠ {column} value {value!r} shares crate {first_name!r} with {first_value!r}")
+                crates.setdefault(first_name, []).append(filepath)
+
+    for column, value in sorted(skipped):
+        print(f"⚠ {column} value {value!r} is not a valid crate name; skipped")
+
+    for name, query in (saved_queries or {}).items():
+        cleaned = clean_crate_name(name)
+        if not all(cleaned.split(SUBCRATE_SEP)):
+            raise ValueError(f"Saved query {name!r} has an empty crate name level")
+        if cleaned.casefold() in sources:
+            raise ValueError(f"Saved query {name!r} would replace crate {sources[cleaned.casefold()][0]!r}")
+        sources[cleaned.casefold()] = (cleaned, name)
+        mask = master_df.eval(query)
+        crates[cleaned] = [p for p in paths[mask] if pd.notna(p) and str(p).strip()]
+
+    return crates
+
+
+def write_crates(crates, subcrate_folder, crate_prefix=''):
+    """
+    Write one .crate per entry, touching only crates whose bytes changed.
+
+    Each track's otrk/ptrk record is encoded once and reused by every crate it
+    appears in. Files are written to a temp name and renamed into place, so
+    Serato never sees a half-written crate. With crate_prefix, generated
+    crates under prefix%% that are no longer in crates (the taxonomy value
+    disappeared from the master) are deleted.
+    """
+    os.makedirs(subcrate_folder, exist_ok=True)
+    header = crate_header()
+    encoded = {}
+    written = unchanged = 0
+
+    for name in sorted(crates):
+        records = []
+        for filepath in dict.fromkeys(crates[name]):
+            record = encoded.get(filepath)
+            if record is None:
+                record = encode_record(b'otrk', encode_record(b'ptrk', encode_text(serato_path(filepath))))
+                encoded[filepath] = record
+            records.append(record)
+        data = header + b''.join(records)
+
+        crate_path = os.path.join(subcrate_folder, name + '.crate')
+        try:
+            if os.path.getsize(crate_path) == len(data):
+                with open(crate_path, 'rb') as f:
+                    if f.read() == data:
+                        unchanged += 1
+                        continue
+        except OSError:
+            pass
+
+        tmp_path = crate_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, crate_path)
+        written += 1
+
+    removed = 0
+    if crate_prefix:
+        namespace = crate_prefix + SUBCRATE_SEP
+        for entry in os.scandir(subcrate_folder):
+            name = entry.name[:-len('.crate')]
+            if entry.name.endswith('.crate') and name.startswith(namespace) and name not in crates:
+                os.remove(entry.path)
+                removed += 1
+
+    print(f"✓ Crates: {written} written, {unchanged} unchanged, {removed} stale removed "
+          f"({len(encoded)} unique tracks)")
+    return written
+
+
+# === USAGE ===
+if __name__ == "__main__":
+    master_df = pd.read_csv(master_csv)
+    print(f"Loaded {len(master_df)} tracks from {master_csv}")
+
+    crates = collect_crates(master_df, taxonomy_columns, saved_queries, crate_prefix)
+    write_crates(crates, subcrate_folder, crate_prefix)
+
+    # Round-trip check on one crate
+    if crates:
+        name = sorted(crates)[0]
+        back = list(extract_paths_from_crate(os.path.join(subcrate_folder, name + '.crate'), base_path_only=False))
+        print(f"{name}: {len(back)} tracks read back")
+    print("\nDone!")
@@ -1,81 +1,382 @@
 import os
 import csv
-from pathlib import Path
+import time
+import sqlite3
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
 from mutagen.id3 import ID3
+from mutagen.aiff import AIFF
+from mutagen.wave import WAVE
+
+from id3_frames import read_id3_frames, UnsupportedTag
+from audio_tags import find_id3_chunk, read_flac_fields, read_mp4_fields
 
 # ==========================================
 # CONFIGURE THIS
 # ==========================================
 music_dir = r"C:\Users\rmmcc\OneDrive\Documents\Music"
-output_csv = "mik_full_export.csv"
+output_path = "mik_full_export.csv"   # or "mik_full_export.parquet" (needs pyarrow)
+cache_path = "mik_tag_cache.sqlite"   # Set to None to force a full re-read
+io_workers = 16        # Concurrent file reads; raise for OneDrive/network storage
+batch_size = 1000      # Rows buffered per column before each flush to disk
+progress_every = 2.0   # Seconds between progress lines
+# ==========================================
+
+FIELDNAMES = ['filepath', 'artist', 'title', 'album', 'bpm', 'key', 'energy',
+              'genre', 'label', 'year', 'isrc', 'remixer', 'copyright', 'has_cover']
+
+# Export field -> ID3 frame read by the lean reader ('year' falls back to TYER)
+FIELD_FRAMES = {'artist': 'TPE1', 'title': 'TIT2', 'album': 'TALB', 'bpm': 'TBPM',
+                'key': 'TKEY', 'energy': 'COMM', 'genre': 'TCON', 'label': 'TPUB',
+                'year': 'TDRC', 'isrc': 'TSRC', 'remixer': 'TPE4', 'copyright': 'TCOP'}
+LEAN_FRAMES = set(FIELD_FRAMES.values()) | {'TYER'}
+
+# Same formats the crate extractors recognise
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.aif', '.aiff', '.flac', '.mp4', '.m4a')
+
+
+def iter_audio_files(music_dir, extensions=AUDIO_EXTENSIONS):
+    """
+    Walk music_dir in a stable (sorted) order and yield (path, size, mtime_ns).
+
+    Uses os.scandir so the stat comes with the directory listing (free on
+    Windows) instead of costing a separate round trip per file.
+    """
+    try:
+        entries = sorted(os.scandir(music_dir), key=lambda e: e.name)
+    except OSError as e:
+        print(f"⚠ {music_dir}: {e}")
+        return
+    subdirs = []
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            subdirs.append(entry.path)
+        elif entry.name.lower().endswith(extensions):
+            st = entry.stat()
+            yield entry.path, st.st_size, st.st_mtime_ns
+    for subdir in subdirs:
+        yield from iter_audio_files(subdir, extensions)
+
+
+def empty_row(filepath):
+    row = {field: '' for field in FIELDNAMES}
+    row['filepath'] = filepath
+    return row
+
+
+def read_tags(filepath):
+    """
+    Read one audio file's tags into an export row. Returns (row, error_or_None)
+
+    MP3 and the ID3 chunk of WAV/AIFF use the header-only ID3 reader, which
+    skips artwork and audio; tags it cannot reproduce exactly are handed to
+    mutagen. FLAC and MP4 map their native tags onto the same fields.
+    """
+    ext = os.path.splitext(filepath)[1].lower()
+    tags = empty_row(filepath)
+
+    try:
+        if ext == '.flac':
+            values, has_cover = read_flac_fields(filepath)
+        elif ext in ('.mp4', '.m4a'):
+            values, has_cover = read_mp4_fields(filepath)
+        else:
+            values, has_cover = read_id3_fields(filepath, ext)
+    except UnsupportedTag:
+        return read_tags_mutagen(filepath)
+    except Exception as e:
+        return tags, e
+
+    for field, value in values.items():
+        tags[field] = value.strip()
+    tags['has_cover'] = 'Yes' if has_cover else 'No'
+    return tags, None
+
+
+def read_id3_fields(filepath, ext):
+    """Lean-read the ID3 tag of an MP3, or of the ID3 chunk in a WAV/AIFF"""
+    with open(filepath, 'rb') as f:
+        offset = 0
+        if ext != '.mp3':
+            offset = find_id3_chunk(f, ext)
+            if offset is None:
+                return {}, False
+        frames, has_apic = read_id3_frames(f, LEAN_FRAMES, offset)
+
+    values = {field: frames.get(frame_id, '') for field, frame_id in FIELD_FRAMES.items()}
+    if not values['year'].strip():
+        values['year'] = frames.get('TYER', '')
+    return values, has_apic
+
+
+def read_tags_mutagen(filepath):
+    """Full mutagen parse of one file's ID3 tag; the fallback for unusual tags"""
+    ext = os.path.splitext(filepath)[1].lower()
+    tags = empty_row(filepath)
+
+    try:
+        if ext in ('.aif', '.aiff'):
+            audio = AIFF(filepath).tags or {}
+        elif ext == '.wav':
+            audio = WAVE(filepath).tags or {}
+        else:
+            audio = ID3(filepath)
+
+        tags['artist'] = str(audio.get('TPE1', '')).strip() or ''
+        tags['title'] = str(audio.get('TIT2', '')).strip() or ''
+        tags['album'] = str(audio.get('TALB', '')).strip() or ''
+        tags['bpm'] = str(audio.get('TBPM', '')).strip() or ''
+        tags['key'] = str(audio.get('TKEY', '')).strip() or ''
+        tags['genre'] = str(audio.get('TCON', '')).strip() or ''
+        tags['label'] = str(audio.get('TPUB', '')).strip() or ''
+        tags['year'] = str(audio.get('TDRC', audio.get('TYER', ''))).strip() or ''
+        tags['isrc'] = str(audio.get('TSRC', '')).strip() or ''
+        tags['remixer'] = str(audio.get('TPE4', '')).strip() or ''
+        tags['copyright'] = str(audio.get('TCOP', '')).strip() or ''
+
+        # Check for cover art
+        tags['has_cover'] = 'Yes' if any(k.startswith('APIC') for k in audio.keys()) else 'No'
+
+        # Get comment (energy level)
+        for key in audio.keys():
+            if key.startswith('COMM'):
+                tags['energy'] = str(audio.get(key, '')).strip()
+                break
+
+    except Exception as e:
+        return tags, e
+
+    return tags, None
+
+
+# ==========================================
+# OUTPUT SINKS
+# ==========================================
+# Rows are accumulated column-wise and flushed every batch_size rows, so memory
+# stays flat and everything up to the last flush survives a crash.
+
+class ColumnBatch:
+    def __init__(self, sink, batch_size=1000):
+        """Per-field column buffers that hand full batches to sink.write()"""
+        self.sink = sink
+        self.batch_size = batch_size
+        self.columns = {field: [] for field in FIELDNAMES}
+        self.rows = 0
+
+    def append(self, row):
+        for field, column in self.columns.items():
+            column.append(row[field])
+        self.rows += 1
+        if self.rows >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.sink.write(self.columns, self.rows)
+            self.columns = {field: [] for field in FIELDNAMES}
+            self.rows = 0
+
+
+class CsvSink:
+    def __init__(self, output_csv):
+        """Append batches to a CSV, fsync'd after each batch"""
+        self.path = output_csv
+        self.file = open(output_csv, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(FIELDNAMES)
+
+    def write(self, columns, rows):
+        self.writer.writerows(zip(*(columns[field] for field in FIELDNAMES)))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetSink:
+    def __init__(self, output_dir):
+        """
+        Write each batch as its own part file inside output_dir.
+
+        Parts are renamed into place only once complete, so a crash leaves a
+        readable dataset (pd.read_parquet(output_dir)) of every finished batch.
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("ERROR: parquet output needs pyarrow (pip install pyarrow)")
+        self.pa, self.pq = pa, pq
+        self.schema = pa.schema([(field, pa.string()) for field in FIELDNAMES])
+        self.path = output_dir
+        os.makedirs(output_dir, exist_ok=True)
+        for name in os.listdir(output_dir):
+            if name.startswith('part-'):
+                os.remove(os.path.join(output_dir, name))
+        self.parts = 0
+
+    def write(self, columns, rows):
+        table = self.pa.table(columns, schema=self.schema)
+        part_path = os.path.join(self.path, f"part-{self.parts:05d}.parquet")
+        self.pq.write_table(table, part_path + '.tmp')
+        os.replace(part_path + '.tmp', part_path)
+        self.parts += 1
+
+    def close(self):
+        pass
+
+
+def open_sink(output_path):
+    """Pick the sink from the output extension: .parquet -> part files, else CSV"""
+    if output_path.lower().endswith('.parquet'):
+        return ParquetSink(output_path)
+    return CsvSink(output_path)
+
+
+# ==========================================
+# TAG CACHE
 # ==========================================
+# SQLite table of export rows keyed by filepath, valid while (size, mtime_ns)
+# match the file on disk. Only files whose key changed are read again.
+
+def open_tag_cache(cache_path):
+    """Open (creating if needed) the SQLite tag cache"""
+    conn = sqlite3.connect(cache_path)
+    columns = ', '.join(f'{field} TEXT' for field in FIELDNAMES[1:])
+    conn.execute(f"CREATE TABLE IF NOT EXISTS tags (filepath TEXT PRIMARY KEY, "
+                 f"size INTEGER, mtime_ns INTEGER, {columns})")
+    return conn
+
+
+def load_tag_cache(conn):
+    """Load the whole cache in one query: filepath -> (size, mtime_ns, row)"""
+    cached = {}
+    for record in conn.execute(f"SELECT filepath, size, mtime_ns, {', '.join(FIELDNAMES[1:])} FROM tags"):
+        row = dict(zip(FIELDNAMES, (record[0],) + record[3:]))
+        cached[record[0]] = (record[1], record[2], row)
+    return cached
+
+
+def store_tags(conn, records):
+    """Upsert (size, mtime_ns, row) records into the cache"""
+    placeholders = ', '.join('?' * (len(FIELDNAMES) + 2))
+    conn.executemany(
+        f"INSERT OR REPLACE INTO tags (filepath, size, mtime_ns, {', '.join(FIELDNAMES[1:])}) "
+        f"VALUES ({placeholders})",
+        [(row['filepath'], size, mtime_ns, *(row[f] for f in FIELDNAMES[1:])) for size, mtime_ns, row in records],
+    )
+    conn.commit()
+
+
+def forget_tags(conn, filepaths):
+    """Drop cache rows for files that no longer exist"""
+    conn.executemany("DELETE FROM tags WHERE filepath = ?", [(fp,) for fp in filepaths])
+    conn.commit()
+
+
+def iter_tags_concurrent(files, io_workers=16, cached=None):
+    """
+    Yield (row, error, from_cache, size, mtime_ns) for each file, in input order.
+
+    Files whose (size, mtime_ns) match the cache are answered without touching
+    them; the rest are read on a thread pool (ID3 parsing is I/O-latency bound,
+    so threads overlap the waits). At most io_workers * 4 files are in flight,
+    which keeps memory bounded and lets output stream while the walk goes on.
+    """
+    cached = cached or {}
+    window = deque()
+    with ThreadPoolExecutor(max_workers=io_workers) as pool:
+        for filepath, size, mtime_ns in files:
+            hit = cached.get(filepath)
+            if hit and hit[0] == size and hit[1] == mtime_ns:
+                future = Future()
+                future.set_result((hit[2], None))
+                window.append((future, size, mtime_ns, True))
+            else:
+                window.append((pool.submit(read_tags, filepath), size, mtime_ns, False))
+            if len(window) >= io_workers * 4:
+                yield _finish(window.popleft())
+        while window:
+            yield _finish(window.popleft())
+
+
+def _finish(pending):
+    future, size, mtime_ns, from_cache = pending
+    tags, error = future.result()
+    return tags, error, from_cache, size, mtime_ns
+
+
+def export_tags(music_dir, output_path, io_workers=16, progress_every=2.0, cache_path=None, batch_size=1000,
+                unreadable=None):
+    """
+    Stream tags for every audio file under music_dir into output_path, in walk order.
+
+    Files whose tags cannot be read are exported with empty fields; pass a set
+    as unreadable to collect their paths.
+    """
+    print(f"Scanning {music_dir} with {io_workers} I/O workers...\n")
+
+    conn = open_tag_cache(cache_path) if cache_path else None
+    cached = load_tag_cache(conn) if conn else {}
+    if conn:
+        print(f"Tag cache: {len(cached)} known files")
+
+    count = 0
+    errors = 0
+    hits = 0
+    seen = set()
+    fresh = []
+    started = last_report = time.monotonic()
+
+    sink = open_sink(output_path)
+    batch = ColumnBatch(sink, batch_size)
+    completed = False
+    try:
+        for tags, error, from_cache, size, mtime_ns in iter_tags_concurrent(iter_audio_files(music_dir), io_workers, cached):
+            batch.append(tags)
+            count += 1
+            seen.add(tags['filepath'])
+            if from_cache:
+                hits += 1
+            elif error is not None:
+                # Not cached, so the file is retried next run
+                errors += 1
+                print(f"⚠ {os.path.basename(tags['filepath'])}: {error}")
+                if unreadable is not None:
+                    unreadable.add(tags['filepath'])
+            elif conn:
+                fresh.append((size, mtime_ns, tags))
+                if len(fresh) >= 500:
+                    store_tags(conn, fresh)
+                    fresh = []
+
+            now = time.monotonic()
+            if now - last_report >= progress_every:
+                rate = count / (now - started)
+                print(f"  {count} tracks ({rate:.0f}/s, {hits} cached, {errors} errors)")
+                last_report = now
+        completed = True
+    finally:
+        # Keep whatever was read even if the walk dies part-way
+        try:
+            batch.flush()
+        finally:
+            sink.close()
+            if conn:
+                store_tags(conn, fresh)
+                if completed:
+                    forget_tags(conn, set(cached) - seen)
+                conn.close()
+
+    elapsed = time.monotonic() - started
+    print(f"\n{'='*60}")
+    print(f"Found {count} tracks in {elapsed:.1f}s "
+          f"({hits} from cache, {count - hits - errors} read, {errors} unreadable)")
+    print(f"\n✓ Export complete: {os.path.abspath(output_path)}")
+    return count
+
 
-tracks = []
-
-print(f"Scanning {music_dir}...\n")
-
-for root, dirs, files in os.walk(music_dir):
-    for file in files:
-        if file.lower().endswith('.mp3'):
-            filepath = os.path.join(root, file)
-            
-            tags = {
-                'filepath': filepath,
-                'artist': '',
-                'title': '',
-                'album': '',
-                'bpm': '',
-                'key': '',
-                'energy': '',
-                'genre': '',
-                'label': '',
-                'year': '',
-                'isrc': '',
-                'remixer': '',
-                'copyright': '',
-                'has_cover': ''
-            }
-            
-            try:
-                audio = ID3(filepath)
-                
-                tags['artist'] = str(audio.get('TPE1', '')).strip() or ''
-                tags['title'] = str(audio.get('TIT2', '')).strip() or ''
-                tags['album'] = str(audio.get('TALB', '')).strip() or ''
-                tags['bpm'] = str(audio.get('TBPM', '')).strip() or ''
-                tags['key'] = str(audio.get('TKEY', '')).strip() or ''
-                tags['genre'] = str(audio.get('TCON', '')).strip() or ''
-                tags['label'] = str(audio.get('TPUB', '')).strip() or ''
-                tags['year'] = str(audio.get('TDRC', audio.get('TYER', ''))).strip() or ''
-                tags['isrc'] = str(audio.get('TSRC', '')).strip() or ''
-                tags['remixer'] = str(audio.get('TPE4', '')).strip() or ''
-                tags['copyright'] = str(audio.get('TCOP', '')).strip() or ''
-                
-                # Check for cover art
-                tags['has_cover'] = 'Yes' if any(k.startswith('APIC') for k in audio.keys()) else 'No'
-                
-                # Get comment (energy level)
-                for key in audio.keys():
-                    if key.startswith('COMM'):
-                        tags['energy'] = str(audio.get(key, '')).strip()
-                        break
-                
-                print(f"✓ {file}")
-                
-            except Exception as e:
-                print(f"⚠ {file}: {e}")
-            
-            tracks.append(tags)
-
-print(f"\n{'='*60}")
-print(f"Found {len(tracks)} MP3 tracks")
-
-if tracks:
-    with open(output_csv, 'w', newline='', encoding='utf-8') as csvfile:
-        fieldnames = ['filepath', 'artist', 'title', 'album', 'bpm', 'key', 'energy', 
-                      'genre', 'label', 'year', 'isrc', 'remixer', 'copyright', 'has_cover']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(tracks)
-    
-    print(f"\n✓ Export complete: {os.path.abspath(output_csv)}")
+if __name__ == "__main__":
+    export_tags(music_dir, output_path, io_workers=io_workers, progress_every=progress_every,
+                cache_path=cache_path, batch_size=batch_size)
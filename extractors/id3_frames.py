@@ -0,0 +1,227 @@
+# Lean ID3v2 frame reader.
+# Walks frame headers and seeks over everything it was not asked for, so
+# multi-MB APIC artwork and the audio payload are never read. Anything it
+# does not handle exactly like mutagen raises UnsupportedTag, and callers
+# fall back to mutagen for that file.
+
+import re
+import struct
+
+TAG_HEADER = struct.Struct('>3sBBB4s')     # 'ID3', major, revision, flags, syncsafe size
+FRAME_HEADER = struct.Struct('>4s4sH')     # v2.3/v2.4: id, size, flags
+VALID_FRAME_ID = re.compile(rb'^[A-Z0-9]{4}$')
+
+# ID3v1 fields mutagen merges into the v2 tag when the v2 tag lacks them
+V1_FRAMES = {'TIT2', 'TPE1', 'TALB', 'TDRC', 'COMM', 'TCON'}
+
+# Frame flags that change how the payload must be decoded
+V23_DECODE_FLAGS = 0x80 | 0x40 | 0x20        # compression, encryption, grouping
+V24_DECODE_FLAGS = 0x40 | 0x08 | 0x04 | 0x02 | 0x01   # grouping, compression, encryption, unsync, length
+
+ENCODINGS = {0: ('latin-1', b'\x00'), 1: ('utf-16', b'\x00\x00'),
+             2: ('utf-16-be', b'\x00\x00'), 3: ('utf-8', b'\x00')}
+
+
+class UnsupportedTag(Exception):
+    """Raised when a tag needs the full mutagen parser"""
+
+
+def syncsafe(data):
+    """Decode a 4-byte syncsafe integer (7 bits per byte)"""
+    b0, b1, b2, b3 = data
+    if (b0 | b1 | b2 | b3) & 0x80:
+        raise UnsupportedTag("size is not syncsafe")
+    return (b0 << 21) | (b1 << 14) | (b2 << 7) | b3
+
+
+def split_terminated(data, terminator):
+    """Split encoded text on its null terminator, respecting UTF-16 alignment"""
+    if len(terminator) == 1:
+        return data.split(terminator)
+    parts, start = [], 0
+    for i in range(0, len(data) - 1, 2):
+        if data[i:i + 2] == terminator:
+            parts.append(data[start:i])
+            start = i + 2
+    parts.append(data[start:])
+    return parts
+
+
+def decode_text(encoding_byte, data):
+    """Decode a text payload; multiple values are joined with '\\x00' like mutagen's str()"""
+    if encoding_byte not in ENCODINGS:
+        raise UnsupportedTag(f"unknown text encoding {encoding_byte}")
+    codec, terminator = ENCODINGS[encoding_byte]
+    values = split_terminated(data, terminator)
+    while values and not values[-1]:
+        values.pop()
+    try:
+        return '\x00'.join(v.decode(codec) for v in values)
+    except UnicodeDecodeError as e:
+        raise UnsupportedTag(str(e))
+
+
+def decode_comment(data):
+    """Decode a COMM payload: encoding, language, description, text"""
+    if len(data) < 4:
+        raise UnsupportedTag("short COMM frame")
+    encoding_byte = data[0]
+    if encoding_byte not in ENCODINGS:
+        raise UnsupportedTag(f"unknown text encoding {encoding_byte}")
+    _, terminator = ENCODINGS[encoding_byte]
+    parts = split_terminated(data[4:], terminator)
+    # parts[0] is the description; everything after it is the comment text
+    return decode_text(encoding_byte, terminator.join(parts[1:]))
+
+
+def read_tag_header(f, offset=0):
+    """
+    Parse the ID3v2 header at offset. Returns (major, first_frame_pos, tag_end).
+
+    Raises UnsupportedTag for anything but an unsynchronised-free v2.3/v2.4 tag.
+    """
+    f.seek(offset)
+    header = f.read(TAG_HEADER.size)
+    if len(header) < TAG_HEADER.size or header[:3] != b'ID3':
+        raise UnsupportedTag("no ID3v2 header")
+    _, major, _, flags, size_bytes = TAG_HEADER.unpack(header)
+    if major not in (3, 4):
+        raise UnsupportedTag(f"ID3v2.{major}")
+    if flags & 0x80:
+        raise UnsupportedTag("unsynchronised tag")
+    tag_end = offset + TAG_HEADER.size + syncsafe(size_bytes)
+
+    pos = offset + TAG_HEADER.size
+    if flags & 0x40:
+        # Extended header: v2.4 size includes itself, v2.3 size excludes the size field
+        ext = f.read(4)
+        pos += syncsafe(ext) if major == 4 else struct.unpack('>I', ext)[0] + 4
+    return major, pos, tag_end
+
+
+def iter_frames(f, major, pos, tag_end):
+    """
+    Yield (frame_id, data_start, size, flags) for each frame, reading only
+    the 10-byte headers. Stops at padding.
+    """
+    while pos + FRAME_HEADER.size <= tag_end:
+        f.seek(pos)
+        raw = f.read(FRAME_HEADER.size)
+        if len(raw) < FRAME_HEADER.size or raw[0] == 0:
+            return   # padding
+        frame_id, size_bytes, frame_flags = FRAME_HEADER.unpack(raw)
+        if not VALID_FRAME_ID.match(frame_id):
+            raise UnsupportedTag(f"invalid frame id {frame_id!r}")
+        size = syncsafe(size_bytes) if major == 4 else struct.unpack('>I', size_bytes)[0]
+        data_start = pos + FRAME_HEADER.size
+        pos = data_start + size
+        if pos > tag_end:
+            raise UnsupportedTag("frame runs past end of tag")
+        yield frame_id.decode('ascii'), data_start, size, frame_flags
+
+
+def read_id3_frames(f, wanted, offset=0):
+    """
+    Read the ID3v2 tag at offset in the open binary file f.
+
+    Returns (frames, has_apic): frames maps each frame id in wanted to its
+    decoded text ('COMM' is the first comment in the tag), has_apic says
+    whether any cover art frame exists. Raises UnsupportedTag when there is no
+    tag or the tag uses features (v2.2, unsynchronisation, compressed frames,
+    ID3v1 merging, ...) that only mutagen reproduces exactly.
+    """
+    major, pos, tag_end = read_tag_header(f, offset)
+    decode_flags = V24_DECODE_FLAGS if major == 4 else V23_DECODE_FLAGS
+    frames = {}
+    seen = set()
+    has_apic = False
+
+    for fid, data_start, size, frame_flags in iter_frames(f, major, pos, tag_end):
+        seen.add(fid)
+        if fid == 'APIC':
+            has_apic = True
+            continue
+        if fid not in wanted or fid in frames:
+            continue
+        if frame_flags & decode_flags:
+            raise UnsupportedTag(f"{fid} frame flags {frame_flags:#06x}")
+
+        f.seek(data_start)
+        data = f.read(size)
+        if fid == 'COMM':
+            frames[fid] = decode_comment(data)
+        elif data:
+            frames[fid] = decode_text(data[0], data[1:])
+
+    # mutagen's v2.3 -> v2.4 upgrade rewrites these; leave them to it
+    if major == 3 and 'TDAT' in seen and ('TDRC' in wanted or 'TYER' in wanted):
+        raise UnsupportedTag("v2.3 TYER+TDAT date")
+    genre = frames.get('TCON', '')
+    if '(' in genre or genre.isdigit():
+        raise UnsupportedTag("numeric TCON genre")
+
+    # mutagen merges ID3v1 values for frames the v2 tag lacks
+    present = set(frames) | ({'TDRC'} if 'TYER' in frames else set())
+    if (V1_FRAMES & set(wanted)) - present and has_id3v1(f):
+        raise UnsupportedTag("ID3v1 values to merge")
+
+    return frames, has_apic
+
+
+def has_id3v1(f):
+    """True if the file ends with a 128-byte ID3v1 'TAG' block"""
+    f.seek(0, 2)
+    if f.tell() < 128:
+        return False
+    f.seek(-128, 2)
+    return f.read(3) == b'TAG'
+
+
+def find_terminator(data, start, terminator):
+    """Index of the next terminator at or after start (UTF-16 aligned to start)"""
+    if len(terminator) == 1:
+        end = data.find(terminator, start)
+    else:
+        end = next((i for i in range(start, len(data) - 1, 2) if data[i:i + 2] == terminator), -1)
+    if end == -1:
+        raise UnsupportedTag("unterminated string")
+    return end
+
+
+def split_geob(data):
+    """GEOB payload -> (description, object bytes)"""
+    if not data or data[0] not in ENCODINGS:
+        raise UnsupportedTag("bad GEOB encoding")
+    codec, terminator = ENCODINGS[data[0]]
+    pos = find_terminator(data, 1, b'\x00') + 1                    # MIME type, always latin-1
+    pos = find_terminator(data, pos, terminator) + len(terminator)  # filename
+    end = find_terminator(data, pos, terminator)                    # description
+    return data[pos:end].decode(codec, errors='replace'), data[end + len(terminator):]
+
+
+def read_geob_frames(f, descriptions, offset=0):
+    """
+    {description: object bytes} for the GEOB frames named in descriptions.
+
+    Only GEOB frames are read; all other frames (and artwork) are skipped by
+    seeking. Raises UnsupportedTag like read_id3_frames().
+    """
+    major, pos, tag_end = read_tag_header(f, offset)
+    decode_flags = V24_DECODE_FLAGS if major == 4 else V23_DECODE_FLAGS
+    objects = {}
+    for fid, data_start, size, frame_flags in iter_frames(f, major, pos, tag_end):
+        if fid != 'GEOB':
+            continue
+        if frame_flags & decode_flags:
+            raise UnsupportedTag(f"GEOB frame flags {frame_flags:#06x}")
+        f.seek(data_start)
+        description, data = split_geob(f.read(size))
+        if description in descriptions and description not in objects:
+            objects[description] = data
+    return objects
+
+
+def read_id3_file(filepath, wanted, offset=0):
+    """Open filepath and read_id3_frames() from it"""
+    with open(filepath, 'rb') as f:
+        return read_id3_frames(f, wanted, offset)
@@ -0,0 +1,276 @@
+# Local musical key detection for master rows with no key from MIK or Spotify.
+# Reuses bpm_estimate's mono excerpt (memory-mapped WAV/AIFF, ffmpeg for the
+# rest), maps FFT frames onto a semitone spectrum, whitens it and subtracts the
+# expected overtones of each note before folding it into a 12-bin chroma vector,
+# which is correlated with rotated major/minor key profiles. The chroma is cached
+# per audio content hash and the key is derived from it on every run.
+
+import time
+import struct
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from audio_hash import hash_files
+from bpm_estimate import load_mono
+from crate_extractor_corrected import pool_map
+
+# ==========================================
+# CONFIGURE THIS
+# ==========================================
+master_csv = r"C:\Users\fulmi\Downloads\Set Lists\master_library_final.csv"
+output_master_csv = r"C:\Users\fulmi\Downloads\Set Lists\master_library_local_key.csv"
+estimates_csv = "key_estimates.csv"
+cache_path = "key_detect_cache.sqlite"          # keyed by audio content hash
+hash_cache_path = "audio_hash_cache.sqlite"     # shared with audio_hash.py
+min_confidence = 0.6    # estimates below this are reported but not written to the master
+workers = 4
+# ==========================================
+
+FRAME_SIZE = 4096            # ~0.37 s at the ~11 kHz excerpt rate (2.7 Hz bins)
+HOP = 2048
+MIN_FREQ, MAX_FREQ = 100.0, 2000.0   # note range; below ~100 Hz bins are wider than a semitone
+MAX_PARTIAL_FREQ = 5000.0    # overtones are tracked (and removed) up to here
+HARMONICS = 8                # partials 2..HARMONICS of every note are subtracted
+PARTIAL_WEIGHT = 0.5         # share of a note's whitened level removed at each partial
+WHITEN_SEMITONES = 12        # spectral envelope = moving mean over +/- this many semitones
+FLOOR_DB = 60                # per-frame dynamic range kept before whitening
+KEY_MARGIN = 0.2             # score lead over the runner-up key that counts as unambiguous
+
+CHROMA_VERSION = 2           # bump when the chroma changes; older cache entries are dropped
+
+# Same tables as enrichment/enrich_spotify_features (not importable from here):
+# pitch class 0 = C, mode 1 = major / 0 = minor
+KEY_MAP = ['C','C♯/D♭','D','D♯/E♭','E','F','F♯/G♭','G','G♯/A♭','A','A♯/B♭','B']
+CAMELOT = ['8B','3B','10B','5B','12B','7B','2B','9B','4B','11B','6B','1B',
+           '5A','12A','7A','2A','9A','4A','11A','6A','1A','8A','3A','10A']
+
+# Krumhansl-Kessler key profiles, tonic first
+MAJOR_PROFILE = [6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88]
+MINOR_PROFILE = [6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17]
+
+ESTIMATE_COLUMNS = ['filepath', 'audio_hash', 'key_camelot', 'key_open', 'key_name', 'confidence']
+
+
+def _zscore(x, axis=-1):
+    x = np.asarray(x, dtype=np.float64)
+    centred = x - x.mean(axis=axis, keepdims=True)
+    norm = np.sqrt((centred ** 2).sum(axis=axis, keepdims=True))
+    return np.divide(centred, norm, out=np.zeros_like(centred), where=norm > 0)
+
+
+# 24 templates: rows 0-11 major keys on C..B, rows 12-23 minor keys on C..B
+KEY_TEMPLATES = _zscore([np.roll(profile, tonic) for profile in (MAJOR_PROFILE, MINOR_PROFILE)
+                         for tonic in range(12)])
+
+
+def open_key(camelot):
+    """Camelot -> Open Key notation (8B = C major = 1d, 8A = A minor = 1m)"""
+    number = int(camelot[:-1])
+    return f"{(number + 4) % 12 + 1}{'d' if camelot[-1] == 'B' else 'm'}"
+
+
+# ==========================================
+# CHROMA + KEY
+# ==========================================
+
+WINDOW = np.hanning(FRAME_SIZE).astype(np.float32)
+
+# Semitone offset of partial h above its fundamental (h = 3 -> 19, an octave and a fifth)
+PARTIAL_OFFSETS = [int(round(12 * np.log2(h))) for h in range(2, HARMONICS + 1)]
+
+
+def to_midi(freq):
+    return 69 + 12 * np.log2(freq / 440.0)
+
+
+def pitch_matrix(rate, n_fft=FRAME_SIZE):
+    """
+    (rfft bins, semitones) weights folding each bin into its nearest semitone.
+
+    Returns (matrix, lowest MIDI note). The grid runs from MIN_FREQ up to
+    MAX_PARTIAL_FREQ (or just below Nyquist), so overtones of the highest
+    notes are still on it.
+    """
+    freqs = np.fft.rfftfreq(n_fft, 1 / rate)
+    low = int(np.ceil(to_midi(MIN_FREQ)))
+    high = int(np.floor(to_midi(min(MAX_PARTIAL_FREQ, 0.45 * rate))))
+    midi = to_midi(np.maximum(freqs, 1e-3))
+    nearest = np.round(midi)
+    usable = np.nonzero((nearest >= low) & (nearest <= high))[0]
+    matrix = np.zeros((len(freqs), high - low + 1), dtype=np.float32)
+    # Triangular weight: 1 on the semitone, 0 half a semitone away
+    matrix[usable, (nearest[usable] - low).astype(int)] = 1 - 2 * np.abs(midi[usable] - nearest[usable])
+    return matrix, low
+
+
+def note_salience(magnitude, rate):
+    """
+    (frames, semitones) note strengths from STFT magnitudes; returns (salience, lowest MIDI note).
+
+    The log semitone spectrum is whitened by subtracting its moving mean over
+    +/- WHITEN_SEMITONES, which flattens timbre and leaves only spectral peaks.
+    Walking up from the lowest note, PARTIAL_WEIGHT of each note's level is
+    then taken off its partials, so the octave-and-fifth (3rd) and the major
+    third two octaves up (5th) no longer pass for notes of their own.
+    """
+    matrix, low = pitch_matrix(rate, magnitude.shape[1] * 2 - 2)
+    energy = magnitude @ matrix
+    floor = energy.max(axis=1, keepdims=True) * 10 ** (-FLOOR_DB / 20) + 1e-12
+    level = np.log(energy + floor)
+    n = level.shape[1]
+    cumulative = np.concatenate([np.zeros((len(level), 1)), np.cumsum(level, axis=1)], axis=1)
+    lo = np.clip(np.arange(n) - WHITEN_SEMITONES, 0, n)
+    hi = np.clip(np.arange(n) + WHITEN_SEMITONES + 1, 0, n)
+    salience = np.maximum(level - (cumulative[:, hi] - cumulative[:, lo]) / (hi - lo), 0)
+    for note in range(n):
+        for offset in PARTIAL_OFFSETS:
+            if note + offset >= n:
+                break
+            partial = salience[:, note + offset]
+            partial -= np.minimum(partial, PARTIAL_WEIGHT * salience[:, note])
+    return salience, low
+
+
+def chroma_vector(mono, rate):
+    """Mean frame-normalised chroma of a mono signal; None when it is too short"""
+    if len(mono) < FRAME_SIZE:
+        return None
+    frames = np.lib.stride_tricks.sliding_window_view(mono, FRAME_SIZE)[::HOP]
+    magnitude = np.abs(np.fft.rfft(frames * WINDOW, axis=1))
+    salience, low = note_salience(magnitude, rate)
+    # Only notes in MIN_FREQ..MAX_FREQ are folded; the rest of the grid held partials
+    notes = int(np.floor(to_midi(MAX_FREQ))) - low + 1
+    chroma = np.zeros((len(salience), 12))
+    for note in range(min(notes, salience.shape[1])):
+        chroma[:, (low + note) % 12] += salience[:, note]
+    # Each frame counts equally, so loud passages don't outvote the rest
+    norms = np.linalg.norm(chroma, axis=1, keepdims=True)
+    chroma = np.divide(chroma, norms, out=np.zeros_like(chroma), where=norms > 0)
+    return chroma.mean(axis=0).astype(np.float32)
+
+
+def detect_key(chroma):
+    """
+    chroma -> (key_index, mode, confidence).
+
+    The key is the profile with the highest Pearson correlation. Confidence is
+    that correlation (clipped to 0..1) scaled by the winner's lead over the
+    runner-up, relative to KEY_MARGIN: a near-tie between related keys
+    (relative major/minor, a fifth apart) scores low however well both fit.
+    """
+    scores = KEY_TEMPLATES @ _zscore(chroma)
+    runner_up, best = np.argsort(scores)[-2:]
+    lead = np.clip((scores[best] - scores[runner_up]) / KEY_MARGIN, 0, 1)
+    confidence = float(np.clip(scores[best], 0, 1) * lead)
+    return int(best) % 12, 1 if best < 12 else 0, round(confidence, 3)
+
+
+def key_notations(key_index, mode):
+    """(Camelot, Open Key, name) for a pitch class and mode"""
+    camelot = CAMELOT[key_index + (0 if mode == 1 else 12)]
+    name = f"{KEY_MAP[key_index]} {'major' if mode == 1 else 'minor'}"
+    return camelot, open_key(camelot), name
+
+
+def _chroma_entry(entry):
+    path, audio_hash = entry
+    try:
+        mono, rate = load_mono(path)
+        return path, audio_hash, chroma_vector(mono, rate), None
+    except (OSError, ValueError, struct.error) as e:
+        return path, audio_hash, None, str(e)
+
+
+# ==========================================
+# CACHE (per audio content hash) + MASTER
+# ==========================================
+
+def open_chroma_cache(cache_path):
+    conn = sqlite3.connect(cache_path)
+    if conn.execute("PRAGMA user_version").fetchone()[0] != CHROMA_VERSION:
+        conn.execute("DROP TABLE IF EXISTS chroma")
+        conn.execute(f"PRAGMA user_version = {CHROMA_VERSION}")
+    conn.execute("CREATE TABLE IF NOT EXISTS chroma (audio_hash TEXT PRIMARY KEY, chroma BLOB)")
+    return conn
+
+
+def detect_missing_keys(master_df, cache_path, hash_cache_path, workers=4,
+                        path_column='filepath', key_column='Key (Camelot)'):
+    """
+    Detect keys for master rows with a blank key_column and an existing file.
+
+    Returns a DataFrame of ESTIMATE_COLUMNS. Only the rows missing a key are hashed.
+    """
+    blank = master_df[master_df[key_column].isna() & master_df[path_column].notna()]
+    hashes = hash_files(blank[path_column].astype(str), hash_cache_path)
+    missing = blank[blank[path_column].isin(hashes)]
+    paths = list(dict.fromkeys(missing[path_column]))
+
+    conn = open_chroma_cache(cache_path)
+    try:
+        known = {h: (np.frombuffer(blob, dtype=np.float32) if blob is not None else None)
+                 for h, blob in conn.execute("SELECT audio_hash, chroma FROM chroma")}
+        todo = list({hashes[p]: (p, hashes[p]) for p in paths if hashes[p] not in known}.values())
+        started, errors = time.perf_counter(), 0
+        with conn:
+            for path, audio_hash, chroma, error in pool_map(_chroma_entry, todo, workers):
+                if error:
+                    print(f"⚠ {path}: {error}")
+                    errors += 1
+                    continue
+                blob = chroma.tobytes() if chroma is not None else None
+                conn.execute("INSERT OR REPLACE INTO chroma VALUES (?, ?)", (audio_hash, blob))
+                known[audio_hash] = chroma
+        elapsed = time.perf_counter() - started
+    finally:
+        conn.close()
+
+    rows = []
+    for path in paths:
+        chroma = known.get(hashes[path])
+        if chroma is None:
+            continue
+        key_index, mode, confidence = detect_key(chroma)
+        rows.append([path, hashes[path], *key_notations(key_index, mode), confidence])
+    rate = f", {(len(todo) - errors) / elapsed:.1f} tracks/s" if todo and elapsed > 0 else ""
+    print(f"✓ Key: {len(rows)} of {len(paths)} tracks without a key detected "
+          f"({len(todo) - errors} analysed{rate}, {errors} errors)")
+    return pd.DataFrame(rows, columns=ESTIMATE_COLUMNS)
+
+
+def fill_master_keys(master_df, estimates, min_confidence=0.6, path_column='filepath'):
+    """
+    Write confident estimates into blank 'Key (Camelot)' cells; returns how many were filled.
+
+    'Key (Open)' is filled alongside with the pitch-class name, as the Spotify
+    enrichment does.
+    """
+    confident = estimates[estimates['confidence'] >= min_confidence].set_index('filepath')
+    blank = master_df['Key (Camelot)'].isna()
+    targets = master_df.loc[blank, path_column]
+    targets = targets[targets.isin(confident.index)]
+    if targets.empty:
+        return 0
+
+    # Convert target columns to object dtype: all-blank columns read from CSV are float64
+    master_df['Key (Camelot)'] = master_df['Key (Camelot)'].astype("object")
+    master_df.loc[targets.index, 'Key (Camelot)'] = targets.map(confident['key_camelot'])
+    if 'Key (Open)' in master_df.columns:
+        master_df['Key (Open)'] = master_df['Key (Open)'].astype("object")
+        names = targets.map(confident['key_name']).map(lambda name: name.rsplit(' ', 1)[0])
+        open_blank = master_df.loc[targets.index, 'Key (Open)'].isna()
+        master_df.loc[open_blank[open_blank].index, 'Key (Open)'] = names[open_blank]
+    return len(targets)
+
+
+# === USAGE ===
+if __name__ == "__main__":
+    master_df = pd.read_csv(master_csv)
+    estimates = detect_missing_keys(master_df, cache_path, hash_cache_path, workers=workers)
+    estimates.to_csv(estimates_csv, index=False)
+    filled = fill_master_keys(master_df, estimates, min_confidence)
+    master_df.to_csv(output_master_csv, index=False)
+    print(f"✓ Filled Key (Camelot) for {filled} tracks (confidence >= {min_confidence}) -> {output_master_csv}")
+    print("\nDone!")
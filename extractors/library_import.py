@@ -0,0 +1,193 @@
+# Streaming importers for rekordbox XML and Traktor NML collections.
+# Guest DJ libraries come in as rekordbox.xml or collection.nml; both are read
+# with iterparse, and each record is dropped from the tree once handled, so
+# memory stays flat however large the collection is. Output matches the
+# Serato path: a per-track metadata CSV plus {crate_tag: [filenames]}
+# playlist membership, with folders nested as 'Folder%%Playlist'.
+
+import os
+import csv
+from urllib.parse import unquote, urlparse
+from xml.etree.ElementTree import iterparse
+
+from crate_extractor_corrected import track_basename
+
+SUBCRATE_SEP = '%%'
+
+# Same column names as the Serato database export
+TRACK_COLUMNS = ['filename', 'filepath', 'title', 'artist', 'album', 'genre', 'bpm', 'key',
+                 'comment', 'label', 'remixer', 'composer', 'year', 'length', 'added', 'play_count']
+
+# rekordbox <TRACK> attribute -> column
+REKORDBOX_FIELDS = {
+    'Name': 'title', 'Artist': 'artist', 'Album': 'album', 'Genre': 'genre',
+    'AverageBpm': 'bpm', 'Tonality': 'key', 'Comments': 'comment', 'Label': 'label',
+    'Remixer': 'remixer', 'Composer': 'composer', 'Year': 'year', 'TotalTime': 'length',
+    'DateAdded': 'added', 'PlayCount': 'play_count',
+}
+
+# Traktor (child element or '' for <ENTRY> itself, attribute) -> column
+TRAKTOR_FIELDS = {
+    ('', 'TITLE'): 'title', ('', 'ARTIST'): 'artist', ('ALBUM', 'TITLE'): 'album',
+    ('INFO', 'GENRE'): 'genre', ('TEMPO', 'BPM'): 'bpm', ('INFO', 'KEY'): 'key',
+    ('INFO', 'COMMENT'): 'comment', ('INFO', 'LABEL'): 'label', ('INFO', 'REMIXER'): 'remixer',
+    ('INFO', 'PRODUCER'): 'composer', ('INFO', 'RELEASE_DATE'): 'year',
+    ('INFO', 'PLAYTIME'): 'length', ('INFO', 'IMPORT_DATE'): 'added',
+    ('INFO', 'PLAYCOUNT'): 'play_count',
+}
+
+
+def rekordbox_path(location):
+    """'file://localhost/C:/Music/a%20b.mp3' -> 'C:/Music/a b.mp3'"""
+    path = unquote(urlparse(location).path)
+    if len(path) > 2 and path[0] == '/' and path[2] == ':':
+        path = path[1:]
+    return path
+
+
+def traktor_path(volume, directory, filename):
+    """Traktor writes dirs as '/:Users/:me/:Music/:'; Windows volumes are drive letters"""
+    path = directory.replace('/:', '/') + filename
+    if volume.endswith(':'):
+        return volume + path
+    return path
+
+
+def _stream(source):
+    """
+    iterparse yielding (event, elem, parents), where parents is the stack of
+    open ancestors. Callers remove finished records from parents[-1].
+    """
+    parents = []
+    for event, elem in iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            yield event, elem, parents
+            parents.append(elem)
+        else:
+            parents.pop()
+            yield event, elem, parents
+
+
+def iter_rekordbox_xml(xml_path):
+    """
+    Yield ('track', row) for each collection track and ('member', crate_tag,
+    filename) for each playlist entry of a rekordbox.xml export.
+    """
+    filenames = {}   # TrackID -> filename, for playlists keyed by id
+    folders = []
+    key_type = '0'
+
+    for event, elem, parents in _stream(xml_path):
+        tag = elem.tag
+        if event == 'start':
+            if tag == 'NODE':
+                if parents[-1].tag == 'NODE':
+                    folders.append(elem.get('Name', ''))
+                key_type = elem.get('KeyType', '0')
+            continue
+
+        parent = parents[-1] if parents else None
+        if tag == 'TRACK' and parent is not None and parent.tag == 'COLLECTION':
+            filepath = rekordbox_path(elem.get('Location', ''))
+            row = {'filename': track_basename(filepath), 'filepath': filepath}
+            for attribute, column in REKORDBOX_FIELDS.items():
+                row[column] = elem.get(attribute, '')
+            filenames[elem.get('TrackID')] = row['filename']
+            parent.remove(elem)
+            yield 'track', row
+        elif tag == 'TRACK' and parent is not None and parent.tag == 'NODE':
+            key = elem.get('Key', '')
+            # KeyType 0: Key is a TrackID; 1: Key is the file location
+            filename = track_basename(rekordbox_path(key)) if key_type == '1' else filenames.get(key)
+            parent.remove(elem)
+            if filename:
+                yield 'member', SUBCRATE_SEP.join(folders), filename
+        elif tag == 'NODE':
+            if parent is not None and parent.tag == 'NODE':
+                folders.pop()
+                parent.remove(elem)
+
+
+def iter_traktor_nml(nml_path):
+    """
+    Yield ('track', row) for each collection entry and ('member', crate_tag,
+    filename) for each playlist entry of a Traktor collection.nml.
+    """
+    folders = []
+
+    for event, elem, parents in _stream(nml_path):
+        tag = elem.tag
+        if event == 'start':
+            # The unnamed root folder is '$ROOT'
+            if tag == 'NODE' and elem.get('NAME') != '$ROOT':
+                folders.append(elem.get('NAME', ''))
+            continue
+
+        parent = parents[-1] if parents else None
+        if tag == 'ENTRY' and parent is not None and parent.tag == 'COLLECTION':
+            location = elem.find('LOCATION')
+            filepath = ''
+            if location is not None:
+                filepath = traktor_path(location.get('VOLUME', ''), location.get('DIR', ''),
+                                        location.get('FILE', ''))
+            row = {'filename': track_basename(filepath), 'filepath': filepath}
+            for (child, attribute), column in TRAKTOR_FIELDS.items():
+                source = elem if not child else elem.find(child)
+                row[column] = source.get(attribute, '') if source is not None else ''
+            parent.remove(elem)
+            yield 'track', row
+        elif tag == 'PRIMARYKEY' and elem.get('TYPE') == 'TRACK':
+            # Key is VOLUME + DIR + FILE, e.g. 'C:/:Music/:a.mp3'
+            filename = track_basename(elem.get('KEY', '').replace('/:', '/'))
+            if filename and folders:
+                yield 'member', SUBCRATE_SEP.join(folders), filename
+        elif tag == 'ENTRY' and parent is not None and parent.tag == 'PLAYLIST':
+            parent.remove(elem)
+        elif tag == 'NODE':
+            if elem.get('NAME') != '$ROOT':
+                folders.pop()
+            if parent is not None:
+                parent.remove(elem)
+
+
+def import_library(events, tracks_csv):
+    """
+    Consume importer events: stream track rows into tracks_csv and collect
+    playlist membership as {crate_tag: [filenames]} (first-seen order).
+    """
+    crate_members = {}
+    tracks = 0
+    with open(tracks_csv, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=TRACK_COLUMNS)
+        writer.writeheader()
+        for event in events:
+            if event[0] == 'track':
+                writer.writerow(event[1])
+                tracks += 1
+            else:
+                _, crate_tag, filename = event
+                members = crate_members.setdefault(crate_tag, {})
+                members[filename] = None
+    print(f"✓ Imported {tracks} tracks, {len(crate_members)} playlists -> {tracks_csv}")
+    return {tag: list(members) for tag, members in crate_members.items()}
+
+
+def import_library_file(path, tracks_csv):
+    """Pick the importer from the extension: .nml -> Traktor, else rekordbox XML"""
+    if os.path.splitext(path)[1].lower() == '.nml':
+        return import_library(iter_traktor_nml(path), tracks_csv)
+    return import_library(iter_rekordbox_xml(path), tracks_csv)
+
+
+# === USAGE ===
+if __name__ == "__main__":
+    from crate_matrix import CrateMatrix
+    from crate_extractor_corrected import export_crate_tags
+
+    library_path = r"C:\Users\fulmi\Downloads\Guest Libraries\rekordbox.xml"   # or collection.nml
+    tracks_csv = 'guest_library_tracks.csv'
+    output_csv = 'guest_crate_tags.csv'
+
+    crate_members = import_library_file(library_path, tracks_csv)
+    export_crate_tags(CrateMatrix.from_crate_members(crate_members), output_csv)
+    print("\nDone!")
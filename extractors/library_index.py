@@ -0,0 +1,170 @@
+# Parallel library walker and filename -> path index.
+# Crates, MIK exports and guest libraries refer to tracks by basename or by a
+# path from another machine (no drive, '/Volumes/...', '\' vs '/'). The index
+# maps each normalized basename to the file(s) actually on disk, so resolving
+# a reference is one dict lookup; names found in several folders are flagged
+# as ambiguous instead of silently picking one.
+
+import os
+import json
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from extract_mik_tags import AUDIO_EXTENSIONS
+
+# ==========================================
+# CONFIGURE THIS
+# ==========================================
+music_dir = r"C:\Users\rmmcc\OneDrive\Documents\Music"
+index_path = "library_index.json"
+walk_workers = 16   # Directories listed concurrently; raise for network storage
+# ==========================================
+
+INDEX_VERSION = 1
+
+
+def normalize_name(path):
+    """
+    Basename key shared by every path form: either separator, Unicode NFC
+    (macOS stores NFD) and case-folded (Windows and macOS are case-insensitive).
+    """
+    name = path.replace('\\', '/').rsplit('/', 1)[-1].strip()
+    return unicodedata.normalize('NFC', name).casefold()
+
+
+def normalize_path(path):
+    """Separator-, case- and drive-insensitive form of a full path, for suffix matching"""
+    path = unicodedata.normalize('NFC', path.replace('\\', '/')).casefold()
+    if len(path) > 1 and path[1] == ':':
+        path = path[2:]
+    return '/' + path.strip('/')
+
+
+def _list_dir(path, extensions):
+    """One directory listing -> ([(path, size, mtime_ns)], [subdirs])"""
+    files, subdirs = [], []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.name.lower().endswith(extensions):
+                        st = entry.stat()
+                        files.append((entry.path, st.st_size, st.st_mtime_ns))
+                except OSError:
+                    continue
+    except OSError as e:
+        print(f"⚠ {path}: {e}")
+    return files, subdirs
+
+
+def walk_parallel(music_dir, extensions=AUDIO_EXTENSIONS, workers=16):
+    """
+    List every audio file under music_dir as (path, size, mtime_ns), sorted.
+
+    Each directory is listed by a worker thread and its subdirectories are
+    submitted as soon as they are found, so slow (network/cloud) directories
+    overlap instead of being visited one at a time.
+    """
+    files = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(_list_dir, music_dir, extensions)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                dir_files, subdirs = future.result()
+                files.extend(dir_files)
+                pending.update(pool.submit(_list_dir, d, extensions) for d in subdirs)
+    files.sort()
+    return files
+
+
+class LibraryIndex:
+    def __init__(self, files):
+        """
+        Args:
+            files: (path, size, mtime_ns) for every file on disk
+        """
+        self.files = {path: (size, mtime_ns) for path, size, mtime_ns in files}
+        self.by_name = {}
+        for path in sorted(self.files):
+            self.by_name.setdefault(normalize_name(path), []).append(path)
+
+    def candidates(self, reference):
+        """All on-disk paths whose basename matches reference (a name or any path)"""
+        return self.by_name.get(normalize_name(reference), [])
+
+    def resolve(self, reference):
+        """
+        Resolve a basename or foreign path to one file on disk, or None.
+
+        When the basename is ambiguous and reference is a full path, the
+        candidate sharing the longest trailing run of folders wins; a tie
+        stays unresolved.
+        """
+        paths = self.candidates(reference)
+        if len(paths) <= 1:
+            return paths[0] if paths else None
+        parts = normalize_path(reference).split('/')
+        if len(parts) <= 2:
+            return None
+        scores = []
+        for path in paths:
+            candidate = normalize_path(path).split('/')
+            shared = 0
+            while (shared < min(len(parts), len(candidate))
+                   and parts[-1 - shared] == candidate[-1 - shared]):
+                shared += 1
+            scores.append((shared, path))
+        scores.sort(reverse=True)
+        return scores[0][1] if scores[0][0] > scores[1][0] else None
+
+    def ambiguous(self):
+        """{normalized basename: [paths]} for names found more than once"""
+        return {name: paths for name, paths in self.by_name.items() if len(paths) > 1}
+
+    def lookup(self, name, size=None, mtime_ns=None):
+        """Paths for a basename, narrowed by size and/or mtime when given"""
+        return [p for p in self.candidates(name)
+                if (size is None or self.files[p][0] == size)
+                and (mtime_ns is None or self.files[p][1] == mtime_ns)]
+
+    # ----- persistence -----
+
+    def save(self, index_path, root=None):
+        data = {'version': INDEX_VERSION, 'root': root,
+                'files': [[p, s, m] for p, (s, m) in sorted(self.files.items())]}
+        tmp_path = index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, index_path)
+
+    @classmethod
+    def load(cls, index_path):
+        with open(index_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != INDEX_VERSION:
+            raise ValueError(f"{index_path}: unsupported index version {data.get('version')}")
+        return cls(tuple(entry) for entry in data['files'])
+
+
+def build_library_index(music_dir, index_path=None, workers=16):
+    """Walk music_dir in parallel, build the index and (optionally) save it"""
+    index = LibraryIndex(walk_parallel(music_dir, workers=workers))
+    ambiguous = index.ambiguous()
+    print(f"✓ Indexed {len(index.files)} files, {len(index.by_name)} names "
+          f"({len(ambiguous)} ambiguous)")
+    if index_path:
+        index.save(index_path, root=music_dir)
+    return index
+
+
+# === USAGE ===
+if __name__ == "__main__":
+    index = build_library_index(music_dir, index_path, workers=walk_workers)
+    for name, paths in sorted(index.ambiguous().items())[:20]:
+        print(f"⚠ {name}: {len(paths)} copies")
+        for path in paths:
+            print(f"    {path}")
+    print("\nDone!")
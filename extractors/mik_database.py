@@ -0,0 +1,151 @@
+# Direct reader for Mixed In Key's own collection database.
+# MIK keeps every analysis result (key, tempo, energy) in a local SQLite file,
+# so one SELECT returns the whole collection, with no per-file ID3 reads and
+# no parsing of the "8A - 123.00 - 6" comment. Rows come out in the same schema
+# as extract_mik_tags.py, except that 'energy' holds the energy level itself
+# (the MIK consumers accept either form).
+
+import os
+import sqlite3
+from pathlib import Path
+from urllib.parse import urlparse, unquote
+
+from extract_mik_tags import FIELDNAMES, ColumnBatch, empty_row, open_sink
+
+# ==========================================
+# CONFIGURE THIS
+# ==========================================
+mik_db_path = os.path.join(os.environ.get('APPDATA', ''), 'Mixed In Key', 'Mixed In Key', '11.0', 'MIKStore.db')
+output_path = "mik_full_export.csv"   # or "mik_full_export.parquet" (needs pyarrow)
+# ==========================================
+
+# Tables that may hold the collection, tried in order
+MIK_TABLES = ('ZSONG', 'ZTRACK', 'SONG', 'TRACK', 'SONGS', 'TRACKS')
+
+# Export field -> candidate column names (matched case-insensitively). The
+# schema differs between MIK versions, so the first column present wins.
+MIK_COLUMNS = {
+    'filepath': ('ZFILEPATH', 'ZPATH', 'ZLOCATION', 'ZFILE', 'ZURL', 'FILEPATH', 'PATH', 'LOCATION'),
+    'folder': ('ZFOLDER', 'ZDIRECTORY', 'FOLDER', 'DIRECTORY'),
+    'filename': ('ZFILENAME', 'FILENAME'),
+    'artist': ('ZARTIST', 'ARTIST'),
+    'title': ('ZNAME', 'ZTITLE', 'ZSONGNAME', 'NAME', 'TITLE'),
+    'album': ('ZALBUM', 'ALBUM'),
+    'bpm': ('ZTEMPO', 'ZBPM', 'TEMPO', 'BPM'),
+    'key': ('ZCAMELOT', 'ZKEY', 'ZKEYRESULT', 'CAMELOT', 'KEY'),
+    'energy': ('ZENERGY', 'ZENERGYLEVEL', 'ENERGY', 'ENERGYLEVEL'),
+    'genre': ('ZGENRE', 'GENRE'),
+    'label': ('ZLABEL', 'ZPUBLISHER', 'LABEL', 'PUBLISHER'),
+    'year': ('ZYEAR', 'YEAR'),
+    'isrc': ('ZISRC', 'ISRC'),
+    'remixer': ('ZREMIXER', 'REMIXER'),
+    'copyright': ('ZCOPYRIGHT', 'COPYRIGHT'),
+}
+
+
+def open_mik_database(db_path):
+    """Open read-only, so MIK can keep running while we read"""
+    return sqlite3.connect(Path(db_path).resolve().as_uri() + '?mode=ro', uri=True)
+
+
+def resolve_schema(conn, tables=MIK_TABLES, columns=MIK_COLUMNS):
+    """
+    Find the collection table and map export fields onto its columns.
+
+    Returns (table, {field: column}); fields with no matching column are left
+    out and exported empty. Raises ValueError if no table has a file path.
+    """
+    existing = {name.upper(): name for (name,) in
+                conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for candidate in tables:
+        table = existing.get(candidate)
+        if table is None:
+            continue
+        table_columns = {row[1].upper(): row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')}
+        mapping = {}
+        for field, names in columns.items():
+            for name in names:
+                if name in table_columns:
+                    mapping[field] = table_columns[name]
+                    break
+        if 'filepath' in mapping or 'filename' in mapping:
+            return table, mapping
+    raise ValueError(f"No MIK collection table found (looked for {', '.join(tables)})")
+
+
+def local_path(location):
+    """MIK stores paths either plain or as file:// URLs"""
+    if location.startswith('file://'):
+        path = unquote(urlparse(location).path)
+        # file:///C:/Music/x.mp3 -> C:/Music/x.mp3
+        if len(path) > 2 and path[0] == '/' and path[2] == ':':
+            path = path[1:]
+        return os.path.normpath(path)
+    return location
+
+
+def format_number(value):
+    if value is None or value == '':
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def mik_row(record):
+    """One database row (as {field: value}) -> an export row"""
+    filepath = record.get('filepath') or ''
+    if filepath:
+        filepath = local_path(str(filepath))
+    elif record.get('filename'):
+        filepath = os.path.join(str(record.get('folder') or ''), str(record['filename']))
+
+    row = empty_row(filepath)
+    for field in FIELDNAMES[1:]:
+        value = record.get(field)
+        if value is not None:
+            row[field] = str(value)
+
+    bpm = record.get('bpm')
+    if isinstance(bpm, (int, float)):
+        row['bpm'] = f"{bpm:.2f}"
+    # The energy level as a plain number, not the comment text
+    row['energy'] = format_number(record.get('energy'))
+    return row
+
+
+def iter_mik_rows(db_path, tables=MIK_TABLES, columns=MIK_COLUMNS):
+    """Yield export rows for every track in the MIK collection, in one query"""
+    conn = open_mik_database(db_path)
+    try:
+        table, mapping = resolve_schema(conn, tables, columns)
+        fields = list(mapping)
+        select = ', '.join(f'"{mapping[field]}"' for field in fields)
+        for values in conn.execute(f'SELECT {select} FROM "{table}"'):
+            yield mik_row(dict(zip(fields, values)))
+    finally:
+        conn.close()
+
+
+def export_mik_database(db_path, output_path, batch_size=1000):
+    """Write the MIK collection to CSV/parquet in the extract_mik_tags schema"""
+    sink = open_sink(output_path)
+    batch = ColumnBatch(sink, batch_size)
+    count = 0
+    try:
+        for row in iter_mik_rows(db_path):
+            batch.append(row)
+            count += 1
+        batch.flush()
+    finally:
+        sink.close()
+    print(f"✓ Exported {count} tracks from {db_path} -> {output_path}")
+    return count
+
+
+# === USAGE ===
+if __name__ == "__main__":
+    if not os.path.exists(mik_db_path):
+        raise SystemExit(f"ERROR: MIK database not found at {mik_db_path}")
+    export_mik_database(mik_db_path, output_path)
+    print("\nDone!")
@@ -0,0 +1,206 @@
+# Long-running watch mode for the music directory.
+# Re-reads tags (header-only) just for files that were created, modified,
+# moved or deleted, upserts them into the SQLite tag cache and patches the
+# affected rows of mik_full_export.csv, so new downloads reach the master
+# pipeline without a full rescan.
+#
+# Requires: pip install watchdog  (inotify on Linux, native APIs elsewhere)
+
+import os
+import csv
+import time
+import threading
+
+from watchdog.observers import Observer
+from watchdog.events import FileSystemEventHandler
+
+from extract_mik_tags import (
+    FIELDNAMES, AUDIO_EXTENSIONS, ColumnBatch, open_sink, iter_audio_files, read_tags,
+    export_tags, open_tag_cache, load_tag_cache, store_tags, forget_tags,
+)
+
+# ==========================================
+# CONFIGURE THIS
+# ==========================================
+music_dir = r"C:\Users\rmmcc\OneDrive\Documents\Music"
+output_path = "mik_full_export.csv"   # or "mik_full_export.parquet" (needs pyarrow)
+cache_path = "mik_tag_cache.sqlite"
+debounce_sec = 2.0   # Downloads and bulk imports write in bursts; wait for quiet
+# ==========================================
+
+
+def patch_export_csv(output_csv, upserts, deleted):
+    """
+    Rewrite only the changed rows of an export CSV.
+
+    Rows for files in upserts are replaced in place, rows for deleted files
+    are dropped, untouched rows are copied through verbatim, and new files are
+    appended. Written to a temp file and renamed, so readers never see a
+    half-written export.
+    """
+    remaining = dict(upserts)
+    tmp_path = output_csv + '.tmp'
+    with open(output_csv, 'r', newline='', encoding='utf-8') as src, \
+            open(tmp_path, 'w', newline='', encoding='utf-8') as dst:
+        reader = csv.reader(src)
+        writer = csv.writer(dst)
+        writer.writerow(next(reader, FIELDNAMES))
+        for record in reader:
+            filepath = record[0] if record else ''
+            if filepath in deleted:
+                continue
+            row = remaining.pop(filepath, None)
+            writer.writerow([row[f] for f in FIELDNAMES] if row else record)
+        for row in remaining.values():
+            writer.writerow([row[f] for f in FIELDNAMES])
+    os.replace(tmp_path, output_csv)
+
+
+def rebuild_export(conn, output_path, batch_size=1000):
+    """Columnar outputs are rebuilt from the tag cache (no file is re-read)"""
+    cached = load_tag_cache(conn)
+    sink = open_sink(output_path)
+    batch = ColumnBatch(sink, batch_size)
+    try:
+        for filepath in sorted(cached):
+            batch.append(cached[filepath][2])
+        batch.flush()
+    finally:
+        sink.close()
+
+
+class TagWatcher(FileSystemEventHandler):
+    def __init__(self, music_dir, output_path, cache_path, debounce_sec=2.0, io_workers=16):
+        """
+        Args:
+            music_dir: Library root, watched recursively
+            output_path: Export kept in sync (CSV patched by row, parquet rebuilt)
+            cache_path: SQLite tag cache shared with extract_mik_tags
+            debounce_sec: Quiet period before a changed file is re-read
+            io_workers: Workers for the catch-up scan at startup
+        """
+        self.music_dir = music_dir
+        self.output_path = output_path
+        self.cache_path = cache_path
+        self.debounce_sec = debounce_sec
+
+        self._pending = {}       # file path -> monotonic time of last event
+        self._pending_dirs = {}  # directory moved/deleted/created -> time
+        self._lock = threading.Lock()
+
+        # Catch up on anything that changed while we were not watching;
+        # unchanged files come straight from the cache
+        unreadable = set()
+        export_tags(music_dir, output_path, io_workers=io_workers, cache_path=cache_path,
+                    unreadable=unreadable)
+        conn = open_tag_cache(cache_path)
+        # Unreadable files are not cached but still have an (empty) export
+        # row, which has to go when they are deleted
+        self.known = set(load_tag_cache(conn)) | unreadable
+        conn.close()
+
+    # ----- watchdog callbacks (observer thread) -----
+
+    def on_any_event(self, event):
+        if event.event_type in ('opened', 'closed_no_write'):
+            return
+        now = time.monotonic()
+        with self._lock:
+            for path in (event.src_path, getattr(event, 'dest_path', '')):
+                if not path:
+                    continue
+                if event.is_directory:
+                    if event.event_type != 'modified':
+                        self._pending_dirs[path] = now
+                elif path.lower().endswith(AUDIO_EXTENSIONS):
+                    self._pending[path] = now
+
+    # ----- processing (main thread) -----
+
+    def _take_settled(self):
+        """
+        Pop paths whose own last event is older than the debounce window.
+
+        Each path settles on its own, so a long copy or a busy download folder
+        elsewhere in the tree does not hold back files that are already quiet.
+        """
+        now = time.monotonic()
+        with self._lock:
+            files = sorted(p for p, t in self._pending.items() if now - t >= self.debounce_sec)
+            dirs = sorted(p for p, t in self._pending_dirs.items() if now - t >= self.debounce_sec)
+            for path in files:
+                del self._pending[path]
+            for path in dirs:
+                del self._pending_dirs[path]
+        return files, dirs
+
+    def _expand_dirs(self, dirs):
+        """Files affected by directory events: cached files under them plus files now inside"""
+        paths = set()
+        for directory in dirs:
+            prefix = directory.rstrip('\\/') + os.sep
+            paths.update(p for p in self.known if p.startswith(prefix))
+            if os.path.isdir(directory):
+                paths.update(path for path, _, _ in iter_audio_files(directory))
+        return paths
+
+    def process(self, files, dirs=()):
+        """Re-read changed files, upsert/forget them in the cache and patch the export"""
+        paths = set(files) | self._expand_dirs(dirs)
+        upserts, fresh, deleted = {}, [], set()
+        for path in sorted(paths):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                if path in self.known:
+                    deleted.add(path)
+                continue
+            row, error = read_tags(path)
+            if error is not None:
+                print(f"⚠ {os.path.basename(path)}: {error}")
+                continue
+            upserts[path] = row
+            fresh.append((st.st_size, st.st_mtime_ns, row))
+
+        if not upserts and not deleted:
+            return
+        conn = open_tag_cache(self.cache_path)
+        try:
+            store_tags(conn, fresh)
+            forget_tags(conn, deleted)
+            if self.output_path.lower().endswith('.parquet'):
+                rebuild_export(conn, self.output_path)
+            else:
+                patch_export_csv(self.output_path, upserts, deleted)
+        finally:
+            conn.close()
+        self.known |= set(upserts)
+        self.known -= deleted
+
+        for path in sorted(upserts):
+            print(f"+ {os.path.basename(path)}")
+        for path in sorted(deleted):
+            print(f"- {os.path.basename(path)}")
+        print(f"✓ {self.output_path}: {len(upserts)} upserted, {len(deleted)} removed")
+
+    def run(self, poll_sec=0.25):
+        observer = Observer()
+        observer.schedule(self, self.music_dir, recursive=True)
+        observer.start()
+        print(f"Watching {self.music_dir} (Ctrl+C to stop)...")
+        try:
+            while True:
+                time.sleep(poll_sec)
+                files, dirs = self._take_settled()
+                if files or dirs:
+                    self.process(files, dirs)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            observer.stop()
+            observer.join()
+
+
+# === USAGE ===
+if __name__ == "__main__":
+    TagWatcher(music_dir, output_path, cache_path, debounce_sec).run()
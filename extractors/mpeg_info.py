@@ -0,0 +1,254 @@
+# Exact MP3 duration, bitrate mode and sample rate from frame headers alone.
+# Encoders that write a Xing/Info or VBRI header give the frame count in the
+# first frame; LAME adds encoder delay and padding on top. Files without one
+# are walked frame header to frame header. No audio is decoded, so duration
+# becomes a cheap local column for every file, including the MIK-appended rows
+# Spotify never covered.
+
+import os
+import csv
+import mmap
+import sqlite3
+
+from crate_extractor_corrected import pool_map
+from library_index import walk_parallel
+from audio_hash import id3v2_size, trailing_tags_start
+
+# ==========================================
+# CONFIGURE THIS
+# ==========================================
+music_dir = r"C:\Users\rmmcc\OneDrive\Documents\Music"
+output_csv = "mpeg_info.csv"
+cache_path = "mpeg_info_cache.sqlite"
+workers = 4   # Processes; the frame walk is CPU-bound
+# ==========================================
+
+INFO_COLUMNS = ['filepath', 'duration_sec', 'sample_rate', 'bitrate_kbps', 'bitrate_mode',
+                'channels', 'mpeg_version', 'layer', 'frames', 'source']
+
+# Bitrates (kbps) by (MPEG-1?, layer), index 1..14
+BITRATES = {
+    (True, 1): (32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+SAMPLE_RATES = {1: (44100, 48000, 32000), 2: (22050, 24000, 16000), 2.5: (11025, 12000, 8000)}
+VERSIONS = {0: 2.5, 2: 2, 3: 1}
+LAME_MODES = {1: 'CBR', 2: 'ABR', 8: 'CBR', 9: 'ABR'}   # everything else is VBR
+
+SYNC_SEARCH = 64 * 1024   # Bytes searched for the first frame after the tags
+
+
+def parse_frame_header(buf, pos):
+    """
+    Decode the 4-byte frame header at pos.
+
+    Returns a dict (version, layer, bitrate, sample_rate, channels,
+    samples, length) or None if it is not a valid header.
+    """
+    if pos + 4 > len(buf) or buf[pos] != 0xFF or (buf[pos + 1] & 0xE0) != 0xE0:
+        return None
+    b1, b2, b3 = buf[pos + 1], buf[pos + 2], buf[pos + 3]
+    version = VERSIONS.get((b1 >> 3) & 3)
+    layer = 4 - ((b1 >> 1) & 3)
+    bitrate_index, rate_index = b2 >> 4, (b2 >> 2) & 3
+    if version is None or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+
+    mpeg1 = version == 1
+    bitrate = BITRATES[(mpeg1, layer)][bitrate_index - 1] * 1000
+    sample_rate = SAMPLE_RATES[version][rate_index]
+    padding = (b2 >> 1) & 1
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if (layer == 2 or mpeg1) else 576
+        length = samples // 8 * bitrate // sample_rate + padding
+    return {'version': version, 'layer': layer, 'bitrate': bitrate, 'sample_rate': sample_rate,
+            'channels': 1 if (b3 >> 6) == 3 else 2, 'samples': samples, 'length': length}
+
+
+def find_first_frame(buf, start, end):
+    """First offset from start holding a frame header followed by another one"""
+    limit = min(end, start + SYNC_SEARCH)
+    pos = buf.find(b'\xff', start, limit)
+    while pos != -1:
+        frame = parse_frame_header(buf, pos)
+        if frame and (pos + frame['length'] >= end or parse_frame_header(buf, pos + frame['length'])):
+            return pos, frame
+        pos = buf.find(b'\xff', pos + 1, limit)
+    return None, None
+
+
+def read_vbr_header(buf, pos, frame):
+    """Xing/Info/VBRI header in the first frame -> (source, frames, mode, delay, padding) or None"""
+    mpeg1 = frame['version'] == 1
+    side_info = (32 if frame['channels'] == 2 else 17) if mpeg1 else (17 if frame['channels'] == 2 else 9)
+    xing = pos + 4 + side_info
+    tag = bytes(buf[xing:xing + 4])
+    if tag in (b'Xing', b'Info'):
+        flags = int.from_bytes(buf[xing + 4:xing + 8], 'big')
+        if not flags & 1:
+            return None
+        frames = int.from_bytes(buf[xing + 8:xing + 12], 'big')
+        mode = 'VBR' if tag == b'Xing' else 'CBR'
+        delay = padding = 0
+        # Optional fields: frames (4), bytes (4), TOC (100), quality (4), then LAME
+        lame = xing + 8 + 4 * bool(flags & 1) + 4 * bool(flags & 2) + 100 * bool(flags & 4) + 4 * bool(flags & 8)
+        if bytes(buf[lame:lame + 4]) in (b'LAME', b'Lavf', b'Lavc') and lame + 24 <= len(buf):
+            mode = LAME_MODES.get(buf[lame + 9] & 0x0F, 'VBR')
+            d0, d1, d2 = buf[lame + 21], buf[lame + 22], buf[lame + 23]
+            delay, padding = (d0 << 4) | (d1 >> 4), ((d1 & 0x0F) << 8) | d2
+        return tag.decode('ascii'), frames, mode, delay, padding
+
+    vbri = pos + 4 + 32
+    if bytes(buf[vbri:vbri + 4]) == b'VBRI':
+        frames = int.from_bytes(buf[vbri + 14:vbri + 18], 'big')
+        return 'VBRI', frames, 'VBR', 0, 0
+    return None
+
+
+def walk_frames(buf, pos, end):
+    """Count frames from pos to end -> (frames, samples, total_bits, single_bitrate)"""
+    frames = samples = bits = 0
+    bitrates = set()
+    while pos < end:
+        frame = parse_frame_header(buf, pos)
+        if frame is None:
+            # Lost sync (junk between frames): look for the next frame
+            pos, frame = find_first_frame(buf, pos + 1, end)
+            if pos is None:
+                break
+        frames += 1
+        samples += frame['samples']
+        bits += frame['length'] * 8
+        bitrates.add(frame['bitrate'])
+        pos += frame['length']
+    return frames, samples, bits, len(bitrates) <= 1
+
+
+def read_mpeg_info(filepath):
+    """One MP3 -> INFO_COLUMNS row; raises ValueError if no MPEG frame is found"""
+    with open(filepath, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        f.seek(0)
+        start = id3v2_size(f.read(10))
+        end = trailing_tags_start(f, size)
+        if size == 0 or start >= end:
+            raise ValueError("no audio data")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            pos, frame = find_first_frame(buf, start, end)
+            if pos is None:
+                raise ValueError("no MPEG frame found")
+
+            vbr = read_vbr_header(buf, pos, frame)
+            if vbr:
+                source, frames, mode, delay, padding = vbr
+                samples = max(frames * frame['samples'] - delay - padding, 0)
+                audio_bytes = end - pos - frame['length']
+                duration = samples / frame['sample_rate']
+                bitrate = audio_bytes * 8 / (frames * frame['samples'] / frame['sample_rate']) if frames else 0
+            else:
+                source = 'scan'
+                frames, samples, bits, constant = walk_frames(buf, pos, end)
+                mode = 'CBR' if constant else 'VBR'
+                duration = samples / frame['sample_rate']
+                bitrate = bits / duration if duration else 0
+
+    return {
+        'filepath': filepath,
+        'duration_sec': round(duration, 3),
+        'sample_rate': frame['sample_rate'],
+        'bitrate_kbps': round(bitrate / 1000),
+        'bitrate_mode': mode,
+        'channels': frame['channels'],
+        'mpeg_version': frame['version'],
+        'layer': frame['layer'],
+        'frames': frames,
+        'source': source,
+    }
+
+
+def _read_entry(entry):
+    path, size, mtime_ns = entry
+    try:
+        return size, mtime_ns, read_mpeg_info(path), None
+    except (OSError, ValueError) as e:
+        return size, mtime_ns, {'filepath': path}, str(e)
+
+
+def duration_key(seconds, width=2.0):
+    """
+    Blocking key for reconciliation: durations within `width` seconds land in
+    the same or an adjacent bucket (compare key-1, key, key+1).
+    """
+    if seconds is None or seconds != seconds:
+        return None
+    return int(float(seconds) // width)
+
+
+# ==========================================
+# INFO CACHE
+# ==========================================
+
+def open_info_cache(cache_path):
+    conn = sqlite3.connect(cache_path)
+    columns = ', '.join(f'{column} TEXT' for column in INFO_COLUMNS[1:])
+    conn.execute(f"CREATE TABLE IF NOT EXISTS info (filepath TEXT PRIMARY KEY, "
+                 f"size INTEGER, mtime_ns INTEGER, {columns})")
+    return conn
+
+
+def export_mpeg_info(music_dir, output_csv, cache_path, workers=4):
+    """Scan every MP3 under music_dir (cached by size/mtime) into output_csv"""
+    files = walk_parallel(music_dir, extensions=('.mp3',))
+    conn = open_info_cache(cache_path)
+    try:
+        cached = {}
+        for record in conn.execute(f"SELECT filepath, size, mtime_ns, {', '.join(INFO_COLUMNS[1:])} FROM info"):
+            cached[record[0]] = (record[1], record[2], dict(zip(INFO_COLUMNS, (record[0],) + record[3:])))
+
+        rows, stale = {}, []
+        for path, size, mtime_ns in files:
+            hit = cached.get(path)
+            if hit and hit[0] == size and hit[1] == mtime_ns:
+                rows[path] = hit[2]
+            else:
+                stale.append((path, size, mtime_ns))
+
+        fresh, errors = [], 0
+        for size, mtime_ns, row, error in pool_map(_read_entry, stale, workers):
+            if error:
+                print(f"⚠ {row['filepath']}: {error}")
+                errors += 1
+                continue
+            rows[row['filepath']] = row
+            fresh.append((row['filepath'], size, mtime_ns) + tuple(str(row[c]) for c in INFO_COLUMNS[1:]))
+
+        present = {path for path, _, _ in files}
+        with conn:
+            placeholders = ', '.join('?' * (len(INFO_COLUMNS) + 2))
+            conn.executemany(f"INSERT OR REPLACE INTO info VALUES ({placeholders})", fresh)
+            conn.executemany("DELETE FROM info WHERE filepath = ?",
+                             [(path,) for path in cached if path not in present])
+    finally:
+        conn.close()
+
+    with open(output_csv, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=INFO_COLUMNS)
+        writer.writeheader()
+        for path in sorted(rows):
+            writer.writerow(rows[path])
+    print(f"✓ {len(rows)} MP3s -> {output_csv} ({len(fresh)} scanned, "
+          f"{len(rows) - len(fresh)} cached, {errors} errors)")
+    return rows
+
+
+# === USAGE ===
+if __name__ == "__main__":
+    export_mpeg_info(music_dir, output_csv, cache_path, workers=workers)
+    print("\nDone!")
@@ -0,0 +1,400 @@
+# Loudness and level analysis straight from WAV/AIFF PCM.
+# The sound data chunk is memory-mapped and processed in fixed-size blocks of
+# 100 ms segments, so memory stays flat however long the track is. Per segment
+# we keep the K-weighted mean square (applied in the FFT domain), the plain
+# mean square and the sample peak; integrated loudness (BS.1770-style gating
+# over 400 ms blocks), RMS envelope and waveform overview all come from those.
+# True peak is estimated by 4x windowed-sinc interpolation, evaluated only
+# over sample intervals near the block peak.
+
+import os
+import csv
+import sqlite3
+import struct
+
+import numpy as np
+
+from audio_hash import iter_chunks, build_hash_index
+from crate_extractor_corrected import pool_map
+
+# ==========================================
+# CONFIGURE THIS
+# ==========================================
+music_dir = r"C:\Users\rmmcc\OneDrive\Documents\Music"
+output_csv = "pcm_analysis.csv"
+cache_path = "pcm_analysis_cache.sqlite"        # keyed by audio content hash
+hash_cache_path = "audio_hash_cache.sqlite"     # shared with audio_hash.py
+workers = 4
+# ==========================================
+
+PCM_EXTENSIONS = ('.wav', '.aif', '.aiff')
+SEGMENT_SEC = 0.1            # analysis hop; 4 segments = one 400 ms gating block
+BLOCK_SEGMENTS = 256         # segments mapped and processed per block (~25 s)
+OVERVIEW_POINTS = 1000
+TRUE_PEAK_MARGIN_DB = 4.0    # only intervals ending this close to the block peak are
+                             # interpolated (fs/4 at 45 degrees peaks 3.01 dB over both ends)
+TRUE_PEAK_CHUNK = 1 << 16    # candidate samples interpolated per batch
+
+ANALYSIS_VERSION = 3         # bump when results change; older cache entries are dropped
+
+ANALYSIS_COLUMNS = ['filepath', 'audio_hash', 'duration_sec', 'sample_rate', 'channels', 'bits',
+                    'integrated_lufs', 'true_peak_dbtp', 'sample_peak_dbfs', 'rms_dbfs']
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+# ==========================================
+# PCM ACCESS
+# ==========================================
+
+def extended_to_float(data):
+    """80-bit IEEE extended (AIFF sample rate) -> float"""
+    exponent = int.from_bytes(data[:2], 'big') & 0x7FFF
+    mantissa = int.from_bytes(data[2:10], 'big')
+    return mantissa * 2.0 ** (exponent - 16383 - 63)
+
+
+def read_pcm_format(filepath):
+    """
+    Locate and describe the sample data of a WAV/AIFF file.
+
+    Returns {'channels', 'sample_rate', 'bits', 'float', 'big_endian',
+    'data_offset', 'frames'}. Raises ValueError for compressed formats.
+    """
+    ext = os.path.splitext(filepath)[1].lower()
+    info = {}
+    with open(filepath, 'rb') as f:
+        if ext == '.wav':
+            for chunk_id, start, size in iter_chunks(f, ext):
+                f.seek(start)
+                if chunk_id == b'fmt ':
+                    fmt = f.read(size)
+                    tag, channels, rate, _, block_align, bits = struct.unpack_from('<HHIIHH', fmt)
+                    if tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+                        tag = struct.unpack_from('<H', fmt, 24)[0]
+                    if tag not in (WAVE_FORMAT_PCM, WAVE_FORMAT_FLOAT):
+                        raise ValueError(f"unsupported WAV format tag {tag:#x}")
+                    info.update(channels=channels, sample_rate=rate, bits=bits,
+                                float=tag == WAVE_FORMAT_FLOAT, big_endian=False)
+                elif chunk_id == b'data':
+                    info.update(data_offset=start, data_bytes=size)
+        else:
+            f.seek(8)
+            is_aifc = f.read(4) == b'AIFC'
+            for chunk_id, start, size in iter_chunks(f, ext):
+                f.seek(start)
+                if chunk_id == b'COMM':
+                    comm = f.read(size)
+                    channels, _, bits = struct.unpack_from('>hIh', comm)
+                    compression = comm[18:22] if is_aifc else b'NONE'
+                    if compression not in (b'NONE', b'sowt', b'fl32', b'FL32', b'fl64', b'FL64'):
+                        raise ValueError(f"unsupported AIFC compression {compression!r}")
+                    info.update(channels=channels, sample_rate=extended_to_float(comm[8:18]),
+                                bits=64 if compression.lower() == b'fl64' else
+                                32 if compression.lower() == b'fl32' else bits,
+                                float=compression.lower() in (b'fl32', b'fl64'),
+                                big_endian=compression != b'sowt')
+                elif chunk_id == b'SSND':
+                    offset = struct.unpack('>I', f.read(4))[0]
+                    info.update(data_offset=start + 8 + offset, data_bytes=size - 8 - offset)
+
+    if 'channels' not in info or 'data_offset' not in info:
+        raise ValueError("missing format or sound data chunk")
+    frame_bytes = info['channels'] * ((info['bits'] + 7) // 8)
+    file_size = os.path.getsize(filepath)
+    data_bytes = min(info.pop('data_bytes'), file_size - info['data_offset'])
+    info['frames'] = max(data_bytes, 0) // frame_bytes
+    return info
+
+
+def decode_samples(raw, info):
+    """Raw interleaved bytes -> float32 array (frames, channels) in [-1, 1)"""
+    width = (info['bits'] + 7) // 8
+    order = '>' if info['big_endian'] else '<'
+    if info['float']:
+        samples = np.frombuffer(raw, dtype=f"{order}f{width}").astype(np.float32)
+    elif width == 3:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        hi, lo = (b[:, 0], b[:, 2]) if info['big_endian'] else (b[:, 2], b[:, 0])
+        samples = ((hi << 24) | (b[:, 1] << 16) | (lo << 8)).astype(np.float32) / 2.0 ** 31
+    elif width == 1:
+        # WAV 8-bit is unsigned, AIFF 8-bit is signed
+        dtype = np.int8 if info['big_endian'] else np.uint8
+        samples = np.frombuffer(raw, dtype=dtype).astype(np.float32)
+        samples = samples / 128.0 if info['big_endian'] else (samples - 128.0) / 128.0
+    else:
+        samples = np.frombuffer(raw, dtype=f"{order}i{width}").astype(np.float32) / float(2 ** (8 * width - 1))
+    return samples.reshape(-1, info['channels'])
+
+
+def iter_pcm_blocks(filepath, block_frames, info=None, start=0, stop=None):
+    """Yield float32 (frames, channels) blocks of frames [start, stop) from a memory-mapped WAV/AIFF"""
+    info = info or read_pcm_format(filepath)
+    frame_bytes = info['channels'] * ((info['bits'] + 7) // 8)
+    stop = info['frames'] if stop is None else min(stop, info['frames'])
+    if info['frames'] == 0 or start >= stop:
+        return
+    data = np.memmap(filepath, dtype=np.uint8, mode='r', offset=info['data_offset'],
+                     shape=(info['frames'] * frame_bytes,))
+    try:
+        for first in range(start, stop, block_frames):
+            last = min(first + block_frames, stop)
+            yield decode_samples(data[first * frame_bytes:last * frame_bytes].tobytes(), info)
+    finally:
+        del data
+
+
+# ==========================================
+# ANALYSIS
+# ==========================================
+
+def _biquad_power(b, a, w):
+    """|H(e^jw)|^2 of one biquad"""
+    z1, z2 = np.exp(-1j * w), np.exp(-2j * w)
+    h = (b[0] + b[1] * z1 + b[2] * z2) / (a[0] + a[1] * z1 + a[2] * z2)
+    return np.abs(h) ** 2
+
+
+def k_weighting_power(sample_rate, n_fft):
+    """BS.1770 K-weighting (high shelf + high-pass) power response on rfft bins"""
+    w = 2 * np.pi * np.fft.rfftfreq(n_fft)
+    # Stage 1: high shelf (+4 dB above ~1.7 kHz)
+    k = np.tan(np.pi * 1681.974450955533 / sample_rate)
+    q, vh = 0.7071752369554196, 10 ** (3.999843853973347 / 20)
+    vb = vh ** 0.4996667741545416
+    shelf = _biquad_power((vh + vb * k / q + k * k, 2 * (k * k - vh), vh - vb * k / q + k * k),
+                          (1 + k / q + k * k, 2 * (k * k - 1), 1 - k / q + k * k), w)
+    # Stage 2: high-pass (~38 Hz)
+    k = np.tan(np.pi * 38.13547087602444 / sample_rate)
+    q = 0.5003270373238773
+    # As in BS.1770 / libebur128: a is normalised by a0, b stays (1, -2, 1)
+    a0 = 1 + k / q + k * k
+    highpass = _biquad_power((1, -2, 1), (1, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0), w)
+    return shelf * highpass
+
+
+# 4x oversampling: the three in-between phases of each sample interval from
+# 16 neighbours (Kaiser-windowed sinc, beta 6). Within 0.015 dB of flat up to
+# 0.4 fs; a 12-tap Lanczos kernel ripples by about 0.2 dB there and reads
+# tones up to 0.1 dB over their true peak.
+INTERP_TAPS = np.arange(-7, 9)
+INTERP_KERNEL = np.array([[np.sinc(t - p) * np.i0(6 * np.sqrt(max(0.0, 1 - ((t - p) / 8) ** 2))) / np.i0(6)
+                           for p in (0.25, 0.5, 0.75)] for t in INTERP_TAPS], dtype=np.float32)
+INTERP_BEFORE, INTERP_AFTER = -INTERP_TAPS[0], INTERP_TAPS[-1]
+INTERP_CONTEXT = len(INTERP_TAPS) - 1
+
+
+def interpolated_peak(samples, level, threshold):
+    """
+    Peak of the 4x-interpolated waveform between samples near a level >= threshold.
+
+    samples (channels, frames) carries INTERP_CONTEXT frames of context:
+    INTERP_BEFORE before the first evaluated interval and INTERP_AFTER after
+    the last; level is the per-frame absolute peak across channels. An
+    interval counts when either end is loud, since the peak between two
+    samples can sit next to the quieter one.
+    """
+    ends = np.maximum(level[INTERP_BEFORE:-INTERP_AFTER], level[INTERP_BEFORE + 1:len(level) - INTERP_AFTER + 1])
+    candidates = np.nonzero(ends >= threshold)[0] + INTERP_BEFORE
+    peak = 0.0
+    for start in range(0, len(candidates), TRUE_PEAK_CHUNK):
+        idx = candidates[start:start + TRUE_PEAK_CHUNK]
+        windows = samples[:, idx[:, None] + INTERP_TAPS[None, :]]   # (channels, n, taps)
+        between = windows @ INTERP_KERNEL
+        peak = max(peak, float(np.abs(between).max()))
+    return peak
+
+
+def integrated_loudness(weighted_ms, channel_weights):
+    """BS.1770-style gated loudness (LUFS) from per-segment K-weighted mean squares"""
+    n_blocks = weighted_ms.shape[0] - 3
+    if n_blocks < 1:
+        return None
+    # 400 ms blocks with 75% overlap = mean of 4 consecutive 100 ms segments
+    cumulative = np.vstack([np.zeros((1, weighted_ms.shape[1])), np.cumsum(weighted_ms, axis=0)])
+    blocks = (cumulative[4:] - cumulative[:-4]) / 4
+    power = blocks @ channel_weights
+    with np.errstate(divide='ignore'):
+        loudness = -0.691 + 10 * np.log10(power)
+    gated = power[loudness > -70.0]
+    if not len(gated):
+        return None
+    relative = -0.691 + 10 * np.log10(gated.mean()) - 10.0
+    gated = power[(loudness > -70.0) & (loudness > relative)]
+    return round(float(-0.691 + 10 * np.log10(gated.mean())), 2)
+
+
+def to_db(value):
+    return round(float(20 * np.log10(value)), 2) if value > 0 else None
+
+
+def analyze_pcm(filepath):
+    """
+    Analyse one WAV/AIFF file.
+
+    Returns (row, envelope, overview): row holds the ANALYSIS_COLUMNS scalars,
+    envelope is the 100 ms RMS envelope in dBFS, overview the waveform peaks
+    reduced to OVERVIEW_POINTS.
+    """
+    info = read_pcm_format(filepath)
+    rate, channels = info['sample_rate'], info['channels']
+    hop = max(1, int(round(rate * SEGMENT_SEC)))
+    # Surround channels (Ls, Rs of 5.1) weigh 1.41; everything else 1.0
+    channel_weights = np.ones(channels)
+    if channels == 6:
+        channel_weights[4:] = 1.41
+    # Channels are transformed in pairs as one complex signal, left + i*right
+    # (an odd last channel pairs with silence). Under a weighting symmetric in
+    # frequency the cross terms cancel, so sum(W |Z|^2) over the full spectrum
+    # is the pair's combined weighted energy; one complex FFT costs about two
+    # thirds of two real ones. Paired channels share a weight (L/R, C/LFE, Ls/Rs).
+    pairs = (channels + 1) // 2
+    pair_weights = channel_weights[::2]
+
+    # Parseval: weighted spectrum power -> mean square of the K-weighted segment;
+    # the unweighted column gives the plain mean square from the same FFT
+    half = k_weighting_power(rate, hop)
+    weights = np.stack([np.concatenate([half, half[1:(hop + 1) // 2][::-1]]), np.ones(hop)], axis=1)
+    weights /= hop ** 2
+
+    weighted, plain, peaks = [], [], []
+    true_peak = 0.0
+    # No context before the first frame: intervals without a full window
+    # either side (the first INTERP_BEFORE and last INTERP_AFTER of the
+    # file) are left to the sample peak rather than interpolated against
+    # silence, which would ring at an abrupt start or end
+    context = np.empty((channels, 0), dtype=np.float32)
+    for block in iter_pcm_blocks(filepath, hop * BLOCK_SEGMENTS, info):
+        frames = block.shape[0]
+        lead = context.shape[1]
+        # context carries the previous block's last frames, so each sample
+        # interval is interpolated exactly once, including across block edges.
+        # Channel-major layout keeps every reduction and FFT on contiguous rows.
+        extended = np.empty((channels, lead + frames), dtype=np.float32)
+        extended[:, :lead] = context
+        extended[:, lead:] = block.T
+        context = extended[:, -INTERP_CONTEXT:]
+        # Zero-padded to whole segments
+        packed = np.zeros((pairs, frames + (-frames) % hop), dtype=np.complex128)
+        packed.real[:, :frames] = extended[0::2, lead:]
+        packed.imag[:channels // 2, :frames] = extended[1::2, lead:]
+        spectrum = np.fft.fft(packed.reshape(pairs, -1, hop), axis=2)
+        power = spectrum.real ** 2
+        power += spectrum.imag ** 2
+        power = power @ weights                                             # (pairs, segments, 2)
+        weighted.append(power[:, :, 0].T)
+        plain.append(power[:, :, 1].T)
+
+        level = np.abs(extended).max(axis=0)
+        segment_peaks = np.pad(level[lead:], (0, (-frames) % hop)).reshape(-1, hop).max(axis=1)
+        peaks.append(segment_peaks)
+        threshold = segment_peaks.max() * 10 ** (-TRUE_PEAK_MARGIN_DB / 20)
+        if threshold > 0:
+            true_peak = max(true_peak, interpolated_peak(extended, level, threshold))
+
+    row = {'filepath': filepath, 'duration_sec': round(info['frames'] / rate, 3),
+           'sample_rate': int(rate), 'channels': channels, 'bits': info['bits']}
+    if not weighted:
+        row.update(integrated_lufs=None, true_peak_dbtp=None, sample_peak_dbfs=None, rms_dbfs=None)
+        return row, np.empty(0, dtype=np.float16), np.empty(0, dtype=np.float16)
+
+    weighted, plain, peaks = np.vstack(weighted), np.vstack(plain), np.concatenate(peaks)
+    sample_peak = float(peaks.max())
+    true_peak = max(true_peak, sample_peak)
+
+    plain = plain.sum(axis=1) / channels    # mean square across channels
+    with np.errstate(divide='ignore'):
+        envelope = 10 * np.log10(plain)
+    points = min(OVERVIEW_POINTS, len(peaks))
+    edges = np.linspace(0, len(peaks), points + 1).astype(int)
+    overview = np.maximum.reduceat(peaks, edges[:-1])
+
+    row.update(integrated_lufs=integrated_loudness(weighted, pair_weights),
+               true_peak_dbtp=to_db(true_peak),
+               sample_peak_dbfs=to_db(sample_peak),
+               rms_dbfs=round(float(10 * np.log10(plain.mean())), 2) if plain.mean() > 0 else None)
+    return row, np.maximum(envelope, -120).astype(np.float16), overview.astype(np.float16)
+
+
+# ==========================================
+# CACHE (per audio content hash)
+# ==========================================
+
+def open_analysis_cache(cache_path):
+    conn = sqlite3.connect(cache_path)
+    if conn.execute("PRAGMA user_version").fetchone()[0] != ANALYSIS_VERSION:
+        conn.execute("DROP TABLE IF EXISTS analysis")
+        conn.execute(f"PRAGMA user_version = {ANALYSIS_VERSION}")
+    integer = {'sample_rate', 'channels', 'bits'}
+    columns = ', '.join(f"{c} {'INTEGER' if c in integer else 'REAL'}" for c in ANALYSIS_COLUMNS[2:])
+    conn.execute(f"CREATE TABLE IF NOT EXISTS analysis (audio_hash TEXT PRIMARY KEY, {columns}, "
+                 f"envelope BLOB, overview BLOB)")
+    return conn
+
+
+def load_envelope(cache_path, audio_hash):
+    """(rms envelope dBFS, overview peaks) arrays for one analysed track"""
+    conn = open_analysis_cache(cache_path)
+    try:
+        record = conn.execute("SELECT envelope, overview FROM analysis WHERE audio_hash = ?",
+                              (audio_hash,)).fetchone()
+    finally:
+        conn.close()
+    if record is None:
+        return None
+    return np.frombuffer(record[0], dtype=np.float16), np.frombuffer(record[1], dtype=np.float16)
+
+
+def _analyze_entry(entry):
+    path, audio_hash = entry
+    try:
+        row, envelope, overview = analyze_pcm(path)
+        row['audio_hash'] = audio_hash
+        return row, envelope.tobytes(), overview.tobytes(), None
+    except (OSError, ValueError, struct.error) as e:
+        return {'filepath': path, 'audio_hash': audio_hash}, None, None, str(e)
+
+
+def analyze_library(music_dir, output_csv, cache_path, hash_cache_path, workers=4):
+    """Analyse every WAV/AIFF under music_dir; files with a known audio hash are not re-read"""
+    hashes, _ = build_hash_index(music_dir, hash_cache_path, extensions=PCM_EXTENSIONS)
+    files = sorted(hashes.items())
+
+    conn = open_analysis_cache(cache_path)
+    try:
+        known = {}
+        for record in conn.execute(f"SELECT audio_hash, {', '.join(ANALYSIS_COLUMNS[2:])} FROM analysis"):
+            known[record[0]] = dict(zip(ANALYSIS_COLUMNS[2:], record[1:]))
+
+        todo = list({h: (p, h) for p, h in files if h not in known}.values())
+        analysed = errors = 0
+        with conn:
+            placeholders = ', '.join('?' * (len(ANALYSIS_COLUMNS) + 1))
+            for row, envelope, overview, error in pool_map(_analyze_entry, todo, workers):
+                if error:
+                    print(f"⚠ {row['filepath']}: {error}")
+                    errors += 1
+                    continue
+                values = [row['audio_hash']] + [row[c] for c in ANALYSIS_COLUMNS[2:]] + [envelope, overview]
+                conn.execute(f"INSERT OR REPLACE INTO analysis VALUES ({placeholders})", values)
+                known[row['audio_hash']] = {c: row[c] for c in ANALYSIS_COLUMNS[2:]}
+                analysed += 1
+    finally:
+        conn.close()
+
+    with open(output_csv, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=ANALYSIS_COLUMNS)
+        writer.writeheader()
+        for path, audio_hash in files:
+            if audio_hash in known:
+                writer.writerow({'filepath': path, 'audio_hash': audio_hash, **known[audio_hash]})
+    print(f"✓ {len(files)} WAV/AIFF files -> {output_csv} ({analysed} analysed, "
+          f"{len(files) - len(todo)} cached, {errors} errors)")
+
+
+# === USAGE ===
+if __name__ == "__main__":
+    analyze_library(music_dir, output_csv, cache_path, hash_cache_path, workers=workers)
+    print("\nDone!")
@@ -0,0 +1,126 @@
+# Streaming reader for Serato's "_Serato_/database V2" library file.
+# Same tag-length-value layout as .crate files: a 'vrsn' record followed by
+# one 'otrk' record per track, whose nested fields hold Serato's own metadata.
+# One sequential pass yields the whole library.
+
+import os
+import csv
+import mmap
+import struct
+
+from crate_extractor_corrected import iter_crate_records, track_basename
+
+# Field tag -> export column. The tag's first letter gives the payload type:
+#   t/p = UTF-16BE text, u = uint32, s = uint16, b = bool byte
+DATABASE_FIELDS = {
+    'pfil': 'filepath',
+    'tsng': 'title',
+    'tart': 'artist',
+    'talb': 'album',
+    'tgen': 'genre',
+    'tbpm': 'bpm',
+    'tkey': 'key',
+    'tcom': 'comment',
+    'tgrp': 'grouping',
+    'tlbl': 'label',
+    'tcmp': 'composer',
+    'ttyr': 'year',
+    'tlen': 'length',
+    'tbit': 'bitrate',
+    'tsmp': 'sample_rate',
+    'ttyp': 'file_type',
+    'tadd': 'added',
+    'uadd': 'added_ts',
+    'utme': 'file_mtime_ts',
+    'utpc': 'play_count',
+    'bply': 'played',
+    'bmis': 'missing',
+    'bcrt': 'corrupt',
+}
+
+COLUMNS = ['filename'] + list(DATABASE_FIELDS.values())
+
+
+def decode_field(tag, payload):
+    """Decode one otrk field payload according to its type letter"""
+    kind = tag[0:1]
+    if kind in (b't', b'p'):
+        return payload.decode('utf-16-be', errors='replace').rstrip('\x00')
+    if kind == b'u' and len(payload) == 4:
+        return struct.unpack('>I', payload)[0]
+    if kind == b's' and len(payload) == 2:
+        return struct.unpack('>H', payload)[0]
+    if kind == b'b' and len(payload) == 1:
+        return bool(payload[0])
+    return None
+
+
+def decode_track(buf, start, end, fields=DATABASE_FIELDS):
+    """Decode the fields of one otrk record into a {column: value} dict"""
+    record = {}
+    for tag, field_start, field_end in iter_crate_records(buf, start, end):
+        column = fields.get(tag.decode('ascii', errors='replace'))
+        if column is not None:
+            record[column] = decode_field(tag, bytes(buf[field_start:field_end]))
+    if 'filepath' in record:
+        record['filename'] = track_basename(record['filepath'])
+    return record
+
+
+def iter_database_tracks(db_path, fields=DATABASE_FIELDS):
+    """
+    Yield (offset, record) for every track in database V2, in file order.
+
+    offset is the byte position of the otrk record, for read_track_at().
+    Only the requested fields are decoded.
+    """
+    with open(db_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            for tag, start, end in iter_crate_records(buf):
+                if tag == b'otrk':
+                    yield start - 8, decode_track(buf, start, end, fields)
+
+
+def build_path_index(db_path):
+    """Map each track's filepath to its otrk record offset"""
+    path_only = {'pfil': 'filepath'}
+    return {record['filepath']: offset
+            for offset, record in iter_database_tracks(db_path, path_only)
+            if 'filepath' in record}
+
+
+def read_track_at(db_path, offset):
+    """Decode the single otrk record starting at offset"""
+    with open(db_path, 'rb') as f:
+        f.seek(offset)
+        header = f.read(8)
+        tag, length = struct.unpack('>4sI', header)
+        if tag != b'otrk':
+            raise ValueError(f"No otrk record at offset {offset}")
+        payload = f.read(length)
+    return decode_track(payload, 0, len(payload))
+
+
+def export_database(db_path, output_csv):
+    """Stream every database V2 track into a CSV, one row per track"""
+    count = 0
+    with open(output_csv, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=COLUMNS)
+        writer.writeheader()
+        for _, record in iter_database_tracks(db_path):
+            writer.writerow(record)
+            count += 1
+    print(f"✓ Exported {count} Serato library tracks to {output_csv}")
+    return count
+
+
+# === USAGE ===
+if __name__ == "__main__":
+    db_path = r'C:\Users\fulmi\Music\_Serato_\database V2'
+    output_csv = 'serato_database_export.csv'
+
+    print(f"Reading {db_path}\n")
+    export_database(db_path, output_csv)
+    print("\nDone!")
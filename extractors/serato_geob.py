@@ -0,0 +1,279 @@
+# Serato cue points, loops, beatgrids and autotags from ID3 GEOB frames.
+# Serato keeps its per-track analysis in three GEOB objects:
+#   "Serato Markers2"  base64 blob of CUE / LOOP / COLOR / BPMLOCK entries
+#   "Serato BeatGrid"  binary list of beatgrid markers
+#   "Serato Autotags"  BPM and gain as NUL-terminated ASCII
+# Only those frames are read (artwork and audio are skipped). Results land in
+# long-format tables, kept incrementally in SQLite and exported columnar.
+
+import os
+import base64
+import sqlite3
+import struct
+
+import pandas as pd
+from mutagen import MutagenError
+from mutagen.id3 import ID3, ID3NoHeaderError
+from mutagen.aiff import AIFF
+from mutagen.wave import WAVE
+
+from id3_frames import read_geob_frames, UnsupportedTag
+from audio_tags import find_id3_chunk
+from crate_extractor_corrected import pool_map
+from library_index import walk_parallel
+
+# ==========================================
+# CONFIGURE THIS
+# ==========================================
+music_dir = r"C:\Users\rmmcc\OneDrive\Documents\Music"
+store_path = "serato_geob.sqlite"   # incremental store; only changed files are re-read
+output_dir = "serato_analysis"      # cues / beatgrid / analysis tables
+output_format = "parquet"           # or "csv"
+workers = 4
+# ==========================================
+
+MARKERS2 = 'Serato Markers2'
+BEATGRID = 'Serato BeatGrid'
+AUTOTAGS = 'Serato Autotags'
+GEOB_OBJECTS = {MARKERS2, BEATGRID, AUTOTAGS}
+
+# Serato writes GEOB frames into the ID3 tag (or ID3 chunk) of these formats
+GEOB_EXTENSIONS = ('.mp3', '.wav', '.aif', '.aiff')
+
+TABLES = {
+    'cues': ['filepath', 'kind', 'cue_index', 'position_ms', 'end_ms', 'color', 'label', 'locked'],
+    'beatgrid': ['filepath', 'marker', 'position_sec', 'beats_to_next', 'bpm'],
+    'analysis': ['filepath', 'serato_bpm', 'autogain', 'gain_db', 'track_color', 'bpm_lock'],
+}
+
+CUE_ENTRY = struct.Struct('>xBIx3s2x')          # index, position ms, RGB
+LOOP_ENTRY = struct.Struct('>xBII4x4sx?')       # index, start ms, end ms, ARGB, locked
+BEATGRID_HEADER = struct.Struct('>2xI')         # version, marker count
+BEATGRID_MARKER = struct.Struct('>fI')          # position (s), beats until next marker
+BEATGRID_TERMINAL = struct.Struct('>ff')        # position (s), BPM
+
+
+def hex_color(rgb):
+    return '#' + rgb[-3:].hex().upper()
+
+
+def terminated_text(data, start=0):
+    end = data.find(b'\x00', start)
+    return data[start:end if end != -1 else len(data)].decode('utf-8', errors='replace')
+
+
+def iter_markers2(data):
+    """Yield (entry type, body) from a Markers2 object"""
+    # Object: 0x01 0x01, then base64 text (newline-wrapped, NUL-padded)
+    text = data[2:].split(b'\x00', 1)[0].replace(b'\n', b'')
+    if len(text) % 4 == 1:
+        text = text[:-1]   # Serato sometimes leaves a dangling character
+    raw = base64.b64decode(text + b'=' * (-len(text) % 4))
+    pos = 2   # decoded data repeats the 0x01 0x01 version
+    while pos < len(raw):
+        end = raw.find(b'\x00', pos)
+        if end <= pos or end + 5 > len(raw):
+            return
+        length = struct.unpack_from('>I', raw, end + 1)[0]
+        yield raw[pos:end].decode('ascii', errors='replace'), raw[end + 5:end + 5 + length]
+        pos = end + 5 + length
+
+
+def decode_markers2(filepath, data):
+    """Markers2 -> (cue rows, analysis updates)"""
+    cues, analysis = [], {}
+    for kind, body in iter_markers2(data):
+        if kind == 'CUE' and len(body) >= CUE_ENTRY.size:
+            index, position, rgb = CUE_ENTRY.unpack_from(body)
+            cues.append([filepath, 'cue', index, position, None, hex_color(rgb),
+                         terminated_text(body, CUE_ENTRY.size), None])
+        elif kind == 'LOOP' and len(body) >= LOOP_ENTRY.size:
+            index, start, end, argb, locked = LOOP_ENTRY.unpack_from(body)
+            cues.append([filepath, 'loop', index, start, end, hex_color(argb),
+                         terminated_text(body, LOOP_ENTRY.size), locked])
+        elif kind == 'COLOR' and len(body) >= 4:
+            analysis['track_color'] = hex_color(body[1:4])
+        elif kind == 'BPMLOCK' and body:
+            analysis['bpm_lock'] = bool(body[0])
+    return cues, analysis
+
+
+def decode_beatgrid(filepath, data):
+    """BeatGrid -> beatgrid rows; the last marker carries the BPM"""
+    if len(data) < BEATGRID_HEADER.size:
+        return []
+    (count,) = BEATGRID_HEADER.unpack_from(data)
+    rows = []
+    pos = BEATGRID_HEADER.size
+    for marker in range(count):
+        if pos + 8 > len(data):
+            break
+        if marker == count - 1:
+            position, bpm = BEATGRID_TERMINAL.unpack_from(data, pos)
+            rows.append([filepath, marker, round(position, 6), None, round(bpm, 3)])
+        else:
+            position, beats = BEATGRID_MARKER.unpack_from(data, pos)
+            rows.append([filepath, marker, round(position, 6), beats, None])
+        pos += 8
+    return rows
+
+
+def decode_autotags(data):
+    """Autotags -> {'serato_bpm', 'autogain', 'gain_db'}"""
+    values = data[2:].split(b'\x00')
+    fields = ('serato_bpm', 'autogain', 'gain_db')
+    out = {}
+    for field, value in zip(fields, values):
+        try:
+            out[field] = float(value.decode('ascii'))
+        except ValueError:
+            pass
+    return out
+
+
+def read_geob_objects(filepath):
+    """{description: bytes} for the Serato GEOB objects of one file"""
+    ext = os.path.splitext(filepath)[1].lower()
+    try:
+        with open(filepath, 'rb') as f:
+            offset = 0
+            if ext != '.mp3':
+                offset = find_id3_chunk(f, ext)
+                if offset is None:
+                    return {}
+            return read_geob_frames(f, GEOB_OBJECTS, offset)
+    except UnsupportedTag:
+        pass
+    # Tags the lean reader leaves to mutagen (v2.2, unsynchronised, ...)
+    if ext in ('.aif', '.aiff'):
+        tags = AIFF(filepath).tags
+    elif ext == '.wav':
+        tags = WAVE(filepath).tags
+    else:
+        try:
+            tags = ID3(filepath)
+        except ID3NoHeaderError:
+            return {}   # untagged: an empty (cacheable) result, not an error
+    if not tags:
+        return {}
+    return {frame.desc: frame.data for frame in tags.getall('GEOB') if frame.desc in GEOB_OBJECTS}
+
+
+def read_serato_analysis(filepath):
+    """One file -> {'cues': rows, 'beatgrid': rows, 'analysis': rows}"""
+    objects = read_geob_objects(filepath)
+    cues, analysis = [], {}
+    if MARKERS2 in objects:
+        cues, analysis = decode_markers2(filepath, objects[MARKERS2])
+    beatgrid = decode_beatgrid(filepath, objects[BEATGRID]) if BEATGRID in objects else []
+    if AUTOTAGS in objects:
+        analysis.update(decode_autotags(objects[AUTOTAGS]))
+    analysis_rows = []
+    if analysis:
+        analysis_rows.append([filepath] + [analysis.get(c) for c in TABLES['analysis'][1:]])
+    return {'cues': cues, 'beatgrid': beatgrid, 'analysis': analysis_rows}
+
+
+def _read_entry(entry):
+    path, size, mtime_ns = entry
+    try:
+        return path, size, mtime_ns, read_serato_analysis(path), None
+    except (OSError, ValueError, struct.error, base64.binascii.Error, MutagenError) as e:
+        # MutagenError covers the fallback's ID3UnsupportedVersionError (not a
+        # ValueError), ID3JunkFrameError and the WAVE/AIFF errors
+        return path, size, mtime_ns, None, str(e)
+
+
+# ==========================================
+# INCREMENTAL STORE
+# ==========================================
+
+def open_store(store_path):
+    conn = sqlite3.connect(store_path)
+    conn.execute("CREATE TABLE IF NOT EXISTS files (filepath TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER)")
+    for table, columns in TABLES.items():
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(columns)})")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_filepath ON {table} (filepath)")
+    return conn
+
+
+def _forget(conn, paths):
+    for table in ('files',) + tuple(TABLES):
+        conn.executemany(f"DELETE FROM {table} WHERE filepath = ?", [(p,) for p in paths])
+
+
+def update_store(music_dir, store_path, workers=4):
+    """Re-read only files whose (size, mtime_ns) changed; drop vanished files"""
+    files = walk_parallel(music_dir, extensions=GEOB_EXTENSIONS)
+    conn = open_store(store_path)
+    try:
+        known = {path: (size, mtime_ns) for path, size, mtime_ns in
+                 conn.execute("SELECT filepath, size, mtime_ns FROM files")}
+        stale = [entry for entry in files if known.get(entry[0]) != (entry[1], entry[2])]
+        present = {path for path, _, _ in files}
+
+        read = errors = 0
+        with conn:
+            _forget(conn, [path for path in known if path not in present])
+            for path, size, mtime_ns, tables, error in pool_map(_read_entry, stale, workers):
+                _forget(conn, [path])
+                if error:
+                    print(f"⚠ {path}: {error}")
+                    errors += 1
+                    continue
+                for table, rows in tables.items():
+                    placeholders = ', '.join('?' * len(TABLES[table]))
+                    conn.executemany(f"INSERT INTO {table} VALUES ({placeholders})", rows)
+                conn.execute("INSERT INTO files VALUES (?, ?, ?)", (path, size, mtime_ns))
+                read += 1
+    finally:
+        conn.close()
+    print(f"✓ Serato GEOB: {read} files read, {len(files) - len(stale)} unchanged, {errors} errors")
+
+
+def load_tables(store_path):
+    """{table name: DataFrame} from the store"""
+    conn = open_store(store_path)
+    try:
+        return {table: pd.read_sql_query(f"SELECT * FROM {table} ORDER BY rowid", conn) for table in TABLES}
+    finally:
+        conn.close()
+
+
+def export_tables(tables, output_dir, output_format='parquet'):
+    os.makedirs(output_dir, exist_ok=True)
+    for table, df in tables.items():
+        path = os.path.join(output_dir, f"{table}.{output_format}")
+        if output_format == 'parquet':
+            try:
+                df.to_parquet(path, index=False)
+            except ImportError:
+                raise SystemExit("ERROR: parquet output needs pyarrow (pip install pyarrow)")
+        else:
+            df.to_csv(path, index=False)
+        print(f"✓ {len(df)} {table} rows -> {path}")
+
+
+def cues_before_bars(cues, beatgrid, analysis, bars=16, beats_per_bar=4):
+    """
+    Cue rows placed within the first `bars` bars, measured from the first
+    beatgrid marker at the track's grid BPM (Autotags BPM when there is no grid).
+    """
+    grid = beatgrid.groupby('filepath').agg(first_beat=('position_sec', 'first'), grid_bpm=('bpm', 'last'))
+    tracks = analysis.set_index('filepath')[['serato_bpm']].join(grid, how='outer')
+    tracks['bpm'] = tracks['grid_bpm'].fillna(tracks['serato_bpm'])
+    tracks['limit_ms'] = (tracks['first_beat'].fillna(0) * 1000
+                          + bars * beats_per_bar * 60000 / tracks['bpm'])
+    merged = cues[cues['kind'] == 'cue'].join(tracks['limit_ms'], on='filepath')
+    return merged[merged['position_ms'] < merged['limit_ms']].drop(columns='limit_ms')
+
+
+# === USAGE ===
+if __name__ == "__main__":
+    update_store(music_dir, store_path, workers=workers)
+    tables = load_tables(store_path)
+    export_tables(tables, output_dir, output_format)
+
+    early = cues_before_bars(tables['cues'], tables['beatgrid'], tables['analysis'], bars=16)
+    print(f"\n{early['filepath'].nunique()} tracks have a cue in the first 16 bars")
+    print("\nDone!")
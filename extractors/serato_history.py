@@ -0,0 +1,207 @@
+# Incremental reader for Serato's History/Sessions/*.session files.
+# A session file is the same TLV family as crates: a 'vrsn' record, an 'oses'
+# session header, then one 'oent' record per play whose 'adat' payload holds
+# numbered fields (4-byte big-endian field id | length | value). Serato only
+# appends while a session runs, so each file's byte offset is remembered and
+# later runs read just the records added since.
+
+import os
+import mmap
+import sqlite3
+import struct
+import hashlib
+
+import pandas as pd
+
+from crate_extractor_corrected import iter_crate_records, track_basename
+
+# ==========================================
+# CONFIGURE THIS
+# ==========================================
+sessions_dir = r"C:\Users\fulmi\Music\_Serato_\History\Sessions"
+store_path = "serato_history.sqlite"
+plays_csv = "serato_plays.csv"
+track_stats_csv = "serato_track_stats.csv"
+transitions_csv = "serato_transitions.csv"
+# ==========================================
+
+# adat field id -> (column, type): 't' UTF-16BE text, 'u' uint32, 'b' bool
+SESSION_FIELDS = {
+    1: ('row', 'u'),
+    2: ('filepath', 't'),
+    6: ('title', 't'),
+    7: ('artist', 't'),
+    28: ('start_time', 'u'),
+    29: ('end_time', 'u'),
+    31: ('deck', 'u'),
+    45: ('playtime', 'u'),
+    50: ('played', 'b'),
+}
+
+PLAY_COLUMNS = ['session', 'row', 'filepath', 'filename', 'title', 'artist',
+                'start_time', 'end_time', 'deck', 'playtime', 'played']
+
+_FIELD_HEADER = struct.Struct('>II')
+HEAD_BYTES = 4096   # leading bytes fingerprinted to spot a rewritten session file
+
+
+def decode_entry(buf, start, end):
+    """Decode one oent/adat payload into {column: value}"""
+    record = {}
+    for tag, adat_start, adat_end in iter_crate_records(buf, start, end):
+        if tag != b'adat':
+            continue
+        pos = adat_start
+        while pos + _FIELD_HEADER.size <= adat_end:
+            field_id, length = _FIELD_HEADER.unpack_from(buf, pos)
+            value_start = pos + _FIELD_HEADER.size
+            pos = value_start + length
+            if pos > adat_end:
+                break
+            spec = SESSION_FIELDS.get(field_id)
+            if spec is None:
+                continue
+            column, kind = spec
+            value = bytes(buf[value_start:pos])
+            if kind == 't':
+                record[column] = value.decode('utf-16-be', errors='replace').rstrip('\x00')
+            elif kind == 'u' and length == 4:
+                record[column] = struct.unpack('>I', value)[0]
+            elif kind == 'b' and length == 1:
+                record[column] = bool(value[0])
+    if 'filepath' in record:
+        record['filename'] = track_basename(record['filepath'])
+    return record
+
+
+def read_session_entries(session_path, offset=0):
+    """
+    Read the complete oent records from offset onwards.
+
+    Returns (records, new_offset); new_offset is the end of the last complete
+    record, so a record Serato is still writing is picked up next time.
+    """
+    records = []
+    with open(session_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size <= offset:
+            return records, offset
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            new_offset = offset
+            for tag, start, end in iter_crate_records(buf, offset):
+                if tag == b'oent':
+                    records.append(decode_entry(buf, start, end))
+                new_offset = end
+    return records, new_offset
+
+
+def head_fingerprint(session_path, offset):
+    """
+    Digest of the first min(offset, HEAD_BYTES) bytes: the part already read,
+    which appending never changes. A different digest means the file was
+    rewritten, whatever its new size.
+    """
+    with open(session_path, 'rb') as f:
+        return hashlib.blake2b(f.read(min(offset, HEAD_BYTES)), digest_size=16).hexdigest()
+
+
+# ==========================================
+# PLAY STORE
+# ==========================================
+
+def open_store(store_path):
+    conn = sqlite3.connect(store_path)
+    conn.execute("CREATE TABLE IF NOT EXISTS sessions (session TEXT PRIMARY KEY, "
+                 "offset INTEGER, size INTEGER, mtime_ns INTEGER, head TEXT)")
+    if 'head' not in {row[1] for row in conn.execute("PRAGMA table_info(sessions)")}:
+        conn.execute("ALTER TABLE sessions ADD COLUMN head TEXT")   # stores from before fingerprints
+    conn.execute(f"CREATE TABLE IF NOT EXISTS plays ({', '.join(PLAY_COLUMNS)}, "
+                 f"PRIMARY KEY (session, row))")
+    return conn
+
+
+def update_history(sessions_dir, store_path):
+    """
+    Ingest new plays from every session file.
+
+    Unchanged files cost one stat. Grown files are read from their stored
+    offset. Files that shrank, or whose already-read leading bytes changed,
+    were rewritten and are read again from the start.
+    Serato may append a newer copy of a row (e.g. once its end time is known);
+    the newest copy wins.
+    """
+    conn = open_store(store_path)
+    known = {session: (offset, size, mtime_ns, head) for session, offset, size, mtime_ns, head in
+             conn.execute("SELECT session, offset, size, mtime_ns, head FROM sessions")}
+    read_files = new_rows = 0
+    placeholders = ', '.join('?' * len(PLAY_COLUMNS))
+    try:
+        with conn, os.scandir(sessions_dir) as entries:
+            for entry in sorted(entries, key=lambda e: e.name):
+                if not entry.name.endswith('.session'):
+                    continue
+                st = entry.stat()
+                session = entry.name[:-len('.session')]
+                offset, size, mtime_ns, head = known.get(session, (0, -1, -1, None))
+                if st.st_size == size and st.st_mtime_ns == mtime_ns:
+                    continue
+                if offset and (st.st_size < offset or head_fingerprint(entry.path, offset) != head):
+                    conn.execute("DELETE FROM plays WHERE session = ?", (session,))
+                    offset = 0
+
+                records, offset = read_session_entries(entry.path, offset)
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO plays VALUES ({placeholders})",
+                    [[session] + [r.get(c) for c in PLAY_COLUMNS[1:]] for r in records if 'row' in r])
+                conn.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?)",
+                             (session, offset, st.st_size, st.st_mtime_ns,
+                              head_fingerprint(entry.path, offset)))
+                read_files += 1
+                new_rows += len(records)
+    finally:
+        conn.close()
+    print(f"✓ History: {read_files} session files read, {new_rows} new records")
+
+
+def load_plays(store_path):
+    conn = open_store(store_path)
+    try:
+        return pd.read_sql_query("SELECT * FROM plays ORDER BY session, start_time, row", conn)
+    finally:
+        conn.close()
+
+
+def track_stats(plays):
+    """Per-track aggregates: plays, sessions, first/last played, total playtime"""
+    played = plays[plays['played'].fillna(True).astype(bool)]
+    stats = played.groupby('filename').agg(
+        play_count=('row', 'size'),
+        sessions=('session', 'nunique'),
+        first_played=('start_time', 'min'),
+        last_played=('start_time', 'max'),
+        total_playtime=('playtime', 'sum'),
+    ).reset_index()
+    for column in ('first_played', 'last_played'):
+        stats[column] = pd.to_datetime(stats[column], unit='s')
+    return stats.sort_values('play_count', ascending=False)
+
+
+def transitions(plays):
+    """(from, to) track pairs played back to back within a session, with counts"""
+    played = plays[plays['played'].fillna(True).astype(bool)].sort_values(['session', 'start_time', 'row'])
+    next_track = played.groupby('session')['filename'].shift(-1)
+    pairs = pd.DataFrame({'from_track': played['filename'], 'to_track': next_track}).dropna()
+    pairs = pairs[pairs['from_track'] != pairs['to_track']]
+    return (pairs.groupby(['from_track', 'to_track']).size().rename('count')
+            .reset_index().sort_values('count', ascending=False))
+
+
+# === USAGE ===
+if __name__ == "__main__":
+    update_history(sessions_dir, store_path)
+    plays = load_plays(store_path)
+    plays.to_csv(plays_csv, index=False)
+    track_stats(plays).to_csv(track_stats_csv, index=False)
+    transitions(plays).to_csv(transitions_csv, index=False)
+    print(f"✓ {len(plays)} plays -> {plays_csv}, {track_stats_csv}, {transitions_csv}")
+    print("\nDone!")
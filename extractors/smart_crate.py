@@ -0,0 +1,258 @@
+# Serato Smart Crate (.scrate) parsing and evaluation against the master table.
+# Smart crates use the same TLV layout as .crate files, but hold rules instead
+# of tracks. Each rule is compiled into a vectorized column predicate; all
+# smart crates are evaluated in one pass, sharing identical rules, and their
+# membership is merged into the same filename -> crate tags lookup.
+
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from crate_extractor_corrected import iter_crate_records, track_basename
+
+# Rule field ids ('urkt') as Serato writes them
+RULE_FIELDS = {
+    4: 'filename', 6: 'song', 7: 'artist', 8: 'album', 9: 'genre', 15: 'bpm',
+    17: 'comment', 19: 'grouping', 20: 'remixer', 21: 'label', 22: 'composer',
+    23: 'year', 25: 'added', 51: 'key', 79: 'plays',
+}
+
+# Rule field -> master dataset column
+FIELD_COLUMNS = {
+    'filename': 'filepath',
+    'song': 'Track Name',
+    'artist': 'Artist Name(s)',
+    'album': 'Album Name',
+    'genre': 'Genre',
+    'bpm': 'Track BPM',
+    'comment': 'Notes',
+    'label': 'Release Label',
+    'year': 'Album Release Date',
+    'added': 'added',   # Serato database, rekordbox and Traktor exports all write it
+    'key': 'Key (Camelot)',
+    'plays': 'play_count',
+}
+
+TEXT_CONDITIONS = {'cond_con_str', 'cond_dnc_str', 'cond_is_str', 'cond_isn_str'}
+NUMBER_CONDITIONS = {'cond_greq_uint', 'cond_lseq_uint'}
+TIME_CONDITIONS = {'cond_bef_time', 'cond_aft_time'}
+
+# Date formats accepted in time rules and date columns, besides unix seconds:
+# rekordbox writes 2023-01-15, Traktor 2023/1/15, Serato rules 1/15/2023
+DATE_FORMATS = ['%Y-%m-%d', '%Y/%m/%d', '%m/%d/%Y', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S']
+
+
+def decode_text(payload):
+    return payload.decode('utf-16-be', errors='replace').rstrip('\x00')
+
+
+def parse_scrate(scrate_path):
+    """
+    Parse a .scrate file into {'name', 'match_all', 'rules'}.
+
+    Each rule is {'field', 'condition', 'text', 'number'}; fields or
+    conditions this parser does not know are kept as-is and rejected later.
+    """
+    with open(scrate_path, 'rb') as f:
+        data = f.read()
+
+    smart_crate = {
+        'name': os.path.splitext(os.path.basename(scrate_path))[0],
+        'match_all': True,
+        'rules': [],
+    }
+    for tag, start, end in iter_crate_records(data):
+        if tag == b'rart':
+            smart_crate['match_all'] = bool(data[start]) if end > start else True
+        elif tag == b'rurt':
+            rule = {'field': None, 'condition': None, 'text': None, 'number': None}
+            for sub_tag, sub_start, sub_end in iter_crate_records(data, start, end):
+                payload = data[sub_start:sub_end]
+                if sub_tag == b'urkt':
+                    field_id = int.from_bytes(payload, 'big')
+                    rule['field'] = RULE_FIELDS.get(field_id, field_id)
+                elif sub_tag == b'trft':
+                    rule['condition'] = decode_text(payload)
+                elif sub_tag == b'trpt':
+                    rule['text'] = decode_text(payload)
+                elif sub_tag == b'urpt':
+                    rule['number'] = int.from_bytes(payload, 'big')
+            smart_crate['rules'].append(rule)
+    return smart_crate
+
+
+def parse_dates(values):
+    """
+    Unix seconds or DATE_FORMATS text -> float unix seconds, NaN where empty.
+
+    Raises ValueError on any other value, rather than letting it quietly
+    fall out of every time rule.
+    """
+    text = pd.Series(values, dtype=object).fillna('').astype(str).str.strip()
+    seconds = pd.to_numeric(text.where(text != ''), errors='coerce').astype(float)
+    for fmt in DATE_FORMATS:
+        todo = seconds.isna() & (text != '')
+        if not todo.any():
+            break
+        stamps = pd.to_datetime(text[todo], format=fmt, errors='coerce')
+        seconds[todo] = (stamps - pd.Timestamp(0)) / pd.Timedelta(seconds=1)
+    bad = text[seconds.isna() & (text != '')]
+    if len(bad):
+        raise ValueError(f"{len(bad)} unrecognized dates, e.g. {bad.iloc[0]!r}")
+    return seconds.to_numpy(dtype=float, na_value=np.nan)
+
+
+class SmartCrateEvaluator:
+    def __init__(self, master_df, field_columns=FIELD_COLUMNS, path_column='filepath'):
+        """
+        Args:
+            master_df: Master table the rules are evaluated over
+            field_columns: Rule field -> master column
+            path_column: Column holding each track's file path
+        """
+        self.df = master_df
+        self.field_columns = field_columns
+        self.path_column = path_column
+        self._text = {}
+        self._number = {}
+        self._time = {}
+        self._rules = {}
+
+    # Column arrays are converted once and shared by every rule that reads them
+
+    def text_column(self, field):
+        if field not in self._text:
+            column = self.df[self.field_columns[field]].fillna('').astype(str)
+            if field == 'filename':
+                column = column.map(track_basename)
+            self._text[field] = column.str.lower()
+        return self._text[field]
+
+    def number_column(self, field):
+        if field not in self._number:
+            values = pd.to_numeric(self.df[self.field_columns[field]], errors='coerce')
+            self._number[field] = values.to_numpy(dtype=float, na_value=np.nan)
+        return self._number[field]
+
+    def time_column(self, field):
+        if field not in self._time:
+            column = self.field_columns[field]
+            try:
+                self._time[field] = parse_dates(self.df[column])
+            except ValueError as e:
+                raise ValueError(f"column {column!r}: {e}") from None
+        return self._time[field]
+
+    def rule_mask(self, rule):
+        """Boolean mask for one rule; identical rules are computed once"""
+        key = (rule['field'], rule['condition'], rule['text'], rule['number'])
+        if key in self._rules:
+            return self._rules[key]
+
+        field, condition = rule['field'], rule['condition']
+        if field not in self.field_columns or self.field_columns[field] not in self.df.columns:
+            raise ValueError(f"no master column for smart crate field {field!r}")
+
+        if condition in TEXT_CONDITIONS:
+            column = self.text_column(field)
+            needle = (rule['text'] or '').lower()
+            if condition in ('cond_con_str', 'cond_dnc_str'):
+                mask = column.str.contains(needle, regex=False).to_numpy()
+            else:
+                mask = (column == needle).to_numpy()
+            if condition in ('cond_dnc_str', 'cond_isn_str'):
+                mask = ~mask
+        elif condition in NUMBER_CONDITIONS or condition in TIME_CONDITIONS:
+            if rule['number'] is not None:
+                value = rule['number']
+            elif not (rule['text'] or '').strip():
+                raise ValueError(f"no value for {condition} rule on field {field!r}")
+            elif condition in TIME_CONDITIONS:
+                value = parse_dates([rule['text']])[0]
+            else:
+                try:
+                    value = float(rule['text'])
+                except ValueError:
+                    raise ValueError(f"{condition} rule on field {field!r} needs a number, "
+                                     f"got {rule['text']!r}") from None
+            if condition in TIME_CONDITIONS:
+                column = self.time_column(field)
+            else:
+                column = self.number_column(field)
+            with np.errstate(invalid='ignore'):
+                if condition in ('cond_greq_uint', 'cond_aft_time'):
+                    mask = column >= value
+                else:
+                    mask = column <= value
+        else:
+            raise ValueError(f"unsupported smart crate condition {condition!r}")
+
+        self._rules[key] = mask
+        return mask
+
+    def evaluate(self, smart_crates, skip_invalid=False):
+        """
+        {crate name: boolean mask over master rows} for every smart crate.
+
+        A crate with a rule that cannot be evaluated raises ValueError, since
+        its tracks would otherwise silently lose the tag; with skip_invalid
+        it is left out with a warning instead.
+        """
+        masks = {}
+        for smart_crate in smart_crates:
+            try:
+                rule_masks = [self.rule_mask(rule) for rule in smart_crate['rules']]
+            except ValueError as e:
+                if not skip_invalid:
+                    raise ValueError(f"smart crate {smart_crate['name']}: {e}") from None
+                warnings.warn(f"Skipping smart crate {smart_crate['name']}: {e}")
+                continue
+            if not rule_masks:
+                continue
+            combine = np.logical_and if smart_crate['match_all'] else np.logical_or
+            masks[smart_crate['name']] = combine.reduce(rule_masks)
+        return masks
+
+    def members(self, smart_crates, skip_invalid=False):
+        """{crate name: [track filenames]} in the same form as static crates"""
+        filenames = self.df[self.path_column].fillna('').astype(str).map(track_basename).to_numpy()
+        return {name: [f for f in filenames[mask] if f]
+                for name, mask in self.evaluate(smart_crates, skip_invalid).items()}
+
+
+def load_smart_crates(scrate_folder):
+    """Parse every .scrate in a folder, sorted by name"""
+    return [parse_scrate(os.path.join(scrate_folder, f))
+            for f in sorted(os.listdir(scrate_folder)) if f.endswith('.scrate')]
+
+
+def add_smart_crates(crate_tag_lookup, smart_members):
+    """Merge smart crate membership into a filename -> set(crate_tag) lookup"""
+    for crate_tag, tracks in smart_members.items():
+        for fname in tracks:
+            crate_tag_lookup.setdefault(fname, set()).add(crate_tag)
+    return crate_tag_lookup
+
+
+# === USAGE ===
+if __name__ == "__main__":
+    import time
+    from crate_extractor_corrected import build_crate_tag_lookup, export_crate_tags
+
+    master_csv = r"C:\Users\fulmi\Downloads\Set Lists\master_library_final.csv"
+    crate_folder = r'C:\Users\fulmi\Music\_Serato_\Subcrates'
+    scrate_folder = r'C:\Users\fulmi\Music\_Serato_\SmartCrates'
+
+    master_df = pd.read_csv(master_csv)
+    smart_crates = load_smart_crates(scrate_folder)
+
+    started = time.perf_counter()
+    smart_members = SmartCrateEvaluator(master_df).members(smart_crates)
+    print(f"Evaluated {len(smart_crates)} smart crates over {len(master_df)} tracks "
+          f"in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    crate_tag_lookup = add_smart_crates(build_crate_tag_lookup(crate_folder), smart_members)
+    export_crate_tags(crate_tag_lookup, 'all_tracks_crate_tags.csv')
+    print("\nDone!")
@@ -0,0 +1,163 @@
+# Push reconciled master metadata back into the files' ID3 tags.
+# Each file's current frames are diffed against its master row and only the
+# changed frames are written. The tag is rewritten inside its existing padding
+# whenever the new frames fit, so the audio is never moved; files that already
+# match are not opened for writing at all, so a re-sync only touches what changed.
+
+import os
+import csv
+
+import pandas as pd
+from mutagen.id3 import ID3, ID3NoHeaderError, Frames, TXXX
+
+from crate_extractor_corrected import pool_map
+
+# ==========================================
+# CONFIGURE THIS
+# ==========================================
+master_csv = r"C:\Users\fulmi\Downloads\Set Lists\master_library_final.csv"
+report_csv = "tag_writeback_report.csv"
+dry_run = True   # Only report the diff; set False to write
+workers = 4
+# ==========================================
+
+# Master column -> ID3 frame ('TXXX:desc' for user text frames).
+# MIK reads and writes its energy as TXXX:EnergyLevel.
+WRITE_FRAMES = {
+    'Genre': 'TCON',
+    'ISRC': 'TSRC',
+    'Energy': 'TXXX:EnergyLevel',
+    'Vibe': 'TXXX:Vibe',
+}
+
+REPORT_COLUMNS = ['filepath', 'frame', 'current', 'new', 'status']
+
+
+def format_value(value):
+    """Master cell -> tag text ('' for empty; 6.0 -> '6')"""
+    if value is None or pd.isna(value):
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def frame_values(frame_key, value):
+    """Master cell -> list of frame strings; genres are ' | '-joined in the master"""
+    text = format_value(value)
+    if frame_key == 'TCON':
+        return [g.strip() for g in text.split('|') if g.strip()]
+    return [text] if text else []
+
+
+def frame_text(tags, frame_key):
+    """Current values of a frame as a list (TCON via .genres, resolving '(13)' style references)"""
+    frame = tags.get(frame_key)
+    if frame is None:
+        return []
+    if frame_key == 'TCON':
+        return list(frame.genres)
+    return [str(t) for t in frame.text]
+
+
+def make_frame(frame_key, values):
+    if frame_key.startswith('TXXX:'):
+        return TXXX(encoding=3, desc=frame_key[5:], text=values)
+    return Frames[frame_key](encoding=3, text=values)
+
+
+def diff_tags(tags, wanted):
+    """[(frame_key, current, new)] value lists for frames that differ; empty new values are skipped"""
+    # v2.3 has no multi-value text frames: mutagen writes lists '/'-joined
+    v23 = tags.version[1] == 3
+    changes = []
+    for frame_key, new in wanted.items():
+        if not new:
+            continue
+        current = frame_text(tags, frame_key)
+        if ('/'.join(current) != '/'.join(new)) if v23 else (current != new):
+            changes.append((frame_key, current, new))
+    return changes
+
+
+def keep_padding(info):
+    """Reuse the existing padding when the new tag fits; otherwise mutagen's default"""
+    return info.padding if info.padding >= 0 else info.get_default_padding()
+
+
+def sync_file(job):
+    """
+    Diff one file against its wanted frames and (unless dry_run) write the changes.
+
+    Returns (filepath, changes, status) with status one of 'unchanged',
+    'pending' (dry run), 'in place', 'resized', or an error message.
+    """
+    filepath, wanted, dry_run = job
+    try:
+        try:
+            tags = ID3(filepath)
+        except ID3NoHeaderError:
+            tags = ID3()
+        changes = diff_tags(tags, wanted)
+        if not changes:
+            return filepath, changes, 'unchanged'
+        if dry_run:
+            return filepath, changes, 'pending'
+
+        old_size = tags.size if tags.size else 0
+        for frame_key, _, new in changes:
+            tags.setall(frame_key, [make_frame(frame_key, new)])
+        if tags.version[1] == 3:
+            # mutagen upgrades loaded tags to v2.4 in memory; convert back
+            # (TDRC -> TYER/TDAT etc.) so v2.3 readers keep every frame
+            tags.update_to_v23()
+            tags.save(filepath, v2_version=3, padding=keep_padding)
+        else:
+            tags.save(filepath, v2_version=4, padding=keep_padding)
+        new_size = ID3(filepath).size
+        return filepath, changes, 'in place' if new_size == old_size else 'resized'
+    except Exception as e:
+        return filepath, [], f"error: {e}"
+
+
+def build_jobs(master_df, write_frames=WRITE_FRAMES, path_column='filepath', dry_run=True):
+    """One (filepath, {frame: text}, dry_run) job per master row with an existing MP3"""
+    columns = [c for c in write_frames if c in master_df.columns]
+    jobs = []
+    for filepath, *cells in zip(master_df[path_column], *(master_df[c] for c in columns)):
+        if pd.isna(filepath) or not str(filepath).lower().endswith('.mp3'):
+            continue
+        if not os.path.exists(filepath):
+            continue
+        wanted = {write_frames[c]: frame_values(write_frames[c], cell) for c, cell in zip(columns, cells)}
+        jobs.append((str(filepath), wanted, dry_run))
+    return jobs
+
+
+def write_back(master_df, report_csv, dry_run=True, workers=4, write_frames=WRITE_FRAMES):
+    """Diff (and optionally write) every master MP3; write a per-frame report"""
+    jobs = build_jobs(master_df, write_frames, dry_run=dry_run)
+    counts = {}
+    with open(report_csv, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(REPORT_COLUMNS)
+        for filepath, changes, status in pool_map(sync_file, jobs, workers):
+            key = 'error' if status.startswith('error') else status
+            counts[key] = counts.get(key, 0) + 1
+            if key == 'error':
+                print(f"⚠ {filepath}: {status[7:]}")
+                writer.writerow([filepath, '', '', '', status])
+            for frame_key, current, new in changes:
+                writer.writerow([filepath, frame_key, '; '.join(current), '; '.join(new), status])
+
+    summary = ', '.join(f"{n} {status}" for status, n in sorted(counts.items()))
+    mode = "Dry run" if dry_run else "Write-back"
+    print(f"✓ {mode}: {len(jobs)} files ({summary}) -> {report_csv}")
+    return counts
+
+
+# === USAGE ===
+if __name__ == "__main__":
+    master_df = pd.read_csv(master_csv)
+    write_back(master_df, report_csv, dry_run=dry_run, workers=workers)
+    print("\nDone!")
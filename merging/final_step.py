@@ -1,7 +1,12 @@
 import os
+import sys
 import pandas as pd
 from pathlib import Path
 
+# Basename matching is shared with the extractors (library_index.LibraryIndex)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'extractors'))
+from library_index import LibraryIndex
+
 print("="*70)
 print("FINAL MASTER LIBRARY BUILD")
 print("="*70)
@@ -64,13 +69,16 @@ print("="*70)
 mik_df = pd.read_csv(mik_export)
 print(f"✓ MIK export: {len(mik_df)} tracks")
 
-# Extract energy: "4A - 123.00 - 6" → "6"
+# Extract energy: "4A - 123.00 - 6" → "6" (database exports hold just "6")
 def extract_energy(energy_str):
     if pd.isna(energy_str):
         return None
     energy_str = str(energy_str).strip()
     if 'Purchased' in energy_str or energy_str == '':
         return None
+    # Database export (mik_database.py): the energy level on its own
+    if energy_str.replace('.', '', 1).isdigit():
+        return int(float(energy_str))
     parts = energy_str.split(' - ')
     if len(parts) >= 3:
         try:
@@ -112,6 +120,19 @@ print("="*70)
 crate_tags_df = pd.read_csv(crate_tags_file)
 print(f"✓ Crate tags: {len(crate_tags_df)} tracks")
 
+# Crate tags are keyed by lowercased basename, master by full path: index the
+# master paths once with the same LibraryIndex the extractors use
+master_rows = {}
+for master_idx, filepath in master_df['filepath'].items():
+    if pd.notna(filepath) and str(filepath).strip():
+        master_rows.setdefault(str(filepath), []).append(master_idx)
+master_index = LibraryIndex((path, None, None) for path in master_rows)
+
+ambiguous_names = {name for name, paths in master_index.by_name.items()
+                   if sum(len(master_rows[p]) for p in paths) > 1}
+if ambiguous_names:
+    print(f"⚠ {len(ambiguous_names)} basenames match several master rows; those tracks are skipped")
+
 # For each track in crate_tags, parse and add to appropriate column
 crate_count = 0
 for idx, crate_row in crate_tags_df.iterrows():
@@ -124,13 +145,14 @@ for idx, crate_row in crate_tags_df.iterrows():
     # Split crate tags
     crates = [c.strip() for c in crate_tags_str.split(';')]
     
-    # Find matching track in master by filepath
-    matching = master_df[master_df['filepath'] == filename]
+    # Find matching track in master by basename
+    path = master_index.resolve(str(filename))
+    matching = master_rows[path] if path else []
     
-    if matching.empty:
+    if len(matching) != 1:
         continue
     
-    match_idx = matching.index[0]
+    match_idx = matching[0]
     
     # For each crate this track is in, add its categories
     for crate_name in crates:
@@ -28,6 +28,7 @@ def parse_energy(val):
     Expected energy format examples:
         "8A - 123.00 - 6"
         "7A-128.00-8"
+        "6"    (mik_database.py export: the level on its own)
     Energy is the *last* piece (6, 8, etc).
 
     If the value looks like a comment (e.g. "Purchased on Beatport"),
@@ -41,6 +42,10 @@ def parse_energy(val):
     if not text:
         return None
 
+    # Database export (mik_database.py): the energy level on its own
+    if text.replace('.', '', 1).isdigit():
+        return int(float(text))
+
     # Try to split on '-' and look at the last part
     parts = [p.strip() for p in text.split('-')]
     if len(parts) < 3:
@@ -32,6 +32,10 @@ def parse_energy(val):
     if not text:
         return None
 
+    # Database export (mik_database.py): the energy level on its own
+    if text.replace('.', '', 1).isdigit():
+        return int(float(text))
+
     parts = [p.strip() for p in text.split('-')]
     if len(parts) < 3:
         return None
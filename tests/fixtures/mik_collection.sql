@@ -0,0 +1,22 @@
+-- Mixed In Key collection store: Core Data SQLite layout (Z-prefixed
+-- entity tables plus Core Data's bookkeeping tables), trimmed to two tracks.
+CREATE TABLE Z_PRIMARYKEY (Z_ENT INTEGER PRIMARY KEY, Z_NAME VARCHAR, Z_SUPER INTEGER, Z_MAX INTEGER);
+CREATE TABLE Z_METADATA (Z_VERSION INTEGER PRIMARY KEY, Z_UUID VARCHAR(255), Z_PLIST BLOB);
+CREATE TABLE ZPLAYLIST (Z_PK INTEGER PRIMARY KEY, Z_ENT INTEGER, Z_OPT INTEGER, ZNAME VARCHAR);
+CREATE TABLE ZSONG (
+    Z_PK INTEGER PRIMARY KEY, Z_ENT INTEGER, Z_OPT INTEGER,
+    ZENERGY INTEGER, ZTEMPO FLOAT, ZDATEADDED TIMESTAMP,
+    ZARTIST VARCHAR, ZNAME VARCHAR, ZALBUM VARCHAR, ZGENRE VARCHAR,
+    ZKEY VARCHAR, ZFILE VARCHAR
+);
+CREATE TABLE ZCUEPOINT (Z_PK INTEGER PRIMARY KEY, Z_ENT INTEGER, Z_OPT INTEGER,
+                        ZSONG INTEGER, ZTIME FLOAT, ZNAME VARCHAR);
+
+INSERT INTO Z_PRIMARYKEY VALUES (1, 'CuePoint', 0, 1), (2, 'Playlist', 0, 1), (3, 'Song', 0, 2);
+INSERT INTO ZPLAYLIST VALUES (1, 2, 1, 'Peak time');
+INSERT INTO ZSONG VALUES
+    (1, 3, 1, 6, 123.0, 700000000.0, 'Bicep', 'Glue', 'Isles', 'Electronica',
+     '8A', 'file:///C:/Music/Bicep%20-%20Glue.mp3'),
+    (2, 3, 1, 8, 128.5, 700000100.0, 'Dusky', 'Nobody Else', NULL, NULL,
+     '11B', 'C:\Music\Dusky - Nobody Else.aiff');
+INSERT INTO ZCUEPOINT VALUES (1, 1, 1, 1, 32.5, 'Drop');
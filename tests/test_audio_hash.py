@@ -0,0 +1,39 @@
+import struct
+
+from audio_hash import EMPTY_HASH, hash_audio
+
+
+def riff(*chunks):
+    body = b''.join(chunk_id + struct.pack('<I', len(data)) + data + b'\0' * (len(data) & 1)
+                    for chunk_id, data in chunks)
+    return b'RIFF' + struct.pack('<I', 4 + len(body)) + b'WAVE' + body
+
+
+def atom(name, data):
+    return struct.pack('>I', 8 + len(data)) + name + data
+
+
+FMT = struct.pack('<HHIIHH', 1, 2, 44100, 176400, 4, 16)
+
+
+def test_retagged_wav_keeps_its_hash(tmp_path):
+    first, second = tmp_path / 'a.wav', tmp_path / 'b.wav'
+    first.write_bytes(riff((b'fmt ', FMT), (b'data', b'\x01\x02' * 64)))
+    second.write_bytes(riff((b'fmt ', FMT), (b'LIST', b'INFOtag!'), (b'data', b'\x01\x02' * 64)))
+    assert hash_audio(str(first)) == hash_audio(str(second))
+
+
+def test_wavs_without_data_chunk_are_hashed_whole(tmp_path):
+    first, second = tmp_path / 'a.wav', tmp_path / 'b.wav'
+    first.write_bytes(riff((b'fmt ', FMT), (b'LIST', b'INFOone!')))
+    second.write_bytes(riff((b'fmt ', FMT), (b'LIST', b'INFOtwo!')))
+    hashes = {hash_audio(str(first)), hash_audio(str(second))}
+    assert len(hashes) == 2 and EMPTY_HASH not in hashes
+
+
+def test_mp4s_without_mdat_are_hashed_whole(tmp_path):
+    first, second = tmp_path / 'a.m4a', tmp_path / 'b.m4a'
+    first.write_bytes(atom(b'ftyp', b'M4A \0\0\0\0') + atom(b'moov', b'one'))
+    second.write_bytes(atom(b'ftyp', b'M4A \0\0\0\0') + atom(b'moov', b'two'))
+    hashes = {hash_audio(str(first)), hash_audio(str(second))}
+    assert len(hashes) == 2 and EMPTY_HASH not in hashes
@@ -0,0 +1,40 @@
+import pandas as pd
+import pytest
+
+from crate_writer import collect_crates
+
+
+def master(**columns):
+    return pd.DataFrame({'filepath': ['/m/a.mp3', '/m/b.mp3', '/m/c.mp3'], **columns})
+
+
+def test_values_cleaning_to_one_name_merge_with_warning(capsys):
+    df = master(Vibe=['Dark/Deep', 'DarkDeep', 'darkdeep'])
+    crates = collect_crates(df, ['Vibe'], crate_prefix='Taxonomy')
+    assert crates == {'Taxonomy%%Vibe%%DarkDeep': ['/m/a.mp3', '/m/b.mp3', '/m/c.mp3']}
+    out = capsys.readouterr().out
+    assert "'DarkDeep' shares crate" in out and "'darkdeep' shares crate" in out
+
+
+def test_values_cleaning_to_nothing_are_skipped(capsys):
+    df = master(Vibe=['???', 'Dark', None])
+    crates = collect_crates(df, ['Vibe'], crate_prefix='Taxonomy')
+    assert list(crates) == ['Taxonomy%%Vibe%%Dark']
+    assert "'???' is not a valid crate name" in capsys.readouterr().out
+
+
+def test_saved_query_cannot_replace_taxonomy_crate():
+    df = master(Vibe=['Dark', 'Dark', 'Light'], Energy=[5, 8, 9])
+    with pytest.raises(ValueError, match='would replace'):
+        collect_crates(df, ['Vibe'], {'Taxonomy%%Vibe%%dark': 'Energy >= 7'}, crate_prefix='Taxonomy')
+
+
+def test_saved_query_with_empty_name_raises():
+    df = master(Energy=[5, 8, 9])
+    with pytest.raises(ValueError, match='empty crate name'):
+        collect_crates(df, [], {'Queries%%**': 'Energy >= 7'})
+
+
+def test_saved_query_crate():
+    df = master(Energy=[5, 8, 9])
+    assert collect_crates(df, [], {'Queries%%Peak': 'Energy >= 7'}) == {'Queries%%Peak': ['/m/b.mp3', '/m/c.mp3']}
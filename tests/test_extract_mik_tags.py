@@ -0,0 +1,22 @@
+import csv
+
+import pytest
+
+import extract_mik_tags
+from extract_mik_tags import FIELDNAMES, export_tags
+
+
+def test_rows_read_before_a_failure_are_written(tmp_path, monkeypatch):
+    def failing_walk(files, io_workers=16, cached=None):
+        for n in range(3):
+            yield dict.fromkeys(FIELDNAMES, '') | {'filepath': f'/m/{n}.mp3'}, None, False, 1, 1
+        raise OSError('library went away')
+
+    monkeypatch.setattr(extract_mik_tags, 'iter_tags_concurrent', failing_walk)
+    output = tmp_path / 'export.csv'
+    with pytest.raises(OSError):
+        export_tags(str(tmp_path), str(output), batch_size=1000)
+
+    with open(output, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert [row['filepath'] for row in rows] == ['/m/0.mp3', '/m/1.mp3', '/m/2.mp3']
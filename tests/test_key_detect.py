@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from key_detect import chroma_vector, detect_key, key_notations
+
+RATE = 11025
+MAJOR_CHORDS = [(0, 4, 7), (5, 9, 12), (7, 11, 14), (0, 4, 7)]     # I-IV-V-I
+MINOR_CHORDS = [(0, 3, 7), (5, 8, 12), (7, 11, 14), (0, 3, 7)]     # i-iv-V-i
+
+
+def tone(midi, harmonics, seconds=1.0, rolloff=1.0):
+    """A note with `harmonics` partials falling off as 1 / h**rolloff"""
+    t = np.arange(int(seconds * RATE)) / RATE
+    freq = 440.0 * 2 ** ((midi - 69) / 12)
+    return sum(np.sin(2 * np.pi * h * freq * t) / h ** rolloff
+               for h in range(1, harmonics + 1) if h * freq < RATE / 2)
+
+
+def progression(tonic_midi, chords, harmonics, rolloff=1.0, repeats=3):
+    """Chords over a bass note an octave below, normalised to full scale"""
+    parts = [sum(tone(tonic_midi + n, harmonics, rolloff=rolloff) for n in chord)
+             + tone(tonic_midi - 12 + chord[0], harmonics, rolloff=rolloff)
+             for _ in range(repeats) for chord in chords]
+    signal = np.concatenate(parts)
+    return (signal / np.abs(signal).max()).astype(np.float32)
+
+
+@pytest.mark.parametrize('harmonics', [1, 3, 6, 10])
+@pytest.mark.parametrize('tonic_midi', [60, 67, 62, 57])
+def test_major_progressions_with_overtones(tonic_midi, harmonics):
+    key_index, mode, _ = detect_key(chroma_vector(progression(tonic_midi, MAJOR_CHORDS, harmonics), RATE))
+    assert (key_index, mode) == (tonic_midi % 12, 1)
+
+
+@pytest.mark.parametrize('harmonics', [1, 3, 6, 10])
+@pytest.mark.parametrize('tonic_midi', [57, 64, 60, 55])
+def test_minor_progressions_with_overtones(tonic_midi, harmonics):
+    key_index, mode, _ = detect_key(chroma_vector(progression(tonic_midi, MINOR_CHORDS, harmonics), RATE))
+    assert (key_index, mode) == (tonic_midi % 12, 0)
+
+
+def test_bright_timbre_c_major_is_confident():
+    # 6 partials at 1/sqrt(h): strong 3rd and 5th harmonics that used to pull C towards G/E
+    key_index, mode, confidence = detect_key(chroma_vector(progression(60, MAJOR_CHORDS, 6, rolloff=0.5), RATE))
+    assert key_notations(key_index, mode)[0] == '8B'
+    assert confidence >= 0.6
+
+
+def test_fifth_related_keys_tie_scores_low():
+    # Half in C major, half in G major: the two keys fit about equally well
+    signal = np.concatenate([progression(60, MAJOR_CHORDS, 6), progression(67, MAJOR_CHORDS, 6)])
+    _, _, confidence = detect_key(chroma_vector(signal, RATE))
+    assert confidence < 0.6
+
+
+def test_relative_keys_tie_scores_low():
+    signal = np.concatenate([progression(60, MAJOR_CHORDS, 6), progression(57, MINOR_CHORDS, 6)])
+    _, _, confidence = detect_key(chroma_vector(signal, RATE))
+    assert confidence < 0.6
+
+
+def test_noise_scores_low():
+    noise = np.random.default_rng(0).standard_normal(10 * RATE).astype(np.float32)
+    assert detect_key(chroma_vector(noise, RATE))[2] < 0.3
@@ -0,0 +1,39 @@
+import os
+import sqlite3
+
+import pytest
+
+from mik_database import iter_mik_rows, resolve_schema
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'mik_collection.sql')
+
+
+@pytest.fixture
+def mik_db(tmp_path):
+    path = tmp_path / 'MIKStore.db'
+    conn = sqlite3.connect(path)
+    with open(FIXTURE, encoding='utf-8') as f:
+        conn.executescript(f.read())
+    conn.close()
+    return str(path)
+
+
+def test_resolve_schema_finds_song_table(mik_db):
+    conn = sqlite3.connect(mik_db)
+    try:
+        table, mapping = resolve_schema(conn)
+    finally:
+        conn.close()
+    assert table == 'ZSONG'
+    assert mapping == {'filepath': 'ZFILE', 'artist': 'ZARTIST', 'title': 'ZNAME', 'album': 'ZALBUM',
+                       'bpm': 'ZTEMPO', 'key': 'ZKEY', 'energy': 'ZENERGY', 'genre': 'ZGENRE'}
+
+
+def test_rows_carry_numeric_energy(mik_db):
+    rows = list(iter_mik_rows(mik_db))
+    assert [row['energy'] for row in rows] == ['6', '8']
+    assert [row['bpm'] for row in rows] == ['123.00', '128.50']
+    assert [row['key'] for row in rows] == ['8A', '11B']
+    assert rows[0]['filepath'] == os.path.normpath('C:/Music/Bicep - Glue.mp3')
+    assert rows[1]['filepath'] == r'C:\Music\Dusky - Nobody Else.aiff'
+    assert rows[1]['album'] == ''
@@ -0,0 +1,53 @@
+import pandas as pd
+import pytest
+
+from crate_writer import encode_record, encode_text
+from smart_crate import SmartCrateEvaluator, parse_dates, parse_scrate
+
+# 2023-01-15 00:00 UTC
+JAN_15 = 1673740800
+
+
+def scrate(path, *rules, match_all=True):
+    data = encode_record(b'rart', bytes([match_all]))
+    for field_id, condition, text in rules:
+        data += encode_record(b'rurt', encode_record(b'urkt', field_id.to_bytes(4, 'big')) +
+                              encode_record(b'trft', encode_text(condition)) +
+                              encode_record(b'trpt', encode_text(text)))
+    path.write_bytes(data)
+    return parse_scrate(str(path))
+
+
+def master(added):
+    return pd.DataFrame({'filepath': [f'/m/{n}.mp3' for n in range(len(added))], 'added': added})
+
+
+def test_parse_dates_accepts_every_exporter_format():
+    seconds = parse_dates(['1673740800', '2023-01-15', '2023/1/15', '1/15/2023', '', None])
+    assert list(seconds[:4]) == [JAN_15] * 4
+    assert pd.isna(seconds[4:]).all()
+
+
+def test_time_rule_with_date_text(tmp_path):
+    df = master([str(JAN_15 - 86400), '2023-01-20', '2023/1/14', None])
+    crate = scrate(tmp_path / 'New.scrate', (25, 'cond_aft_time', '1/15/2023'))
+    assert SmartCrateEvaluator(df).members([crate]) == {'New': ['1.mp3']}
+
+
+def test_unparseable_dates_fail_loudly(tmp_path):
+    crate = scrate(tmp_path / 'New.scrate', (25, 'cond_aft_time', '1/15/2023'))
+    with pytest.raises(ValueError, match="column 'added'"):
+        SmartCrateEvaluator(master(['2023-01-20', 'last tuesday'])).members([crate])
+
+    crate = scrate(tmp_path / 'Bad.scrate', (25, 'cond_bef_time', 'soon'))
+    with pytest.raises(ValueError, match='smart crate Bad'):
+        SmartCrateEvaluator(master(['2023-01-20'])).members([crate])
+
+
+def test_skip_invalid_warns(tmp_path):
+    good = scrate(tmp_path / 'Good.scrate', (25, 'cond_bef_time', '2023-01-15'))
+    bad = scrate(tmp_path / 'Bad.scrate', (15, 'cond_greq_uint', 'fast'))
+    df = master(['2023-01-01']).assign(**{'Track BPM': [128]})
+    with pytest.warns(UserWarning, match='Skipping smart crate Bad'):
+        members = SmartCrateEvaluator(df).members([good, bad], skip_invalid=True)
+    assert members == {'Good': ['0.mp3']}
@@ -1,6 +1,7 @@
 import os
 import csv
 import re
+from concurrent.futures import ProcessPoolExecutor
 
 def get_raw_file_paths(crate_file):
     """Extract track filenames from Serato .crate files"""
@@ -61,25 +62,44 @@ def get_raw_file_paths(crate_file):
     return paths
 
 
-def build_crate_tag_lookup(crate_folder):
-    """Build lookup dict of filename -> set of crate tags"""
+def scan_crate(crate_path):
+    """Parse one crate -> (crate_tag, sorted filenames); runs in worker processes"""
+    crate_tag = os.path.splitext(os.path.basename(crate_path))[0]
+    return crate_tag, sorted(get_raw_file_paths(crate_path))
+
+
+def build_crate_tag_lookup(crate_folder, workers=None):
+    """
+    Build lookup dict of filename -> set of crate tags.
+
+    workers > 1 parses crates in a process pool; results come back in crate
+    order and are merged here, so the output matches the serial run exactly.
+    """
     crate_tag_lookup = {}
-    crate_files = [f for f in os.listdir(crate_folder) if f.endswith('.crate')]
+    crate_files = sorted(f for f in os.listdir(crate_folder) if f.endswith('.crate'))
+    crate_paths = [os.path.join(crate_folder, f) for f in crate_files]
     
     print(f"Found {len(crate_files)} .crate files")
     print("Processing...\n")
     
-    for idx, filename in enumerate(crate_files, 1):
-        crate_tag = os.path.splitext(filename)[0]
-        crate_path = os.path.join(crate_folder, filename)
-        
-        crate_paths = get_raw_file_paths(crate_path)
-        
-        if idx % 10 == 0 or idx == len(crate_files):
-            print(f"[{idx}/{len(crate_files)}] Processed {crate_tag}: {len(crate_paths)} tracks")
-        
-        for fname in crate_paths:
-            crate_tag_lookup.setdefault(fname, set()).add(crate_tag)
+    if workers and workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        chunksize = max(1, len(crate_paths) // (workers * 4))
+        scans = pool.map(scan_crate, crate_paths, chunksize=chunksize)
+    else:
+        pool = None
+        scans = map(scan_crate, crate_paths)
+    
+    try:
+        for idx, (crate_tag, crate_paths_found) in enumerate(scans, 1):
+            if idx % 10 == 0 or idx == len(crate_files):
+                print(f"[{idx}/{len(crate_files)}] Processed {crate_tag}: {len(crate_paths_found)} tracks")
+            
+            for fname in crate_paths_found:
+                crate_tag_lookup.setdefault(fname, set()).add(crate_tag)
+    finally:
+        if pool is not None:
+            pool.shutdown()
     
     return crate_tag_lookup
 
@@ -106,7 +126,7 @@ if __name__ == "__main__":
     
     print(f"Scanning crate folder: {crate_folder}\n")
     
-    crate_tag_lookup = build_crate_tag_lookup(crate_folder)
+    crate_tag_lookup = build_crate_tag_lookup(crate_folder, workers=os.cpu_count())
     export_crate_tags(crate_tag_lookup, output_csv)
     
     print("\nDone!")
\ No newline at end of file
@@ -1,6 +1,10 @@
 import pandas as pd
 import re
 
+# Serato writes subcrates as 'Parent%%Child%%Grandchild.crate'
+SUBCRATE_SEP = '%%'
+SET_PARENTS = ['Summons Sets', 'Special Sets', 'Sets (in dev)']
+
 def parse_crate_hierarchy(crate_tag):
     """
     Parse crate tags into parent category and subcategory.
@@ -10,7 +14,20 @@ def parse_crate_hierarchy(crate_tag):
         'Genres_Melodic House' -> ('Genres', 'Melodic House')
         'Sound_Instruments_Piano' -> ('Instruments', 'Piano')
         'Vibe_Emotional_Sexy' -> ('Vibe', 'Emotional_Sexy')
+        'Sound%%Instruments%%Piano' -> ('Instruments', 'Piano')
+        'Vibe%%Emotional%%Sexy' -> ('Vibe', 'Emotional_Sexy')
     """
+    # Real subcrate nesting: take the levels as Serato stored them
+    if SUBCRATE_SEP in crate_tag:
+        levels = [level.strip() for level in crate_tag.split(SUBCRATE_SEP)]
+        parent, rest = levels[0], levels[1:]
+        if parent == 'Sound' and rest[0] == 'Instruments' and len(rest) > 1:
+            return ('Instruments', '_'.join(rest[1:]))
+        if parent in SET_PARENTS:
+            parent = 'Sets'
+        return (parent, '_'.join(rest))
+    
+    # Flattened names: fall back to prefix heuristics
     # Special handling for nested categories
     if crate_tag.startswith('Sound_Instruments_'):
         return ('Instruments', crate_tag.replace('Sound_Instruments_', ''))
@@ -25,7 +42,7 @@ def parse_crate_hierarchy(crate_tag):
         parent, child = parts
         
         # Consolidate similar parents
-        if parent in ['Summons Sets', 'Special Sets', 'Sets (in dev)']:
+        if parent in SET_PARENTS:
             return ('Sets', child)
         
         if parent == 'Sound':